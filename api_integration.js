@@ -7,6 +7,9 @@
 // BUOC 1: Backend URL (Kaggle/Colab ngrok)
 const BACKEND_URL = 'https://4f78f692959f.ngrok-free.app';
 
+// Conversation session of this app instance (backend keeps one history per id)
+const SESSION_ID = `session_${Date.now()}_${Math.random().toString(36).substr(2, 9)}`;
+
 // BUOC 2: Process voice with user and screen context
 const processVoiceWithBackend = async (audioUri, userContext = null, screenContext = null) => {
   try {
@@ -41,11 +44,14 @@ const processVoiceWithBackend = async (audioUri, userContext = null, screenConte
       formData.append('screen_context', JSON.stringify(screenContext));
     }
 
+    formData.append('session_id', SESSION_ID);
+
     const response = await fetch(`${BACKEND_URL}/process_voice`, {
       method: 'POST',
       body: formData,
       headers: {
         'ngrok-skip-browser-warning': 'true',
+        'X-Session-Id': SESSION_ID,
       },
     });
 
@@ -136,11 +142,13 @@ const processTextWithBackend = async (text, userContext = null, screenContext =
       headers: {
         'Content-Type': 'application/json',
         'ngrok-skip-browser-warning': 'true',
+        'X-Session-Id': SESSION_ID,
       },
       body: JSON.stringify({
         text,
         user_context: userContext,
         screen_context: screenContext,
+        session_id: SESSION_ID,
       }),
     });
     const result = await response.json();
@@ -158,6 +166,7 @@ const resetConversation = async () => {
       method: 'POST',
       headers: {
         'ngrok-skip-browser-warning': 'true',
+        'X-Session-Id': SESSION_ID,
       },
     });
   } catch (error) {
@@ -165,4 +174,4 @@ const resetConversation = async () => {
   }
 };
 
-export { processVoiceWithBackend, processTextWithBackend, testConnection, resetConversation, BACKEND_URL };
+export { processVoiceWithBackend, processTextWithBackend, testConnection, resetConversation, BACKEND_URL, SESSION_ID };
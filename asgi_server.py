@@ -0,0 +1,357 @@
+# VNeID Voice AI - ASGI server (asyncio)
+# Same HTTP routes as backend_local.py plus the Socket.IO streaming events of
+# kaggle_backend_streaming.py, served from one event loop per worker process.
+# Connected-but-idle clients cost a small dict entry instead of an OS thread;
+# Whisper/Claude/VieNeu run in the backend_local pipeline's worker threads.
+#
+# Run: uvicorn asgi_server:app --host 0.0.0.0 --port 5000 --workers 2
+#
+# Each uvicorn worker is a separate process with its own copy of the models,
+# so size --workers to the memory you have. With several workers, Socket.IO
+# clients should connect with transports=['websocket'] so a session never
+# moves between processes.
+#
+# HTTP: GET /health, POST /reset, POST /process_text, POST /process_voice,
+#       GET /audio/<response_id> (audio_mode="stream")
+# Socket.IO: start_listening, context, audio_chunk, stop_listening -> connected,
+#            listening_started, processing, response
+#   start_listening (and context, when it changes) carries user_context,
+#   screen_context, session_id and voice once; audio_chunk is
+#   {"seq": n, "chunk": <binary int16 PCM>}. Base64 chunks with the context
+#   repeated on every chunk are still accepted.
+
+import asyncio
+import base64
+import json
+import struct
+import time
+import uuid
+
+import socketio
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+from backend_local import (
+    AUDIO_CHUNK_TIMEOUT,
+    AUDIO_STREAM_TTL,
+    PIPELINE_TIMEOUT,
+    conversations,
+    pcm_to_wav_base64,
+    pipeline,
+    wav_stream_header,
+)
+from session_store import request_session_id
+from utterance_buffer import UtteranceBuffer
+from vad import END, VoiceActivityDetector
+from voice_pipeline import PipelineFullError
+
+# Socket.IO speech detection: vad.py defaults (same as kaggle_backend_streaming)
+STREAM_SAMPLE_RATE = 16000
+CONTEXT_KEYS = ("user_context", "screen_context", "session_id", "voice")
+
+
+# ==========================================
+# Pipeline helpers
+# ==========================================
+
+# Jobs whose audio is fetched from /audio/<response_id>
+_streamed_jobs = {}
+
+
+def _register_stream(job):
+    now = time.monotonic()
+    for expired in [k for k, (_, created) in _streamed_jobs.items() if now - created > AUDIO_STREAM_TTL]:
+        del _streamed_jobs[expired]
+
+    response_id = uuid.uuid4().hex
+    _streamed_jobs[response_id] = (job, now)
+    return response_id
+
+
+async def pipeline_result(job, audio_mode):
+    """Reply payload for a pipeline job (see backend_local.pipeline_response)"""
+    if not await job.wait_reply_async(PIPELINE_TIMEOUT):
+        return {"success": False, "error": "Timed out"}
+
+    if audio_mode == 'stream':
+        response_id = _register_stream(job)
+        audio = {
+            "audio": None,
+            "response_id": response_id,
+            "audio_url": f"/audio/{response_id}",
+        }
+    else:
+        pcm = await job.collect_audio_async(timeout=AUDIO_CHUNK_TIMEOUT)
+        audio = {"audio": pcm_to_wav_base64(pcm) if pcm else None}
+
+    return {
+        "success": True,
+        "transcript": job.transcript,
+        "response": job.response_text,
+        **audio,
+        "action": job.action,
+        "data": job.data,
+        "next_step": job.next_step,
+        "timings": job.timings,
+    }
+
+
+def get_session_id(request, data=None):
+    """Client session id from the body/form or X-Session-Id header (else per client)"""
+    remote_addr = request.client.host if request.client else None
+    return request_session_id((data or {}).get('session_id'), request.headers, remote_addr)
+
+
+def pcm16_to_wav(pcm, sample_rate=STREAM_SAMPLE_RATE):
+    """Prefix raw mono int16 PCM with a WAV header (for the in-memory decoder)"""
+    return (
+        b'RIFF' + struct.pack('<I', 36 + len(pcm)) + b'WAVE'
+        + b'fmt ' + struct.pack('<IHHIIHH', 16, 1, 1, sample_rate, sample_rate * 2, 2, 16)
+        + b'data' + struct.pack('<I', len(pcm)) + pcm
+    )
+
+
+# ==========================================
+# HTTP routes
+# ==========================================
+
+async def health(request: Request):
+    return JSONResponse({"status": "healthy", "service": "vneid-voice-backend", "mode": "asgi"})
+
+
+async def reset(request: Request):
+    """Clear the calling client's conversation only"""
+    try:
+        data = await request.json()
+    except Exception:
+        data = await request.form()
+    conversations.delete(get_session_id(request, data))
+    return JSONResponse({"status": "ok"})
+
+
+async def process_text(request: Request):
+    try:
+        data = await request.json()
+        text = data.get('text', '')
+        if not text:
+            return JSONResponse({"success": False, "error": "No text provided"})
+
+        job = pipeline.submit(
+            text=text,
+            user_context=data.get('user_context'),
+            screen_context=data.get('screen_context'),
+            session_id=get_session_id(request, data),
+            voice=data.get('voice'),
+        )
+        return JSONResponse(await pipeline_result(job, data.get('audio_mode', 'base64')))
+
+    except PipelineFullError as e:
+        print(f"Busy: {e}")
+        return JSONResponse({"success": False, "error": "Server busy, try again"}, status_code=503)
+    except Exception as e:
+        print(f"Error: {e}")
+        return JSONResponse({"success": False, "error": str(e)})
+
+
+async def process_voice(request: Request):
+    try:
+        form = await request.form()
+        audio_file = form.get('audio')
+        if audio_file is None or isinstance(audio_file, str):
+            return JSONResponse({"success": False, "error": "No audio file"})
+
+        user_context = form.get('user_context')
+        screen_context = form.get('screen_context')
+
+        job = pipeline.submit(
+            audio=await audio_file.read(),
+            user_context=json.loads(user_context) if user_context else None,
+            screen_context=json.loads(screen_context) if screen_context else None,
+            session_id=get_session_id(request, form),
+            voice=form.get('voice'),
+        )
+        return JSONResponse(await pipeline_result(job, form.get('audio_mode', 'base64')))
+
+    except PipelineFullError as e:
+        print(f"Busy: {e}")
+        return JSONResponse({"success": False, "error": "Server busy, try again"}, status_code=503)
+    except Exception as e:
+        print(f"Error: {e}")
+        import traceback
+        traceback.print_exc()
+        return JSONResponse({"success": False, "error": str(e)})
+
+
+async def stream_audio(request: Request):
+    """Stream a response's audio as chunked WAV while it is being synthesized"""
+    response_id = request.path_params['response_id']
+    job, _ = _streamed_jobs.pop(response_id, (None, None))
+    if job is None:
+        return JSONResponse({"success": False, "error": "Unknown or expired response id"}, status_code=404)
+
+    async def generate():
+        yield wav_stream_header()
+        try:
+            async for chunk in job.aiter_audio(timeout=AUDIO_CHUNK_TIMEOUT):
+                yield chunk
+        except asyncio.TimeoutError:
+            print(f"TTS Stream {response_id}: timed out waiting for audio")
+
+    return StreamingResponse(generate(), media_type='audio/wav', headers={"Cache-Control": "no-cache"})
+
+
+http_app = Starlette(routes=[
+    Route('/health', health, methods=['GET']),
+    Route('/reset', reset, methods=['POST']),
+    Route('/process_text', process_text, methods=['POST']),
+    Route('/process_voice', process_voice, methods=['POST']),
+    Route('/audio/{response_id}', stream_audio, methods=['GET']),
+])
+
+
+# ==========================================
+# Socket.IO streaming
+# ==========================================
+
+sio = socketio.AsyncServer(async_mode='asgi', cors_allowed_origins='*')
+
+
+class Listener:
+    """Per-client speech buffer (created on first audio, not on connect)"""
+
+    __slots__ = ("buffer", "vad", "context", "next_seq")
+
+    def __init__(self):
+        # Long utterances become separate turns, so no overlap between them
+        self.buffer = UtteranceBuffer(sample_rate=STREAM_SAMPLE_RATE, overlap_ms=0)
+        self.vad = VoiceActivityDetector(sample_rate=STREAM_SAMPLE_RATE)
+        self.context = {}
+        self.next_seq = 0
+
+    def reset(self):
+        self.buffer.release()
+        self.vad.reset()  # Keeps the client's noise floor
+
+    def update_context(self, data):
+        """Keep the CONTEXT_KEYS present in a message"""
+        for key in CONTEXT_KEYS:
+            if key in data:
+                self.context[key] = data[key]
+
+    def accept_seq(self, seq):
+        """False for a duplicate/old chunk; gaps are logged"""
+        if seq is None:
+            return True  # Legacy client without sequence numbers
+        if seq < self.next_seq:
+            return False
+        if seq > self.next_seq:
+            print(f"Audio: {seq - self.next_seq} chunks lost before #{seq}")
+        self.next_seq = seq + 1
+        return True
+
+    def add_chunk(self, chunk):
+        """Add int16 PCM; returns the utterances ready to process (cut at MAX_UTTERANCE_MS)"""
+        ended = END in self.vad.process(chunk)
+        ready = self.buffer.append(chunk, speaking=self.vad.is_speaking)
+        if ended:
+            ready.append(self.take_audio())
+        return ready
+
+    def take_audio(self):
+        audio = self.buffer.take()
+        self.reset()
+        return audio
+
+
+listeners = {}
+
+
+def get_listener(sid):
+    listener = listeners.get(sid)
+    if listener is None:
+        listener = listeners[sid] = Listener()
+    return listener
+
+
+def decode_chunk(chunk):
+    """Raw int16 PCM of a binary attachment (or legacy base64 text)"""
+    if isinstance(chunk, (bytes, bytearray, memoryview)):
+        return chunk
+    return base64.b64decode(chunk or "")
+
+
+async def process_utterance(sid, audio_bytes, data):
+    await sio.emit('processing', {'status': 'processing'}, to=sid)
+    try:
+        job = pipeline.submit(
+            audio=pcm16_to_wav(audio_bytes),
+            user_context=data.get('user_context'),
+            screen_context=data.get('screen_context'),
+            # Socket clients default to one session per connection
+            session_id=str(data.get('session_id') or sid)[:128],
+            voice=data.get('voice'),
+        )
+        result = await pipeline_result(job, 'base64')
+    except PipelineFullError as e:
+        print(f"Busy: {e}")
+        result = {"success": False, "error": "Server busy, try again"}
+
+    if result.get("success") and not result.get("transcript"):
+        result = {'success': False, 'error': 'Không nghe rõ, bạn nói lại nhé?'}
+    await sio.emit('response', result, to=sid)
+
+
+@sio.event
+async def connect(sid, environ):
+    print(f"Client connected: {sid}")
+    await sio.emit('connected', {'status': 'ready'}, to=sid)
+
+
+@sio.event
+async def disconnect(sid):
+    print(f"Client disconnected: {sid}")
+    listeners.pop(sid, None)
+
+
+@sio.event
+async def start_listening(sid, data):
+    listener = get_listener(sid)
+    listener.reset()
+    listener.update_context(data or {})
+    listener.next_seq = 0  # Each stream numbers its chunks from 0
+    await sio.emit('listening_started', {'status': 'listening'}, to=sid)
+
+
+@sio.event
+async def context(sid, data):
+    get_listener(sid).update_context(data or {})
+
+
+@sio.event
+async def audio_chunk(sid, data):
+    listener = get_listener(sid)
+    if not listener.accept_seq(data.get('seq')):
+        return
+    listener.update_context(data)  # Legacy clients repeat the context on every chunk
+    try:
+        chunk = decode_chunk(data.get('chunk'))
+    except Exception as e:
+        print(f"Error processing chunk: {e}")
+        return
+
+    for audio in listener.add_chunk(chunk):
+        print(f"Speech ended for {sid}, processing...")
+        await process_utterance(sid, audio, listener.context)
+
+
+@sio.event
+async def stop_listening(sid, data):
+    listener = listeners.get(sid)
+    if listener is not None and listener.vad.is_speaking:
+        listener.update_context(data or {})
+        await process_utterance(sid, listener.take_audio(), listener.context)
+
+
+app = socketio.ASGIApp(sio, other_asgi_app=http_app)
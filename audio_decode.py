@@ -0,0 +1,127 @@
+# In-memory audio decoding for uploaded voice clips
+# Turns request bytes into the 16kHz mono float32 array Whisper expects,
+# without temp files or re-encoding to an intermediate WAV.
+#
+# - WAV/PCM: parsed with the wave module, no subprocess
+# - Compressed (m4a, webm, 3gp, caf, ...): PyAV over a BytesIO if installed
+#   (faster-whisper already depends on it), else ffmpeg over stdin/stdout pipes
+#
+# Usage:
+#   audio = decode_audio_bytes(request.files['audio'].read())
+#   segments, info = whisper_model.transcribe(audio, language="vi")
+
+from __future__ import annotations
+
+import io
+import subprocess
+import wave
+from math import gcd
+
+import numpy as np
+
+WHISPER_SAMPLE_RATE = 16000
+
+
+class AudioDecodeError(Exception):
+    """Raised when an upload cannot be decoded to PCM"""
+
+
+def is_wav(data: bytes) -> bool:
+    return len(data) >= 12 and data[:4] == b"RIFF" and data[8:12] == b"WAVE"
+
+
+def resample_audio(audio: np.ndarray, orig_sr: int, target_sr: int = WHISPER_SAMPLE_RATE) -> np.ndarray:
+    """Polyphase resample float32 audio (e.g. 44.1/48kHz -> 16kHz)"""
+    if orig_sr == target_sr:
+        return audio
+
+    from scipy.signal import resample_poly
+
+    divisor = gcd(orig_sr, target_sr)
+    return resample_poly(audio, target_sr // divisor, orig_sr // divisor).astype(np.float32)
+
+
+def decode_wav_bytes(data: bytes, sample_rate: int = WHISPER_SAMPLE_RATE) -> np.ndarray:
+    """Decode an integer PCM WAV in memory to mono float32 at sample_rate"""
+    try:
+        with wave.open(io.BytesIO(data), "rb") as wav_file:
+            channels = wav_file.getnchannels()
+            width = wav_file.getsampwidth()
+            rate = wav_file.getframerate()
+            frames = wav_file.readframes(wav_file.getnframes())
+    except (wave.Error, EOFError) as e:
+        # e.g. float or compressed WAV - let the general decoder handle it
+        raise AudioDecodeError(f"Unsupported WAV: {e}") from e
+
+    if width == 2:
+        audio = np.frombuffer(frames, dtype=np.int16).astype(np.float32) / 32768.0
+    elif width == 4:
+        audio = np.frombuffer(frames, dtype=np.int32).astype(np.float32) / 2147483648.0
+    elif width == 1:
+        audio = (np.frombuffer(frames, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    else:
+        raise AudioDecodeError(f"Unsupported WAV sample width: {width * 8} bit")
+
+    if channels > 1:
+        audio = audio.reshape(-1, channels).mean(axis=1)
+
+    return resample_audio(audio, rate, sample_rate)
+
+
+def _decode_with_av(data: bytes, sample_rate: int) -> np.ndarray:
+    import av
+
+    chunks = []
+    with av.open(io.BytesIO(data), mode="r") as container:
+        resampler = av.AudioResampler(format="s16", layout="mono", rate=sample_rate)
+        for frame in container.decode(audio=0):
+            for resampled in resampler.resample(frame):
+                chunks.append(resampled.to_ndarray().reshape(-1))
+        for resampled in resampler.resample(None):
+            chunks.append(resampled.to_ndarray().reshape(-1))
+
+    if not chunks:
+        return np.zeros(0, dtype=np.float32)
+    return np.concatenate(chunks).astype(np.float32) / 32768.0
+
+
+def _decode_with_ffmpeg(data: bytes, sample_rate: int) -> np.ndarray:
+    cmd = [
+        "ffmpeg", "-nostdin", "-threads", "0",
+        "-i", "pipe:0",
+        "-f", "s16le", "-acodec", "pcm_s16le",
+        "-ac", "1", "-ar", str(sample_rate),
+        "pipe:1",
+    ]
+    result = subprocess.run(cmd, input=data, capture_output=True)
+    if result.returncode != 0:
+        raise AudioDecodeError(f"ffmpeg failed: {result.stderr.decode(errors='ignore')[-300:]}")
+    return np.frombuffer(result.stdout, dtype=np.int16).astype(np.float32) / 32768.0
+
+
+def decode_audio_bytes(data: bytes, sample_rate: int = WHISPER_SAMPLE_RATE) -> np.ndarray:
+    """
+    Decode an uploaded clip to mono float32 PCM at sample_rate.
+
+    Raises AudioDecodeError if no decoder could read it.
+    """
+    if not data:
+        raise AudioDecodeError("Empty audio")
+
+    if is_wav(data):
+        try:
+            return decode_wav_bytes(data, sample_rate)
+        except AudioDecodeError:
+            pass
+
+    try:
+        return _decode_with_av(data, sample_rate)
+    except ImportError:
+        pass
+    except Exception as e:
+        print(f"AudioDecode: PyAV failed ({e}), trying ffmpeg")
+
+    try:
+        return _decode_with_ffmpeg(data, sample_rate)
+    except FileNotFoundError as e:
+        raise AudioDecodeError("Neither PyAV nor ffmpeg is available") from e
@@ -7,16 +7,31 @@
 # - VieNeu-TTS for Vietnamese text-to-speech
 # - Whisper for Vietnamese speech-to-text
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 from dotenv import load_dotenv
 import os
 import json
 import base64
+import queue
+import re
+import struct
 import tempfile
+import threading
+import time
+import uuid
 import anthropic
 import numpy as np
 
+from audio_decode import AudioDecodeError, decode_audio_bytes
+from intent_router import match_intent
+from prompt_cache import log_usage, system_blocks, usage_stats
+from history_manager import SUMMARY_SYSTEM, ConversationHistory, summary_request
+from session_store import DEFAULT_SESSION, get_session_store, request_session_id
+from tts_cache import get_phrase_cache, load_prewarm_phrases
+from vieneu_voices import get_voice_cache
+from voice_pipeline import PipelineFullError, VoicePipeline
+
 load_dotenv(".env.local")
 
 app = Flask(__name__)
@@ -37,12 +52,60 @@ claude = anthropic.Anthropic(api_key=CLAUDE_API_KEY)
 _whisper_model = None
 _vieneu_tts = None
 
-# Conversation history
-conversation_history = []
-MAX_HISTORY = 10
+# Conversation history, per client session (session_store.py). Claude gets the
+# recent turns within HISTORY_TOKEN_BUDGET, older ones as a summary (history_manager.py)
+MAX_HISTORY_MESSAGES = 200  # Hard cap per session until older turns are summarized
+sessions = get_session_store(max_messages=MAX_HISTORY_MESSAGES)
+
+# Streamed audio responses (audio_mode="stream")
+TTS_SAMPLE_RATE = 24000  # VieNeu outputs 24kHz
+AUDIO_STREAM_TTL = 60  # Seconds an unclaimed audio stream is kept
+AUDIO_CHUNK_TIMEOUT = 30  # Max seconds to wait for the next synthesized sentence
+
+# Request pipeline (STT -> LLM -> TTS stages, each with its own workers)
+PIPELINE_STT_WORKERS = int(os.getenv("PIPELINE_STT_WORKERS", "1"))
+PIPELINE_LLM_WORKERS = int(os.getenv("PIPELINE_LLM_WORKERS", "8"))
+PIPELINE_TTS_WORKERS = int(os.getenv("PIPELINE_TTS_WORKERS", "1"))
+PIPELINE_MAX_QUEUE = int(os.getenv("PIPELINE_MAX_QUEUE", "32"))
+PIPELINE_TIMEOUT = 60  # Max seconds a request waits for its reply
+
+# Same on every turn - kept ahead of the dynamic part (see prompt_cache.py)
+SYSTEM_PROMPT_STATIC = """Ban la tro ly ao VNeID, ho tro nguoi dung lam thu tuc hanh chinh bang giong noi.
+
+CACH GIAO TIEP:
+- Xung "em", goi user nhu o phan XUNG HO ben duoi
+- Noi ngan gon, tu nhien, than thien
+- KHONG dung emoji
+- Hoi tung cau mot, doi tra loi
+- Khi user noi "tiep tuc", "ok", "duoc" => chuyen sang buoc tiep
+
+KHI CAN THUC HIEN ACTION, TRA LOI THEO FORMAT:
+@@ACTION@@{"action": "ten_action", "data": {}}@@END@@
+
+CAC ACTION:
+- navigate_lltp: Mo trang LLTP
+- navigate_home: Ve trang chu
+- next_step: Chuyen sang buoc tiep theo
+- prev_step: Quay lai buoc truoc
+- fill_field: Dien form, data chua: muc_dich, so_ban, loai_phieu
+- submit: Gui yeu cau
+
+VI DU:
+- User: "lam ly lich tu phap" => @@ACTION@@{"action": "navigate_lltp"}@@END@@
+- User: "tiep tuc" => @@ACTION@@{"action": "next_step"}@@END@@
+- User: "muc dich xin viec, 2 ban" => @@ACTION@@{"action": "fill_field", "data": {"muc_dich": "Xin viec lam", "so_ban": "2"}}@@END@@
+
+MUC DICH HOP LE: Xin viec lam, Du hoc, Dinh cu, Ket hon voi nguoi nuoc ngoai, Bo tuc ho so, Dau thau, Muc dich khac
+"""
+
+
+def get_system_prompt(user_context, screen_context, summary=""):
+    """System prompt blocks: cached static prefix + this turn's user/screen context"""
+    return system_blocks(SYSTEM_PROMPT_STATIC, get_dynamic_prompt(user_context, screen_context, summary))
 
-def get_system_prompt(user_context, screen_context):
-    """Generate system prompt based on context"""
+
+def get_dynamic_prompt(user_context, screen_context, summary=""):
+    """Part of the system prompt that changes between users, screens and turns"""
 
     user_info = ""
     if user_context:
@@ -79,85 +142,99 @@ Truong can dien: {json.dumps([f['label'] for f in fields], ensure_ascii=False) i
         if name_parts:
             user_name = f"anh {name_parts[-1]}"
 
-    return f"""Ban la tro ly ao VNeID, ho tro nguoi dung lam thu tuc hanh chinh bang giong noi.
+    summary_info = f"\nTOM TAT CAC LUOT TRUOC:\n{summary}\n" if summary else ""
 
+    return f"""XUNG HO: goi user la "{user_name}"
 {user_info}
-{screen_info}
+{screen_info}{summary_info}"""
 
-CACH GIAO TIEP:
-- Xung "em", goi user la "{user_name}"
-- Noi ngan gon, tu nhien, than thien
-- KHONG dung emoji
-- Hoi tung cau mot, doi tra loi
-- Khi user noi "tiep tuc", "ok", "duoc" => chuyen sang buoc tiep
 
-KHI CAN THUC HIEN ACTION, TRA LOI THEO FORMAT:
-@@ACTION@@{{"action": "ten_action", "data": {{}}}}@@END@@
+def parse_claude_reply(result):
+    """Split a Claude reply into (speech text, action, data, next_step)"""
+    action = None
+    data = {}
+    next_step = False
 
-CAC ACTION:
-- navigate_lltp: Mo trang LLTP
-- navigate_home: Ve trang chu
-- next_step: Chuyen sang buoc tiep theo
-- prev_step: Quay lai buoc truoc
-- fill_field: Dien form, data chua: muc_dich, so_ban, loai_phieu
-- submit: Gui yeu cau
+    match = re.search(r'@@ACTION@@(.+?)@@END@@', result, re.DOTALL)
+    if match:
+        try:
+            action_json = json.loads(match.group(1).strip())
+            action = action_json.get('action')
+            data = action_json.get('data', {})
+        except:
+            pass
 
-VI DU:
-- User: "lam ly lich tu phap" => @@ACTION@@{{"action": "navigate_lltp"}}@@END@@
-- User: "tiep tuc" => @@ACTION@@{{"action": "next_step"}}@@END@@
-- User: "muc dich xin viec, 2 ban" => @@ACTION@@{{"action": "fill_field", "data": {{"muc_dich": "Xin viec lam", "so_ban": "2"}}}}@@END@@
+    # Check for next_step in response
+    if action == 'next_step':
+        next_step = True
 
-MUC DICH HOP LE: Xin viec lam, Du hoc, Dinh cu, Ket hon voi nguoi nuoc ngoai, Bo tuc ho so, Dau thau, Muc dich khac
-"""
+    # Clean response text
+    clean_text = re.sub(r'@@ACTION@@.*?@@END@@', '', result, flags=re.DOTALL)
+    clean_text = clean_text.strip()
 
+    return clean_text, action, data, next_step
 
-def process_with_claude(text, user_context, screen_context):
-    """Process text with Claude"""
-    global conversation_history
 
-    conversation_history.append({"role": "user", "content": text})
-    if len(conversation_history) > MAX_HISTORY * 2:
-        conversation_history = conversation_history[-MAX_HISTORY * 2:]
+def get_session_id(data=None):
+    """Client session id from the request body/form or X-Session-Id header (else per client)"""
+    return request_session_id((data or {}).get('session_id'), request.headers, request.remote_addr)
 
-    try:
-        response = claude.messages.create(
-            model="claude-3-5-haiku-20241022",
-            max_tokens=500,
-            system=get_system_prompt(user_context, screen_context),
-            messages=conversation_history
-        )
 
-        result = response.content[0].text
-        conversation_history.append({"role": "assistant", "content": result})
+def fast_path_reply(text, screen_context):
+    """Canned reply with its action block for a fixed command, or None (ask Claude)"""
+    match = match_intent(text, (screen_context or {}).get('available_actions'))
+    if match is None:
+        return None
+    print(f"Intent: {match.action} (fast path)")
+    return f'{match.reply} @@ACTION@@{json.dumps({"action": match.action})}@@END@@'
 
-        # Extract action
-        action = None
-        data = {}
-        next_step = False
 
-        import re
-        match = re.search(r'@@ACTION@@(.+?)@@END@@', result, re.DOTALL)
-        if match:
-            try:
-                action_json = json.loads(match.group(1).strip())
-                action = action_json.get('action')
-                data = action_json.get('data', {})
-            except:
-                pass
+def summarize_history(summary, messages):
+    """Fold older turns into the session summary (runs in the background)"""
+    response = claude.messages.create(
+        model="claude-3-5-haiku-20241022",
+        max_tokens=200,
+        system=SUMMARY_SYSTEM,
+        messages=[{"role": "user", "content": summary_request(summary, messages)}],
+    )
+    log_usage(response.usage, "Summary")
+    return response.content[0].text
 
-        # Check for next_step in response
-        if action == 'next_step':
-            next_step = True
 
-        # Clean response text
-        clean_text = re.sub(r'@@ACTION@@.*?@@END@@', '', result, flags=re.DOTALL)
-        clean_text = clean_text.strip()
+conversations = ConversationHistory(sessions, summarize=summarize_history)
 
-        return clean_text, action, data, next_step
 
+def stream_claude(text, user_context, screen_context, session_id=DEFAULT_SESSION):
+    """Stream Claude's reply as text deltas (pipeline LLM stage)"""
+    session_id = session_id or DEFAULT_SESSION
+    conversation_history, summary = conversations.context(session_id)
+    conversation_history.append({"role": "user", "content": text})
+
+    result = fast_path_reply(text, screen_context)
+    if result is not None:
+        yield result
+        conversations.append(session_id, text, result)
+        return
+
+    result = ""
+    try:
+        with claude.messages.stream(
+            model="claude-3-5-haiku-20241022",
+            max_tokens=500,
+            system=get_system_prompt(user_context, screen_context, summary),
+            messages=conversation_history,
+        ) as stream:
+            for delta in stream.text_stream:
+                result += delta
+                yield delta
+            log_usage(stream.get_final_message().usage)
     except Exception as e:
         print(f"Claude Error: {e}")
-        return "Xin loi, em gap loi. Anh thu lai nhe?", None, {}, False
+        if not result:
+            result = "Xin loi, em gap loi. Anh thu lai nhe?"
+            yield result
+
+    conversations.append(session_id, text, result)
 
 
 def get_whisper_model():
@@ -217,55 +294,169 @@ def get_vieneu_tts():
         print("VieNeu-TTS loaded successfully")
         print(f"Available voices: {_vieneu_tts.list_preset_voices()}")
 
+        # Encode every preset voice once; requests then pick one for free
+        get_voice_cache(_vieneu_tts).warm()
+
     return _vieneu_tts
 
 
-def text_to_speech(text):
-    """Convert text to speech using VieNeu-TTS (local)"""
-    if not text:
-        return None
+_tts_lock = threading.Lock()
 
-    try:
-        vieneu = get_vieneu_tts()
-        voice = vieneu.get_preset_voice(VIENEU_VOICE)
 
-        # Generate audio
+def tts_cache_key_args(voice):
+    """Everything besides the text that changes the synthesized audio"""
+    return {
+        "voice": voice,
+        "quality": f"{VIENEU_QUALITY}/k50",
+        "temperature": 1.0,
+        "sample_rate": TTS_SAMPLE_RATE,
+    }
+
+
+def synthesize_pcm(text, voice=None):
+    """
+    Synthesize text to 24kHz int16 PCM with VieNeu-TTS (local).
+
+    Pieces synthesized before come from the on-disk phrase cache as a
+    memory map, without touching the model.
+    """
+    if voice not in get_voice_cache(get_vieneu_tts()).names():
+        voice = VIENEU_VOICE
+
+    cache = get_phrase_cache()
+    if cache is None:
+        return infer_pcm(text, voice)
+
+    key = cache.key(text, **tts_cache_key_args(voice))
+    audio_int16 = cache.get(key)
+    if audio_int16 is None:
+        audio_int16 = cache.put(key, infer_pcm(text, voice))
+    return audio_int16
+
+
+def infer_pcm(text, voice):
+    """Run VieNeu for one piece of text (no cache)"""
+    vieneu = get_vieneu_tts()
+
+    # One synthesis at a time on the shared model
+    with _tts_lock:
         audio = vieneu.infer(
             text=text,
-            voice=voice,
+            voice=get_voice_cache(vieneu).get(voice),
             temperature=1.0,
             top_k=50,
         )
 
-        # Convert to int16
-        if audio.dtype == np.float32 or audio.dtype == np.float64:
-            audio_int16 = (audio * 32767).astype(np.int16)
-        else:
-            audio_int16 = audio.astype(np.int16)
+    # Convert to int16
+    if audio.dtype == np.float32 or audio.dtype == np.float64:
+        return (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16)
+    return audio.astype(np.int16)
 
-        # Create WAV file in memory
-        import io
-        import wave
 
-        buffer = io.BytesIO()
-        with wave.open(buffer, 'wb') as wav_file:
-            wav_file.setnchannels(1)
-            wav_file.setsampwidth(2)  # 16-bit
-            wav_file.setframerate(24000)  # VieNeu outputs 24kHz
-            wav_file.writeframes(audio_int16.tobytes())
+def prewarm_tts():
+    """Load VieNeu and synthesize the fixed phrases missing from the cache"""
+    cache = get_phrase_cache()
+    if cache is None:
+        return
+    try:
+        added = cache.prewarm(
+            load_prewarm_phrases(),
+            lambda text: infer_pcm(text, VIENEU_VOICE),
+            **tts_cache_key_args(VIENEU_VOICE),
+        )
+        print(f"TTS cache: prewarmed {added} phrase pieces ({cache.stats()['size_mb']} MB on disk)")
+    except Exception as e:
+        print(f"TTS prewarm error: {e}")
 
-        buffer.seek(0)
-        return base64.b64encode(buffer.read()).decode('utf-8')
 
-    except Exception as e:
-        print(f"TTS Error: {e}")
-        import traceback
-        traceback.print_exc()
-        return None
+class AudioStream:
+    """PCM chunks of one response, filled sentence by sentence by the TTS stage"""
+
+    def __init__(self):
+        self.chunks = queue.Queue()
+        self.created = time.monotonic()
+
+
+_audio_streams = {}
+_audio_streams_lock = threading.Lock()
+
+
+def register_audio_stream(chunks):
+    """Make a queue of PCM chunks (None at the end) fetchable at /audio/<response_id>"""
+    response_id = uuid.uuid4().hex
+    stream = AudioStream()
+    stream.chunks = chunks
+
+    with _audio_streams_lock:
+        # Drop streams the client never fetched
+        now = time.monotonic()
+        for expired in [k for k, v in _audio_streams.items() if now - v.created > AUDIO_STREAM_TTL]:
+            del _audio_streams[expired]
+        _audio_streams[response_id] = stream
+
+    return response_id
+
+
+def wav_stream_header(sample_rate=TTS_SAMPLE_RATE):
+    """WAV header with unknown length (0xFFFFFFFF sizes, as used for live streams)"""
+    return (
+        b'RIFF' + struct.pack('<I', 0xFFFFFFFF) + b'WAVE'
+        + b'fmt ' + struct.pack('<IHHIIHH', 16, 1, 1, sample_rate, sample_rate * 2, 2, 16)
+        + b'data' + struct.pack('<I', 0xFFFFFFFF)
+    )
+
+
+def pcm_to_wav_base64(pcm_bytes, sample_rate=TTS_SAMPLE_RATE):
+    """Wrap int16 PCM in a WAV file and base64-encode it"""
+    import io
+    import wave
+
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)  # 16-bit
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(pcm_bytes)
+    return base64.b64encode(buffer.getvalue()).decode('utf-8')
+
+
+def pipeline_response(job, audio_mode):
+    """
+    JSON response for a pipeline job.
+
+    - "base64" (default): waits for all audio and embeds it as a WAV
+    - "stream": returns as soon as the reply text/action is ready, with
+      audio_url; the audio streams from GET /audio/<response_id> while the
+      remaining sentences are synthesized
+    """
+    if not job.wait_reply(PIPELINE_TIMEOUT):
+        return jsonify({"success": False, "error": "Timed out"})
+
+    if audio_mode == 'stream':
+        response_id = register_audio_stream(job.audio)
+        audio = {
+            "audio": None,
+            "response_id": response_id,
+            "audio_url": f"/audio/{response_id}",
+        }
+    else:
+        pcm = job.collect_audio(timeout=AUDIO_CHUNK_TIMEOUT)
+        audio = {"audio": pcm_to_wav_base64(pcm) if pcm else None}
+
+    return jsonify({
+        "success": True,
+        "transcript": job.transcript,
+        "response": job.response_text,
+        **audio,
+        "action": job.action,
+        "data": job.data,
+        "next_step": job.next_step,
+        "timings": job.timings,
+    })
 
 
 def transcribe_audio(audio_file):
-    """Transcribe audio using local Whisper"""
+    """Transcribe audio using local Whisper (file path or 16kHz float32 array)"""
     try:
         model = get_whisper_model()
 
@@ -295,18 +486,81 @@ def transcribe_audio(audio_file):
         return ""
 
 
+def transcribe_upload(audio_bytes):
+    """Decode an uploaded clip and transcribe it (pipeline STT stage)"""
+    # Decode in memory (no temp file for WAV/PCM or PyAV-readable uploads)
+    try:
+        return transcribe_audio(decode_audio_bytes(audio_bytes))
+    except AudioDecodeError as e:
+        print(f"In-memory decode failed ({e}), using temp file")
+        with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as tmp:
+            tmp.write(audio_bytes)
+            tmp_path = tmp.name
+        try:
+            return transcribe_audio(tmp_path)
+        finally:
+            os.unlink(tmp_path)
+
+
+pipeline = VoicePipeline(
+    stt_fn=transcribe_upload,
+    llm_fn=stream_claude,
+    tts_fn=synthesize_pcm,
+    parse_fn=parse_claude_reply,
+    stt_workers=PIPELINE_STT_WORKERS,
+    llm_workers=PIPELINE_LLM_WORKERS,
+    tts_workers=PIPELINE_TTS_WORKERS,
+    max_queue=PIPELINE_MAX_QUEUE,
+)
+
+
 @app.route('/health', methods=['GET'])
 def health():
-    return jsonify({"status": "healthy", "service": "vneid-voice-backend"})
+    return jsonify({
+        "status": "healthy",
+        "service": "vneid-voice-backend",
+        "claude_tokens": usage_stats.stats(),
+        "history": conversations.stats(),
+    })
+
+
+@app.route('/voices', methods=['GET'])
+def voices():
+    """Preset voices a request can pick with "voice" (default VIENEU_VOICE)"""
+    cache = get_voice_cache(get_vieneu_tts())
+    return jsonify({"default": VIENEU_VOICE, "voices": cache.names(), "cache": cache.stats()})
 
 
 @app.route('/reset', methods=['POST'])
 def reset():
-    global conversation_history
-    conversation_history = []
+    """Clear the calling client's conversation only"""
+    conversations.delete(get_session_id(request.get_json(silent=True) or request.form))
     return jsonify({"status": "ok"})
 
 
+@app.route('/audio/<response_id>', methods=['GET'])
+def stream_audio(response_id):
+    """Stream a response's audio as chunked WAV while it is being synthesized"""
+    with _audio_streams_lock:
+        stream = _audio_streams.pop(response_id, None)
+    if stream is None:
+        return jsonify({"success": False, "error": "Unknown or expired response id"}), 404
+
+    def generate():
+        yield wav_stream_header()
+        while True:
+            try:
+                chunk = stream.chunks.get(timeout=AUDIO_CHUNK_TIMEOUT)
+            except queue.Empty:
+                print(f"TTS Stream {response_id}: timed out waiting for audio")
+                return
+            if chunk is None:
+                return
+            yield chunk
+
+    return Response(generate(), mimetype='audio/wav', headers={"Cache-Control": "no-cache"})
+
+
 @app.route('/process_text', methods=['POST'])
 def process_text():
     try:
@@ -314,28 +568,24 @@ def process_text():
         text = data.get('text', '')
         user_context = data.get('user_context')
         screen_context = data.get('screen_context')
+        audio_mode = data.get('audio_mode', 'base64')
 
         if not text:
             return jsonify({"success": False, "error": "No text provided"})
 
-        # Process with Claude
-        response_text, action, action_data, next_step = process_with_claude(
-            text, user_context, screen_context
+        # Claude -> TTS in the pipeline
+        job = pipeline.submit(
+            text=text,
+            user_context=user_context,
+            screen_context=screen_context,
+            session_id=get_session_id(data),
+            voice=data.get('voice'),
         )
+        return pipeline_response(job, audio_mode)
 
-        # Generate TTS
-        audio_b64 = text_to_speech(response_text)
-
-        return jsonify({
-            "success": True,
-            "transcript": text,
-            "response": response_text,
-            "audio": audio_b64,
-            "action": action,
-            "data": action_data,
-            "next_step": next_step,
-        })
-
+    except PipelineFullError as e:
+        print(f"Busy: {e}")
+        return jsonify({"success": False, "error": "Server busy, try again"}), 503
     except Exception as e:
         print(f"Error: {e}")
         return jsonify({"success": False, "error": str(e)})
@@ -351,52 +601,26 @@ def process_voice():
         audio_file = request.files['audio']
         user_context = request.form.get('user_context')
         screen_context = request.form.get('screen_context')
+        audio_mode = request.form.get('audio_mode', 'base64')
 
         if user_context:
             user_context = json.loads(user_context)
         if screen_context:
             screen_context = json.loads(screen_context)
 
-        # Save temp file
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as tmp:
-            audio_file.save(tmp.name)
-            tmp_path = tmp.name
-
-        # Transcribe
-        transcript = transcribe_audio(tmp_path)
-        os.unlink(tmp_path)  # Clean up
-
-        if not transcript:
-            return jsonify({
-                "success": True,
-                "transcript": "",
-                "response": "Em khong nghe ro, anh noi lai duoc khong?",
-                "audio": text_to_speech("Em khong nghe ro, anh noi lai duoc khong?"),
-                "action": None,
-                "data": {},
-                "next_step": False,
-            })
-
-        print(f"Transcript: {transcript}")
-
-        # Process with Claude
-        response_text, action, action_data, next_step = process_with_claude(
-            transcript, user_context, screen_context
+        # Whisper -> Claude -> TTS in the pipeline
+        job = pipeline.submit(
+            audio=audio_file.read(),
+            user_context=user_context,
+            screen_context=screen_context,
+            session_id=get_session_id(request.form),
+            voice=request.form.get('voice'),
         )
+        return pipeline_response(job, audio_mode)
 
-        # Generate TTS
-        audio_b64 = text_to_speech(response_text)
-
-        return jsonify({
-            "success": True,
-            "transcript": transcript,
-            "response": response_text,
-            "audio": audio_b64,
-            "action": action,
-            "data": action_data,
-            "next_step": next_step,
-        })
-
+    except PipelineFullError as e:
+        print(f"Busy: {e}")
+        return jsonify({"success": False, "error": "Server busy, try again"}), 503
     except Exception as e:
         print(f"Error: {e}")
         import traceback
@@ -421,4 +645,8 @@ if __name__ == '__main__':
     print("  - VieNeu-TTS: ~500MB")
     print("=" * 50)
 
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    # Fill the TTS phrase cache in the background while the server starts
+    threading.Thread(target=prewarm_tts, name="tts-prewarm", daemon=True).start()
+
+    # Debugger/reloader only when asked for (FLASK_DEBUG=1)
+    app.run(host='0.0.0.0', port=5000, debug=os.getenv("FLASK_DEBUG") == "1", threaded=True)
@@ -0,0 +1,187 @@
+# Micro-batching scheduler for model inference shared across sessions
+# Requests from concurrent rooms/requests are gathered for a few ms and run
+# through the model as one batch on a fixed number of worker threads.
+#
+# Usage:
+#   scheduler = get_scheduler("whisper-base", batch_fn, max_batch_size=8)
+#   text = await scheduler.submit(item, timeout=10.0)
+
+from __future__ import annotations
+
+import asyncio
+import queue
+import threading
+import time
+from typing import Any, Callable
+
+
+class SchedulerFullError(Exception):
+    """Raised when the scheduler queue is full (shed load instead of queueing)"""
+
+
+class DeadlineExceededError(Exception):
+    """Raised when a request waited in the queue past its deadline"""
+
+
+class _Request:
+    __slots__ = ("item", "future", "loop", "deadline", "enqueued")
+
+    def __init__(self, item, future, loop, deadline):
+        self.item = item
+        self.future = future
+        self.loop = loop
+        self.deadline = deadline
+        self.enqueued = time.monotonic()
+
+
+class BatchScheduler:
+    """
+    Gathers requests into batches for a blocking batch function.
+
+    - batch_fn(items) -> results, same length and order as items
+    - A worker takes the first waiting request, then keeps collecting for up
+      to max_wait_ms or until max_batch_size requests are in the batch
+    - The queue is bounded: submit() fails fast with SchedulerFullError
+    - Requests whose deadline passed before they ran fail with
+      DeadlineExceededError and are not sent to the model
+
+    Results are delivered to the event loop that submitted the request, so
+    one scheduler can serve rooms running on different loops/threads.
+    """
+
+    def __init__(
+        self,
+        batch_fn: Callable[[list], list],
+        *,
+        name: str = "batch",
+        max_batch_size: int = 8,
+        max_wait_ms: float = 10.0,
+        max_queue: int = 64,
+        num_workers: int = 1,
+    ):
+        self._batch_fn = batch_fn
+        self._name = name
+        self._max_batch_size = max_batch_size
+        self._max_wait = max_wait_ms / 1000.0
+        self._queue: queue.Queue[_Request] = queue.Queue(maxsize=max_queue)
+
+        # Stats
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._items = 0
+        self._rejected = 0
+        self._expired = 0
+
+        self._workers = [
+            threading.Thread(target=self._worker, name=f"{name}-worker-{i}", daemon=True)
+            for i in range(num_workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    async def submit(self, item: Any, timeout: float | None = None) -> Any:
+        """Queue one item and wait for its result"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        deadline = time.monotonic() + timeout if timeout else None
+
+        try:
+            self._queue.put_nowait(_Request(item, future, loop, deadline))
+        except queue.Full:
+            with self._stats_lock:
+                self._rejected += 1
+            raise SchedulerFullError(f"{self._name}: queue full ({self._queue.maxsize} waiting)")
+
+        return await future
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "name": self._name,
+                "queue_depth": self._queue.qsize(),
+                "batches": self._batches,
+                "items": self._items,
+                "avg_batch_size": round(self._items / self._batches, 2) if self._batches else 0.0,
+                "rejected": self._rejected,
+                "expired": self._expired,
+            }
+
+    def _collect_batch(self) -> list[_Request]:
+        batch = [self._queue.get()]
+        collect_until = time.monotonic() + self._max_wait
+
+        while len(batch) < self._max_batch_size:
+            remaining = collect_until - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _worker(self):
+        while True:
+            batch = self._collect_batch()
+
+            # Drop requests that are already too late or were cancelled
+            now = time.monotonic()
+            live = []
+            for request in batch:
+                if request.future.cancelled():
+                    continue
+                if request.deadline is not None and now > request.deadline:
+                    with self._stats_lock:
+                        self._expired += 1
+                    self._resolve(request, error=DeadlineExceededError(
+                        f"{self._name}: waited {now - request.enqueued:.2f}s"
+                    ))
+                    continue
+                live.append(request)
+
+            if not live:
+                continue
+
+            try:
+                results = self._batch_fn([request.item for request in live])
+            except Exception as e:
+                for request in live:
+                    self._resolve(request, error=e)
+                continue
+
+            with self._stats_lock:
+                self._batches += 1
+                self._items += len(live)
+
+            for request, result in zip(live, results):
+                self._resolve(request, result=result)
+
+    @staticmethod
+    def _resolve(request: _Request, result=None, error: Exception | None = None):
+        def set_result():
+            if request.future.done():
+                return
+            if error is not None:
+                request.future.set_exception(error)
+            else:
+                request.future.set_result(result)
+
+        try:
+            request.loop.call_soon_threadsafe(set_result)
+        except RuntimeError:
+            pass  # Submitting loop already closed
+
+
+_schedulers: dict[Any, BatchScheduler] = {}
+_schedulers_lock = threading.Lock()
+
+
+def get_scheduler(key: Any, batch_fn: Callable[[list], list], **kwargs) -> BatchScheduler:
+    """Get the process-wide scheduler for key (e.g. a ModelKey), creating it once"""
+    with _schedulers_lock:
+        scheduler = _schedulers.get(key)
+        if scheduler is None:
+            scheduler = BatchScheduler(batch_fn, name=str(key), **kwargs)
+            _schedulers[key] = scheduler
+        return scheduler
@@ -0,0 +1,169 @@
+# Soak test of per-client audio buffering with many simulated clients
+#
+# Runs N clients through the streaming server's per-chunk path (vad.py +
+# utterance_buffer.py, as in asgi_server / kaggle_backend_streaming) in
+# simulated time, 100 ms chunks per client per tick, with a mix of:
+#   - talkers: speech of 1-8 s, then 1-3 s of silence
+#   - never quiet: loud, constantly changing audio (no end of speech)
+#   - idle: stop sending after a while without disconnecting
+# Every 15 simulated seconds idle clients are swept like the server does.
+#
+# Reports the peak and final buffered bytes (all clients and the largest
+# single client), forced segments, released idle buffers and CPU per chunk,
+# next to what the old unbounded bytearray (everything since the last end
+# of speech) would have held. Exits non-zero if a buffer exceeded its bound.
+#
+# Run: python bench_audio_buffer_soak.py --clients 1000 --seconds 120
+
+import argparse
+import resource
+import sys
+import time
+
+import numpy as np
+
+from utterance_buffer import UtteranceBuffer
+from vad import END, VoiceActivityDetector
+
+SAMPLE_RATE = 16000
+CHUNK_MS = 100
+CHUNK = SAMPLE_RATE * CHUNK_MS // 1000
+IDLE_RELEASE_S = 30
+SWEEP_EVERY_S = 15
+MAX_SEGMENTS = 4  # Same as MAX_UTTERANCE_SEGMENTS in kaggle_backend_streaming
+
+
+def talker_audio(rng: np.random.Generator, seconds: int) -> np.ndarray:
+    """Speech-like bursts (harmonics, syllable envelope) separated by silence"""
+    parts = []
+    total = 0
+    while total < seconds * SAMPLE_RATE:
+        speech = int(rng.uniform(1, 8) * SAMPLE_RATE)
+        t = np.arange(speech) / SAMPLE_RATE
+        f0 = rng.uniform(100, 250)
+        voiced = sum(np.sin(2 * np.pi * f0 * k * t) / k for k in range(1, 5))
+        syllables = np.abs(np.sin(2 * np.pi * rng.uniform(2, 4) * t))
+        parts.append(voiced * syllables * rng.uniform(2000, 8000))
+        parts.append(rng.normal(0, 30, int(rng.uniform(1, 3) * SAMPLE_RATE)))
+        total += len(parts[-2]) + len(parts[-1])
+    return np.clip(np.concatenate(parts), -32768, 32767).astype(np.int16)
+
+
+def loud_audio(rng: np.random.Generator, seconds: int) -> np.ndarray:
+    """Never quiet: noise whose level keeps jumping (TV, street, fan + talk)"""
+    n = seconds * SAMPLE_RATE
+    level = np.repeat(rng.uniform(1500, 9000, n // 800 + 1), 800)[:n]
+    return np.clip(rng.normal(0, 1, n) * level, -32768, 32767).astype(np.int16)
+
+
+class Client:
+    """Server-side state of one connection plus its audio source"""
+
+    def __init__(self, kind: str, audio: np.ndarray, offset: int, stop_at: float | None):
+        self.kind = kind
+        self.audio = audio
+        self.pos = offset
+        self.stop_at = stop_at  # Idle clients stop sending at this time
+        self.vad = VoiceActivityDetector(sample_rate=SAMPLE_RATE)
+        self.buffer = UtteranceBuffer(sample_rate=SAMPLE_RATE)
+        self.segments = 0
+        self.old_bytes = 0  # What the unbounded bytearray would hold
+        self.last_active = 0.0
+
+    def next_chunk(self) -> bytes:
+        if self.pos + CHUNK > len(self.audio):
+            self.pos = 0
+        chunk = self.audio[self.pos:self.pos + CHUNK]
+        self.pos += CHUNK
+        return chunk.tobytes()
+
+    def receive(self, chunk: bytes, now: float) -> tuple[int, bool]:
+        """audio_chunk handler; returns (segments cut, turn ended)"""
+        self.last_active = now
+        self.old_bytes += len(chunk)
+        events = self.vad.process(chunk)
+        cuts = self.buffer.append(chunk, speaking=self.vad.is_speaking)
+        self.segments += len(cuts)
+        if END in events:
+            self.old_bytes = 0  # The old server only let go at the end of speech
+        if END in events or self.segments >= MAX_SEGMENTS:
+            self.buffer.take()
+            self.vad.reset()
+            self.segments = 0
+            return len(cuts), True
+        return len(cuts), False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Audio buffer soak test")
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--seconds", type=int, default=120, help="Simulated time")
+    parser.add_argument("--loud", type=float, default=0.1, help="Share of never-quiet clients")
+    parser.add_argument("--idle", type=float, default=0.2, help="Share of clients that go idle")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    # A few shared sources; clients start at random offsets into them
+    talkers = [talker_audio(rng, 90) for _ in range(8)]
+    louds = [loud_audio(rng, 60) for _ in range(4)]
+
+    clients = []
+    for i in range(args.clients):
+        r = rng.random()
+        if r < args.loud:
+            audio, kind = louds[i % len(louds)], "loud"
+        else:
+            audio, kind = talkers[i % len(talkers)], "talker"
+        stop_at = rng.uniform(5, args.seconds / 2) if rng.random() < args.idle else None
+        clients.append(Client(kind, audio, int(rng.integers(0, len(audio) // CHUNK)) * CHUNK, stop_at))
+
+    bound = clients[0].buffer.max_bytes + CHUNK * 2  # Max utterance + one int16 chunk
+    peak_total = peak_old_total = peak_client = 0
+    segments = turns = released = chunks = 0
+    cpu = 0.0
+    ticks = args.seconds * 1000 // CHUNK_MS
+    for tick in range(ticks):
+        now = tick * CHUNK_MS / 1000
+        start = time.process_time()
+        for client in clients:
+            if client.stop_at is not None and now >= client.stop_at:
+                continue
+            cut, ended = client.receive(client.next_chunk(), now)
+            segments += cut
+            turns += ended
+            chunks += 1
+        cpu += time.process_time() - start
+
+        if tick % (SWEEP_EVERY_S * 1000 // CHUNK_MS) == 0:
+            for client in clients:
+                if now - client.last_active > IDLE_RELEASE_S and len(client.buffer):
+                    client.buffer.release()
+                    client.vad.reset()
+                    released += 1
+
+        sizes = [len(c.buffer) for c in clients]
+        peak_total = max(peak_total, sum(sizes))
+        peak_client = max(peak_client, max(sizes))
+        peak_old_total = max(peak_old_total, sum(c.old_bytes for c in clients))
+
+    final_total = sum(len(c.buffer) for c in clients)
+    final_old = sum(c.old_bytes for c in clients)
+    mb = 1024 * 1024
+    print(f"{args.clients} clients, {args.seconds}s simulated, {chunks} chunks "
+          f"({sum(c.kind == 'loud' for c in clients)} never quiet, "
+          f"{sum(c.stop_at is not None for c in clients)} going idle)")
+    print(f"Turns: {turns}, forced segments: {segments}, idle buffers released: {released}")
+    print(f"Buffered audio  peak {peak_total / mb:7.1f} MB, final {final_total / mb:7.1f} MB, "
+          f"largest client {peak_client / 1024:6.0f} KB (bound {bound / 1024:.0f} KB)")
+    print(f"Old bytearray   peak {peak_old_total / mb:7.1f} MB, final {final_old / mb:7.1f} MB")
+    print(f"CPU {cpu / max(chunks, 1) * 1e6:.1f} us/chunk, max RSS "
+          f"{resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
+
+    if peak_client > bound:
+        print("FAIL: a client buffer exceeded its bound")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+# Benchmark for /process_voice audio decoding
+#
+# Encodes a synthetic clip to wav/m4a/webm/3gp with ffmpeg, then compares:
+#   - old: temp file, convert to a second WAV (pydub / ffmpeg CLI), then decode
+#          that file again with ffmpeg like whisper.load_audio does
+#   - new: audio_decode.decode_audio_bytes straight from the upload bytes
+#
+# Run: python bench_audio_decode.py --seconds 5 --repeats 10
+#      python bench_audio_decode.py --formats wav m4a
+
+import argparse
+import os
+import statistics
+import subprocess
+import tempfile
+import time
+import wave
+
+import numpy as np
+
+from audio_decode import decode_audio_bytes
+
+CODECS = {
+    "wav": [],
+    "m4a": ["-c:a", "aac", "-b:a", "64k"],
+    "webm": ["-c:a", "libopus", "-b:a", "32k"],
+    "3gp": ["-ar", "8000", "-c:a", "libopencore_amrnb", "-b:a", "12.2k"],
+}
+
+
+def make_wav(seconds: float, sample_rate: int = 44100) -> bytes:
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    audio = 0.3 * np.sin(2 * np.pi * 180 * t) * (1 + np.sin(2 * np.pi * 3 * t))
+    with tempfile.NamedTemporaryFile(suffix=".wav") as tmp:
+        with wave.open(tmp.name, "wb") as wav_file:
+            wav_file.setnchannels(1)
+            wav_file.setsampwidth(2)
+            wav_file.setframerate(sample_rate)
+            wav_file.writeframes((audio * 32767 / 2).astype(np.int16).tobytes())
+        return open(tmp.name, "rb").read()
+
+
+def encode(wav_bytes: bytes, fmt: str) -> bytes | None:
+    if fmt == "wav":
+        return wav_bytes
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        src = os.path.join(tmp_dir, "in.wav")
+        dst = os.path.join(tmp_dir, f"out.{fmt}")
+        with open(src, "wb") as f:
+            f.write(wav_bytes)
+        result = subprocess.run(
+            ["ffmpeg", "-y", "-i", src, *CODECS[fmt], dst], capture_output=True
+        )
+        if result.returncode != 0:
+            return None
+        with open(dst, "rb") as f:
+            return f.read()
+
+
+def old_path(data: bytes, fmt: str) -> np.ndarray:
+    with tempfile.NamedTemporaryFile(suffix=f".{fmt}", delete=False) as tmp:
+        tmp.write(data)
+        tmp_path = tmp.name
+    converted = tmp_path.rsplit(".", 1)[0] + "_converted.wav"
+    try:
+        try:
+            from pydub import AudioSegment
+            audio = AudioSegment.from_file(tmp_path, format="mp4" if fmt == "m4a" else fmt)
+            audio.set_channels(1).set_frame_rate(16000).export(converted, format="wav")
+        except ImportError:
+            subprocess.run(
+                ["ffmpeg", "-y", "-i", tmp_path, "-acodec", "pcm_s16le", "-ar", "16000", "-ac", "1", converted],
+                capture_output=True, check=True,
+            )
+
+        # whisper.load_audio
+        out = subprocess.run(
+            ["ffmpeg", "-nostdin", "-threads", "0", "-i", converted,
+             "-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", "16000", "-"],
+            capture_output=True, check=True,
+        ).stdout
+        return np.frombuffer(out, np.int16).astype(np.float32) / 32768.0
+    finally:
+        for path in (tmp_path, converted):
+            if os.path.exists(path):
+                os.unlink(path)
+
+
+def timed(fn, repeats: int) -> float:
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Upload decoding benchmark")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--formats", nargs="+", default=list(CODECS))
+    args = parser.parse_args()
+
+    wav_bytes = make_wav(args.seconds)
+
+    print(f"Clip: {args.seconds:.0f}s, median of {args.repeats} runs")
+    print(f"{'format':>6} | {'size':>8} | {'old':>9} | {'new':>9} | {'speedup':>7}")
+    print("-" * 52)
+
+    for fmt in args.formats:
+        data = encode(wav_bytes, fmt)
+        if data is None:
+            print(f"{fmt:>6} | ffmpeg can't encode this format here, skipped")
+            continue
+
+        try:
+            old_ms = timed(lambda: old_path(data, fmt), args.repeats)
+        except Exception as e:
+            print(f"{fmt:>6} | old path failed: {e}")
+            continue
+        try:
+            new_ms = timed(lambda: decode_audio_bytes(data), args.repeats)
+        except Exception as e:
+            print(f"{fmt:>6} | new path failed: {e}")
+            continue
+
+        print(
+            f"{fmt:>6} | {len(data) / 1024:>6.0f}KB | {old_ms:>7.1f}ms | "
+            f"{new_ms:>7.1f}ms | {old_ms / new_ms:>6.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
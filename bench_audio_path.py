@@ -0,0 +1,97 @@
+# Benchmark for the LiveKit frame -> Whisper input audio path
+#
+# Feeds synthetic 10ms int16 frames (48kHz by default, like WebRTC audio) and
+# compares building the 16kHz float32 model input with:
+#   - old: frombuffer per frame, concatenate, scipy FFT resample, astype
+#   - new: PCMBuffer + rtc.AudioResampler (streaming polyphase)
+# Reports wall time and peak Python-allocated memory (tracemalloc).
+#
+# Run: python bench_audio_path.py --seconds 30 60 --rate 48000
+
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+from livekit import rtc
+from scipy import signal
+
+from pcm_buffer import PCMBuffer
+
+
+def make_frames(seconds: float, sample_rate: int) -> list[rtc.AudioFrame]:
+    samples_per_frame = sample_rate // 100
+    total = int(seconds * sample_rate)
+    t = np.arange(total) / sample_rate
+    audio = (0.3 * np.sin(2 * np.pi * 220 * t) * 32767).astype(np.int16)
+    return [
+        rtc.AudioFrame(
+            data=audio[i:i + samples_per_frame].tobytes(),
+            sample_rate=sample_rate,
+            num_channels=1,
+            samples_per_channel=samples_per_frame,
+        )
+        for i in range(0, total - samples_per_frame + 1, samples_per_frame)
+    ]
+
+
+def old_path(frames: list[rtc.AudioFrame]) -> np.ndarray:
+    sample_rate = frames[0].sample_rate
+    audio = np.concatenate([np.frombuffer(frame.data, dtype=np.int16) for frame in frames])
+    if sample_rate != 16000:
+        audio = signal.resample(audio, int(len(audio) * 16000 / sample_rate))
+    return audio.astype(np.float32) / 32768.0
+
+
+def new_path(frames: list[rtc.AudioFrame]) -> np.ndarray:
+    audio = PCMBuffer(sample_rate=16000)
+    resampler = None
+    for frame in frames:
+        if frame.sample_rate == 16000:
+            audio.write_int16(frame.data)
+            continue
+        if resampler is None:
+            resampler = rtc.AudioResampler(frame.sample_rate, 16000, num_channels=1)
+        for resampled in resampler.push(frame):
+            audio.write_int16(resampled.data)
+    if resampler is not None:
+        for resampled in resampler.flush():
+            audio.write_int16(resampled.data)
+    return audio.view()
+
+
+def measure(fn, frames, repeats: int) -> tuple[float, float]:
+    fn(frames)  # Warm up
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn(frames)
+    elapsed = (time.perf_counter() - start) / repeats
+
+    tracemalloc.start()
+    fn(frames)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return elapsed * 1000, peak / (1024 * 1024)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Whisper audio path benchmark")
+    parser.add_argument("--seconds", type=float, nargs="+", default=[30, 60])
+    parser.add_argument("--rate", type=int, default=48000)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'audio':>6} | {'path':>4} | {'time':>9} | {'peak mem':>9}")
+    print("-" * 40)
+
+    for seconds in args.seconds:
+        frames = make_frames(seconds, args.rate)
+        for name, fn in (("old", old_path), ("new", new_path)):
+            ms, peak_mb = measure(fn, frames, args.repeats)
+            print(f"{seconds:>5.0f}s | {name:>4} | {ms:>7.1f}ms | {peak_mb:>6.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
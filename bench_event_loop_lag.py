@@ -0,0 +1,182 @@
+# Event-loop lag benchmark for the Claude client in livekit_agent.py
+#
+# Starts a local fake Anthropic Messages API server, then runs N concurrent
+# "rooms" that each do a few LLM turns while a probe task measures how late
+# the event loop wakes up (this is the delay VAD, audio frames and
+# data_received handlers would see).
+#
+# Compares:
+#   - blocking: synchronous anthropic.Anthropic().messages.create inside async code (old)
+#   - async:    pooled AsyncAnthropic streaming via livekit_agent.process_with_claude (new)
+#
+# Run: python bench_event_loop_lag.py --rooms 1 4 16 --turns 3
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FAKE_REPLY = 'Vang, em se mo form Ly lich tu phap cho anh nhe! @@ACTION@@{"action": "navigate_lltp"}@@END@@'
+
+
+class FakeClaudeHandler(BaseHTTPRequestHandler):
+    """Minimal /v1/messages endpoint (streaming and non-streaming)"""
+
+    latency = 0.3  # Seconds for the whole reply
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        words = FAKE_REPLY.split(" ")
+        delay = self.latency / len(words)
+
+        if not body.get("stream"):
+            time.sleep(self.latency)
+            payload = json.dumps({
+                "id": "msg_fake",
+                "type": "message",
+                "role": "assistant",
+                "model": body.get("model", "fake"),
+                "content": [{"type": "text", "text": FAKE_REPLY}],
+                "stop_reason": "end_turn",
+                "stop_sequence": None,
+                "usage": {"input_tokens": 10, "output_tokens": len(words)},
+            }).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def send(event, data):
+            chunk = f"event: {event}\ndata: {json.dumps(data)}\n\n".encode()
+            self.wfile.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+            self.wfile.flush()
+
+        send("message_start", {"type": "message_start", "message": {
+            "id": "msg_fake", "type": "message", "role": "assistant", "content": [],
+            "model": body.get("model", "fake"), "stop_reason": None, "stop_sequence": None,
+            "usage": {"input_tokens": 10, "output_tokens": 1}}})
+        send("content_block_start", {"type": "content_block_start", "index": 0,
+                                     "content_block": {"type": "text", "text": ""}})
+        for i, word in enumerate(words):
+            time.sleep(delay)
+            text = word if i == 0 else " " + word
+            send("content_block_delta", {"type": "content_block_delta", "index": 0,
+                                         "delta": {"type": "text_delta", "text": text}})
+        send("content_block_stop", {"type": "content_block_stop", "index": 0})
+        send("message_delta", {"type": "message_delta",
+                               "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                               "usage": {"output_tokens": len(words)}})
+        send("message_stop", {"type": "message_stop"})
+        self.wfile.write(b"0\r\n\r\n")
+
+
+def start_fake_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeClaudeHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+async def probe_lag(stop: asyncio.Event, interval: float = 0.01) -> list:
+    """Record how late each 10ms sleep wakes up"""
+    lags = []
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append((time.perf_counter() - start - interval) * 1000)
+    return lags
+
+
+async def run_rooms(livekit_agent, turn_fn, rooms: int, turns: int) -> dict:
+    stop = asyncio.Event()
+    probe = asyncio.create_task(probe_lag(stop))
+
+    async def room(room_id):
+        state = livekit_agent.SessionState()
+        for turn in range(turns):
+            await turn_fn(state, f"room {room_id} turn {turn}: lam ly lich tu phap")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(room(i) for i in range(rooms)))
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    lags = sorted(await probe) or [0.0]
+    return {
+        "p50": statistics.median(lags),
+        "p99": lags[int(len(lags) * 0.99) - 1] if len(lags) > 1 else lags[0],
+        "max": lags[-1],
+        "turns_per_sec": rooms * turns / elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Event-loop lag under concurrent rooms")
+    parser.add_argument("--rooms", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.3, help="Fake LLM reply time (s)")
+    args = parser.parse_args()
+
+    FakeClaudeHandler.latency = args.latency
+    server, url = start_fake_server()
+
+    # Point the agent at the fake server before importing it
+    os.environ["CLAUDE_BASE_URL"] = url
+    os.environ.setdefault("CLAUDE_API_KEY", "fake-key")
+
+    import anthropic
+    import livekit_agent
+
+    sync_client = anthropic.Anthropic(api_key="fake-key", base_url=url)
+
+    async def blocking_turn(state, text):
+        # Old behaviour: sync client called from async code
+        response = sync_client.messages.create(
+            model="claude-3-5-haiku-20241022",
+            max_tokens=300,
+            system=livekit_agent.get_system_prompt(state),
+            messages=[{"role": "user", "content": text}],
+        )
+        return response.content[0].text
+
+    async def async_turn(state, text):
+        async for _ in livekit_agent.process_with_claude(state, text):
+            pass
+
+    async def run_all():
+        # One event loop for everything - the pooled client is bound to it
+        for rooms in args.rooms:
+            for mode, turn_fn in (("blocking", blocking_turn), ("async", async_turn)):
+                result = await run_rooms(livekit_agent, turn_fn, rooms, args.turns)
+                print(
+                    f"{rooms:>5} | {mode:>8} | {result['p50']:>7.1f}ms | {result['p99']:>7.1f}ms | "
+                    f"{result['max']:>7.1f}ms | {result['turns_per_sec']:>7.1f}"
+                )
+
+    print(f"Fake LLM: {url} (reply time {args.latency * 1000:.0f}ms)")
+    print()
+    print(f"{'rooms':>5} | {'mode':>8} | {'lag p50':>9} | {'lag p99':>9} | {'lag max':>9} | {'turns/s':>7}")
+    print("-" * 64)
+
+    asyncio.run(run_all())
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# How many turns the fast-path intent router answers without Claude
+#
+# Runs intent_router.match_intent over a transcript corpus and reports the
+# share of short-circuited turns, the per-action counts, match latency and
+# the most frequent utterances that still went to Claude.
+#
+# Corpus: one transcript per line, or JSONL with "text" (or "transcript")
+# and optional "available_actions". Without --corpus a small built-in
+# sample of recorded VNeID turns is used.
+#
+# Run: python bench_intent_router.py --corpus transcripts.jsonl
+#      python bench_intent_router.py --show-misses 20
+
+import argparse
+import json
+import statistics
+import time
+from collections import Counter
+
+from intent_router import match_intent, normalize_vietnamese
+
+SAMPLE = [
+    "Xin chào",
+    "Tôi muốn làm lý lịch tư pháp",
+    "Xin việc",
+    "2 bản",
+    "Tiếp tục",
+    "Khoan, phiếu số 1 với số 2 khác nhau sao?",
+    "Số 1",
+    "Bao lâu có kết quả?",
+    "Ừ",
+    "Ok em",
+    "Quay lại",
+    "Về trang chủ đi",
+    "Em ơi làm lý lịch tư pháp giúp tôi",
+    "Mục đích xin việc, 2 bản",
+    "Được rồi",
+    "Tiếp tục nhé",
+    "Gửi đi",
+    "Đồng ý",
+    "Quay lại bước trước",
+    "Cảm ơn em",
+]
+
+SAMPLE_ACTIONS = ["next_step", "prev_step", "fill_field"]  # A form step screen
+
+
+def load_corpus(path):
+    turns = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("{"):
+                record = json.loads(line)
+                text = record.get("text") or record.get("transcript") or ""
+                turns.append((text, record.get("available_actions")))
+            else:
+                turns.append((line, None))
+    return turns
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Intent router corpus report")
+    parser.add_argument("--corpus", help="Transcript file (text lines or JSONL)")
+    parser.add_argument("--show-misses", type=int, default=10, help="Most frequent unrouted utterances to list")
+    args = parser.parse_args()
+
+    turns = load_corpus(args.corpus) if args.corpus else [(text, SAMPLE_ACTIONS) for text in SAMPLE]
+    if not turns:
+        print("Empty corpus")
+        return
+
+    actions = Counter()
+    misses = Counter()
+    latencies = []
+    for text, available_actions in turns:
+        start = time.perf_counter()
+        match = match_intent(text, available_actions)
+        latencies.append(time.perf_counter() - start)
+        if match:
+            actions[match.action] += 1
+        else:
+            misses[normalize_vietnamese(text)] += 1
+
+    routed = sum(actions.values())
+    latencies.sort()
+    print(f"Turns:          {len(turns)}")
+    print(f"Short-circuited: {routed} ({routed / len(turns) * 100:.1f}%)")
+    for action, count in actions.most_common():
+        print(f"  {action:<15} {count}")
+    print(f"Match latency:  p50 {statistics.median(latencies) * 1e6:.1f}us, "
+          f"p99 {latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1e6:.1f}us")
+
+    if misses and args.show_misses:
+        print()
+        print("Most frequent turns sent to Claude:")
+        for text, count in misses.most_common(args.show_misses):
+            print(f"  {count:>5}  {text}")
+
+
+if __name__ == "__main__":
+    main()
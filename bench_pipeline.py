@@ -0,0 +1,146 @@
+# Load test for the STT -> LLM -> TTS request pipeline (stub backends)
+#
+# C clients send voice requests back to back and wait for the full audio.
+# Compares:
+#   - sequential: old handler, STT -> whole Claude reply -> whole-reply TTS on
+#                 the request thread (one STT and one TTS model, so both are locked)
+#   - pipeline:   voice_pipeline.VoicePipeline with per-stage workers
+# Stub timings stand in for Whisper, Claude and VieNeu (sleeps release the GIL
+# like real model calls do).
+#
+# Run: python bench_pipeline.py --clients 1 8 32 --requests 4
+#      python bench_pipeline.py --stt-ms 300 --tts-ms-per-char 4
+
+import argparse
+import re
+import statistics
+import threading
+import time
+
+import numpy as np
+
+from voice_pipeline import VoicePipeline
+
+REPLY = (
+    "Da em ho tro anh ngay! Anh lam ly lich tu phap de xin viec hay muc dich khac a? "
+    "Em se mo form cho anh nhe. "
+    '@@ACTION@@{"action": "navigate_lltp", "data": {}}@@END@@'
+)
+
+
+def make_stubs(args):
+    def stt(audio):
+        time.sleep(args.stt_ms / 1000)
+        return "toi muon lam ly lich tu phap"
+
+    def llm(text, user_context, screen_context, session_id=None):
+        time.sleep(args.llm_ttft_ms / 1000)
+        for word in re.findall(r"\S+\s*", REPLY):
+            time.sleep(args.token_ms / 1000)
+            yield word
+
+    def tts(sentence, voice=None):
+        time.sleep(len(sentence) * args.tts_ms_per_char / 1000)
+        return np.zeros(len(sentence) * 240, dtype=np.int16)
+
+    def parse(reply):
+        match = re.search(r"@@ACTION@@(.+?)@@END@@", reply, re.DOTALL)
+        return re.sub(r"@@ACTION@@.*?@@END@@", "", reply).strip(), match and "navigate_lltp", {}, False
+
+    return stt, llm, tts, parse
+
+
+def sequential_handler(args):
+    stt, llm, tts, parse = make_stubs(args)
+    stt_lock = threading.Lock()
+    tts_lock = threading.Lock()
+
+    def handle():
+        start = time.perf_counter()
+        with stt_lock:
+            transcript = stt(b"")
+        text, _, _, _ = parse("".join(llm(transcript, None, None)))
+        with tts_lock:
+            tts(text)
+        elapsed = time.perf_counter() - start
+        return elapsed, elapsed  # Audio only arrives when everything is done
+
+    return handle
+
+
+def pipeline_handler(args):
+    stt, llm, tts, parse = make_stubs(args)
+    pipeline = VoicePipeline(
+        stt, llm, tts, parse,
+        stt_workers=1,
+        llm_workers=args.llm_workers,
+        tts_workers=1,
+        max_queue=1024,
+    )
+
+    def handle():
+        start = time.perf_counter()
+        job = pipeline.submit(audio=b"")
+        first_audio = None
+        for _ in job.iter_audio(timeout=120):
+            if first_audio is None:
+                first_audio = time.perf_counter() - start
+        return time.perf_counter() - start, first_audio
+
+    return handle
+
+
+def run(handle, clients: int, per_client: int) -> dict:
+    totals, firsts = [], []
+    lock = threading.Lock()
+
+    def client():
+        for _ in range(per_client):
+            total, first = handle()
+            with lock:
+                totals.append(total)
+                firsts.append(first)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    totals.sort()
+    return {
+        "throughput": len(totals) / elapsed,
+        "p50": statistics.median(totals) * 1000,
+        "p95": totals[max(0, int(len(totals) * 0.95) - 1)] * 1000,
+        "first_audio_p50": statistics.median(firsts) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Voice request pipeline load test")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=4, help="Requests per client")
+    parser.add_argument("--stt-ms", type=float, default=150)
+    parser.add_argument("--llm-ttft-ms", type=float, default=400)
+    parser.add_argument("--token-ms", type=float, default=15)
+    parser.add_argument("--tts-ms-per-char", type=float, default=2)
+    parser.add_argument("--llm-workers", type=int, default=32)
+    args = parser.parse_args()
+
+    modes = [("sequential", sequential_handler(args)), ("pipeline", pipeline_handler(args))]
+
+    print(f"{'clients':>7} | {'mode':>10} | {'req/s':>6} | {'p50':>8} | {'p95':>8} | {'1st audio':>9}")
+    print("-" * 64)
+    for clients in args.clients:
+        for name, handle in modes:
+            result = run(handle, clients, args.requests)
+            print(
+                f"{clients:>7} | {name:>10} | {result['throughput']:>6.2f} | "
+                f"{result['p50']:>6.0f}ms | {result['p95']:>6.0f}ms | {result['first_audio_p50']:>7.0f}ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
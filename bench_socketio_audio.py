@@ -0,0 +1,154 @@
+# Server CPU and bandwidth of the Socket.IO audio_chunk protocol
+#
+# Compares, per 100 ms chunk of 16 kHz int16 audio (the client's send rate):
+#   - base64: {"chunk": <base64 text>, "user_context": ..., "screen_context": ...}
+#             as one text packet (old protocol)
+#   - binary: {"seq": n, "chunk": <bytes>} as a binary packet with the PCM as
+#             an attachment; the context is sent once with start_listening
+#
+# Each chunk is encoded with python-socketio/engineio exactly as it goes on
+# the wire, then timed through the server side: engine.io + Socket.IO packet
+# decode, chunk decode, context handling, buffer append and the VAD. Reports
+# bytes per chunk and CPU per connected client (at 10 chunks/s).
+#
+# Run: python bench_socketio_audio.py --seconds 60 --chunk-ms 100
+
+import argparse
+import base64
+import time
+
+import numpy as np
+from engineio import packet as eio_packet
+from socketio import packet as sio_packet
+
+from vad import VoiceActivityDetector
+
+SAMPLE_RATE = 16000
+CONTEXT_KEYS = ("user_context", "screen_context", "session_id", "voice")
+
+# Typical context of the LLTP purpose screen (see App.jsx / mockData.js)
+USER_CONTEXT = {
+    "hoTen": "NGUYỄN VĂN AN",
+    "cccd": "001190000000",
+    "ngaySinh": "01/01/1990",
+    "gioiTinh": "Nam",
+    "noiSinh": "Thành phố Hà Nội",
+    "quocTich": "Việt Nam",
+    "danToc": "Kinh",
+    "thuongTru": "Số 1, ngõ 1 Duy Tân, Phường Dịch Vọng Hậu, Quận Cầu Giấy, Thành phố Hà Nội",
+    "tamTru": "1 Phạm Văn Đồng, Phường Dịch Vọng Hậu, Quận Cầu Giấy, Thành phố Hà Nội",
+    "email": "an.nguyen@example.com",
+    "sdt": "0900000000",
+}
+SCREEN_CONTEXT = {
+    "screen_name": "lltp_purpose",
+    "current_step": 3,
+    "filled_data": {"loai_phieu": "so1", "muc_dich": "Xin việc làm", "so_ban": "2"},
+    "available_actions": ["next_step", "prev_step", "fill_field"],
+}
+
+
+def wire_packets(chunks: list[bytes], mode: str) -> list[list]:
+    """Websocket frames (str or bytes) of each audio_chunk event"""
+    frames = []
+    for seq, chunk in enumerate(chunks):
+        if mode == "base64":
+            data = {
+                "chunk": base64.b64encode(chunk).decode(),
+                "user_context": USER_CONTEXT,
+                "screen_context": SCREEN_CONTEXT,
+            }
+        else:
+            data = {"seq": seq, "chunk": chunk}
+        encoded = sio_packet.Packet(sio_packet.EVENT, data=["audio_chunk", data]).encode()
+        if not isinstance(encoded, list):
+            encoded = [encoded]
+        frames.append([eio_packet.Packet(eio_packet.MESSAGE, data=part).encode() for part in encoded])
+    return frames
+
+
+class Receiver:
+    """Server side of one connection: packet decode + audio_chunk handling"""
+
+    def __init__(self):
+        self.pending = None
+        self.buffer = bytearray()
+        self.vad = VoiceActivityDetector(sample_rate=SAMPLE_RATE)
+        self.context = {}
+        self.next_seq = 0
+
+    def receive(self, frame) -> None:
+        pkt = eio_packet.Packet(encoded_packet=frame)
+        if self.pending is None:
+            sio_pkt = sio_packet.Packet(encoded_packet=pkt.data)
+            if sio_pkt.attachment_count:
+                self.pending = sio_pkt
+                return
+        elif self.pending.add_attachment(pkt.data):
+            sio_pkt, self.pending = self.pending, None
+        else:
+            return
+        self.audio_chunk(sio_pkt.data[1])
+
+    def audio_chunk(self, data: dict) -> None:
+        seq = data.get("seq")
+        if seq is not None:
+            if seq < self.next_seq:
+                return
+            self.next_seq = seq + 1
+        for key in CONTEXT_KEYS:
+            if key in data:
+                self.context[key] = data[key]
+        chunk = data.get("chunk")
+        if not isinstance(chunk, (bytes, bytearray, memoryview)):
+            chunk = base64.b64decode(chunk or "")
+        self.buffer.extend(chunk)
+        self.vad.process(chunk)
+        if len(self.buffer) > SAMPLE_RATE * 2 * 10:
+            self.buffer.clear()  # Keep memory flat (an utterance would end here)
+
+
+def make_chunks(seconds: float, chunk_ms: int) -> list[bytes]:
+    rng = np.random.default_rng(0)
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    # Speech-like: 200 Hz voice switched on and off every 1.5 s, over noise
+    voice = np.sin(2 * np.pi * 200 * t) * 6000 * ((t // 1.5) % 2)
+    audio = np.clip(voice + rng.normal(0, 50, len(t)), -32768, 32767).astype(np.int16)
+    size = SAMPLE_RATE * chunk_ms // 1000
+    return [audio[i:i + size].tobytes() for i in range(0, len(audio) - size + 1, size)]
+
+
+def run(mode: str, chunks: list[bytes], chunk_ms: int, repeats: int) -> None:
+    frames = wire_packets(chunks, mode)
+    wire_bytes = sum(len(f.encode() if isinstance(f, str) else f) for parts in frames for f in parts)
+
+    best = float("inf")
+    for _ in range(repeats):
+        receiver = Receiver()
+        start = time.process_time()
+        for parts in frames:
+            for frame in parts:
+                receiver.receive(frame)
+        best = min(best, time.process_time() - start)
+
+    per_chunk_us = best / len(chunks) * 1e6
+    cpu_share = per_chunk_us / (chunk_ms * 1000) * 100  # Of one core, per client
+    print(f"{mode:>7} | {wire_bytes / len(chunks):7.0f} B/chunk | {per_chunk_us:6.1f} us/chunk | "
+          f"{cpu_share:6.3f}% core/client | ~{100 / cpu_share:6.0f} clients/core")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Socket.IO audio_chunk protocol cost")
+    parser.add_argument("--seconds", type=float, default=60, help="Audio streamed per client")
+    parser.add_argument("--chunk-ms", type=int, default=100)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    chunks = make_chunks(args.seconds, args.chunk_ms)
+    print(f"{len(chunks)} chunks of {args.chunk_ms}ms (best of {args.repeats})")
+    for mode in ("base64", "binary"):
+        run(mode, chunks, args.chunk_ms, args.repeats)
+
+
+if __name__ == "__main__":
+    main()
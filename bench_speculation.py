@@ -0,0 +1,112 @@
+# End-of-turn latency of the streaming backend on recorded sessions
+#
+# Streams WAV recordings (16 kHz mono 16-bit) to kaggle_backend_streaming in
+# real time as 50 ms audio_chunk events, then measures the time from the end
+# of the user's speech to the 'response' event. Run it once against a server
+# started with SPECULATIVE_MODE=off and once with the default
+# SPECULATIVE_MODE=stt (or llm) to see the latency saved; the server's
+# speculation hit/waste/skipped counts are read from /health at the end.
+#
+# Run: python bench_speculation.py --url http://localhost:5000 recordings/*.wav
+
+import argparse
+import base64
+import statistics
+import threading
+import time
+import wave
+
+import numpy as np
+import requests
+import socketio
+
+CHUNK_MS = 50
+ENERGY_THRESHOLD = 500  # Chunk RMS above this is speech (for timing the end of speech only)
+TRAILING_SILENCE_MS = 1500  # Appended so every file ends the turn
+
+
+def load_pcm(path: str) -> np.ndarray:
+    with wave.open(path, "rb") as wav:
+        if wav.getframerate() != 16000 or wav.getnchannels() != 1 or wav.getsampwidth() != 2:
+            raise ValueError(f"{path}: expected 16 kHz mono 16-bit WAV")
+        audio = np.frombuffer(wav.readframes(wav.getnframes()), dtype=np.int16)
+    return np.concatenate([audio, np.zeros(16 * TRAILING_SILENCE_MS, dtype=np.int16)])
+
+
+class ResponseWaiter:
+    """Time of the next 'response' event"""
+
+    def __init__(self):
+        self.received = threading.Event()
+        self.at = None
+
+    def on_response(self, data):
+        self.at = time.perf_counter()
+        self.received.set()
+
+    def reset(self):
+        self.at = None
+        self.received.clear()
+
+
+def replay(client: socketio.Client, waiter: ResponseWaiter, path: str, timeout: float) -> float | None:
+    """Stream one recording; seconds from end of speech to the response"""
+    audio = load_pcm(path)
+    samples = 16 * CHUNK_MS
+    waiter.reset()
+
+    client.emit("start_listening", {})
+    speech_end = None
+    start = time.perf_counter()
+    for n, offset in enumerate(range(0, len(audio), samples)):
+        chunk = audio[offset:offset + samples]
+        if np.sqrt(np.mean(chunk.astype(np.float32) ** 2)) > ENERGY_THRESHOLD:
+            speech_end = None
+        elif speech_end is None:
+            speech_end = time.perf_counter()
+        client.emit("audio_chunk", {"chunk": base64.b64encode(chunk.tobytes()).decode()})
+        if waiter.received.is_set():
+            break
+        # Real-time pacing
+        time.sleep(max(0.0, start + (n + 1) * CHUNK_MS / 1000 - time.perf_counter()))
+
+    if not waiter.received.wait(timeout) or speech_end is None:
+        return None
+    return waiter.at - speech_end
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded sessions against the streaming backend")
+    parser.add_argument("files", nargs="+", help="WAV recordings, one user turn each")
+    parser.add_argument("--url", default="http://localhost:5000")
+    parser.add_argument("--timeout", type=float, default=30)
+    args = parser.parse_args()
+
+    waiter = ResponseWaiter()
+    client = socketio.Client()
+    client.on("response", waiter.on_response)
+    client.connect(args.url, transports=["websocket"])
+    latencies = []
+    try:
+        for path in args.files:
+            latency = replay(client, waiter, path, args.timeout)
+            status = f"{latency * 1000:.0f}ms" if latency is not None else "no response"
+            print(f"{path}: {status}")
+            if latency is not None:
+                latencies.append(latency)
+    finally:
+        client.disconnect()
+
+    if latencies:
+        latencies.sort()
+        print()
+        print(f"Turns: {len(latencies)}/{len(args.files)}")
+        print(f"End of speech -> response: p50 {statistics.median(latencies) * 1000:.0f}ms, "
+              f"p90 {latencies[int(len(latencies) * 0.9)] * 1000:.0f}ms")
+
+    health = requests.get(f"{args.url}/health", timeout=5).json()
+    print(f"Server speculation stats: {health.get('speculation')}")
+
+
+if __name__ == "__main__":
+    main()
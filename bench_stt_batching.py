@@ -0,0 +1,130 @@
+# Throughput benchmark for the Whisper micro-batching scheduler
+#
+# Runs C concurrent "sessions" that each transcribe utterances back to back
+# and reports utterances/sec and latency for:
+#   - executor: old path, loop.run_in_executor(None, stt._transcribe)
+#   - batch=N:  BatchScheduler with max_batch_size N (one worker)
+#
+# Run: python bench_stt_batching.py --model base --concurrency 1 4 8 16 --batch-sizes 1 4 8
+#      python bench_stt_batching.py --wav sample.wav --transformers
+
+import argparse
+import asyncio
+import functools
+import statistics
+import time
+import wave
+
+import numpy as np
+
+from batch_scheduler import BatchScheduler
+from whisper_local_plugin import (
+    FasterWhisperSTT,
+    WhisperLocalSTT,
+    _faster_whisper_batch,
+    _transformers_batch,
+)
+
+
+def load_utterance(path: str | None, seconds: float = 3.0) -> tuple[np.ndarray, int]:
+    """Read a mono 16-bit WAV, or synthesize a voiced-like test signal"""
+    if path:
+        with wave.open(path, "rb") as wav_file:
+            audio = np.frombuffer(wav_file.readframes(wav_file.getnframes()), dtype=np.int16)
+            if wav_file.getnchannels() > 1:
+                audio = audio[::wav_file.getnchannels()]
+            return audio, wav_file.getframerate()
+
+    sample_rate = 16000
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    signal = 0.3 * np.sin(2 * np.pi * 180 * t) * (1 + np.sin(2 * np.pi * 3 * t))
+    signal += 0.02 * np.random.default_rng(0).standard_normal(len(t))
+    return (signal * 32767 / 2).astype(np.int16), sample_rate
+
+
+async def run(transcribe, concurrency: int, per_session: int) -> dict:
+    latencies = []
+
+    async def session():
+        for _ in range(per_session):
+            start = time.perf_counter()
+            await transcribe()
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(session() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "throughput": len(latencies) / elapsed,
+        "p50": statistics.median(latencies) * 1000,
+        "p95": latencies[int(len(latencies) * 0.95) - 1] * 1000 if len(latencies) > 1 else latencies[0] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Whisper batching throughput")
+    parser.add_argument("--model", default="base")
+    parser.add_argument("--wav", help="Mono 16-bit WAV to use as the utterance")
+    parser.add_argument("--transformers", action="store_true", help="Use the transformers pipeline")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8, 16])
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--per-session", type=int, default=4)
+    parser.add_argument("--wait-ms", type=float, default=10.0)
+    args = parser.parse_args()
+
+    audio, sample_rate = load_utterance(args.wav)
+
+    if args.transformers:
+        whisper_stt = WhisperLocalSTT(model_size=args.model, batching=False)
+        batch_fn = _transformers_batch
+    else:
+        whisper_stt = FasterWhisperSTT(model_size=args.model, batching=False, streaming=False)
+        batch_fn = _faster_whisper_batch
+
+    print(f"Loading model {args.model}...")
+    whisper_stt._ensure_loaded()
+    key = whisper_stt._get_model_key()
+    loader = functools.partial(whisper_stt._load_model, key)
+
+    print(f"Utterance: {len(audio) / sample_rate:.1f}s @ {sample_rate}Hz")
+    print()
+    print(f"{'conc':>4} | {'mode':>9} | {'utt/s':>6} | {'p50':>8} | {'p95':>8}")
+    print("-" * 48)
+
+    async def run_all():
+        loop = asyncio.get_running_loop()
+
+        # Warm up
+        await loop.run_in_executor(None, whisper_stt._transcribe, audio, sample_rate, "vi")
+
+        for concurrency in args.concurrency:
+            async def executor_call():
+                return await loop.run_in_executor(None, whisper_stt._transcribe, audio, sample_rate, "vi")
+
+            modes = [("executor", executor_call)]
+            for batch_size in args.batch_sizes:
+                scheduler = BatchScheduler(
+                    functools.partial(batch_fn, key, loader),
+                    name=f"bench-{batch_size}",
+                    max_batch_size=batch_size,
+                    max_wait_ms=args.wait_ms,
+                    max_queue=1024,
+                )
+                modes.append((f"batch={batch_size}", functools.partial(
+                    scheduler.submit, (audio, sample_rate, "vi")
+                )))
+
+            for mode, transcribe in modes:
+                result = await run(transcribe, concurrency, args.per_session)
+                print(
+                    f"{concurrency:>4} | {mode:>9} | {result['throughput']:>6.2f} | "
+                    f"{result['p50']:>6.0f}ms | {result['p95']:>6.0f}ms"
+                )
+
+    asyncio.run(run_all())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+# Offline evaluation of end-of-speech detection
+#
+# Feeds WAV fixtures to the frame-based VAD (vad.py) and to the old
+# per-chunk energy threshold (RMS > 500 per chunk, 3 chunks to start,
+# 15 chunks of silence to end), in random chunk sizes like real clients
+# send. For every fixture with a known end of speech it reports:
+#   - false cut:        END fired before the speaker had finished
+#   - missed:           no END at all
+#   - endpoint latency: END time - true end of speech (correct ends only)
+#
+# Fixtures: 16 kHz mono 16-bit WAV files, each with a sidecar JSON
+# (same name, .json) holding {"speech_end": <seconds>}. --synthetic N
+# generates N utterances per case instead (voiced syllables, fricatives,
+# pauses shorter than the end timeout, clicks and a noise floor):
+#   plain:        noise before and after the speech
+#   zero-lead-in: digital silence before the speech (muted or gated mic)
+#   noise-step:   background noise 15-25 dB louder right after the speech
+#                 (fan, TV), with a longer tail
+#
+# Run: python bench_vad.py fixtures/*.wav
+#      python bench_vad.py --synthetic 200 --chunk-ms 20 250
+
+import argparse
+import json
+import os
+import statistics
+import wave
+
+import numpy as np
+
+from vad import END, VoiceActivityDetector
+
+SAMPLE_RATE = 16000
+CASES = ("plain", "zero-lead-in", "noise-step")
+
+
+class EnergyThresholdVAD:
+    """The previous AudioBuffer logic: one RMS per chunk, counts in chunks"""
+
+    def __init__(self, threshold=500, min_speech_chunks=3, max_silence_chunks=15):
+        self.threshold = threshold
+        self.min_speech_chunks = min_speech_chunks
+        self.max_silence_chunks = max_silence_chunks
+        self.is_speaking = False
+        self.speech_chunks = 0
+        self.silence_chunks = 0
+
+    def process(self, pcm: bytes) -> list[str]:
+        samples = np.frombuffer(pcm, dtype=np.int16).astype(np.float32)
+        if np.sqrt(np.mean(samples ** 2)) > self.threshold:
+            self.speech_chunks += 1
+            self.silence_chunks = 0
+            if self.speech_chunks >= self.min_speech_chunks:
+                self.is_speaking = True
+        elif self.is_speaking:
+            self.silence_chunks += 1
+            if self.silence_chunks == self.max_silence_chunks:
+                return [END]
+        return []
+
+
+def load_fixture(path: str) -> tuple[np.ndarray, float]:
+    with wave.open(path, "rb") as wav:
+        if wav.getframerate() != SAMPLE_RATE or wav.getnchannels() != 1 or wav.getsampwidth() != 2:
+            raise ValueError(f"{path}: expected 16 kHz mono 16-bit WAV")
+        audio = np.frombuffer(wav.readframes(wav.getnframes()), dtype=np.int16)
+    with open(os.path.splitext(path)[0] + ".json") as f:
+        speech_end = float(json.load(f)["speech_end"])
+    return audio, speech_end
+
+
+def synthetic_utterance(rng: np.random.Generator, case: str = "plain") -> tuple[np.ndarray, float]:
+    """Noise, then words with short gaps and mid-sentence pauses, then silence"""
+    noise_db = rng.uniform(-65, -42)
+    speech_db = rng.uniform(-30, -12)
+
+    def noise(seconds, db=noise_db):
+        return rng.normal(0, 10 ** (db / 20), int(seconds * SAMPLE_RATE))
+
+    def syllable(seconds):
+        t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+        f0 = rng.uniform(90, 260)
+        voiced = sum(np.sin(2 * np.pi * f0 * k * t) / k for k in range(1, 6))
+        envelope = np.sqrt(np.clip(np.sin(np.pi * t / t[-1]), 0, None))
+        return voiced / np.max(np.abs(voiced)) * envelope * 10 ** (speech_db / 20)
+
+    def fricative(seconds):
+        hiss = np.diff(rng.normal(0, 1, int(seconds * SAMPLE_RATE) + 1))  # High-pass noise
+        return hiss / np.max(np.abs(hiss)) * 10 ** ((speech_db - 12) / 20)
+
+    if case == "zero-lead-in":
+        parts = [np.zeros(int(rng.uniform(0.3, 1.0) * SAMPLE_RATE))]
+    else:
+        parts = [noise(rng.uniform(0.2, 0.8))]
+    for word in range(rng.integers(3, 12)):
+        if rng.random() < 0.3:
+            parts.append(fricative(rng.uniform(0.05, 0.15)))
+        parts.append(syllable(rng.uniform(0.12, 0.4)))
+        # Gap between words; sometimes a thinking pause (still mid-sentence)
+        parts.append(noise(rng.uniform(0.3, 0.6) if rng.random() < 0.15 else rng.uniform(0.02, 0.12)))
+    parts.pop()  # No gap after the last word
+    speech_end = sum(len(p) for p in parts) / SAMPLE_RATE
+
+    if case == "noise-step":
+        tail = noise(6.0, noise_db + rng.uniform(15, 25))
+    else:
+        tail = noise(2.0)
+    for _ in range(rng.integers(0, 3)):  # Clicks / taps after speaking
+        at = rng.integers(0, len(tail) - 80)
+        tail[at:at + 80] += rng.normal(0, 10 ** ((speech_db + 3) / 20), 80)
+    parts.append(tail)
+
+    audio = np.clip(np.concatenate(parts), -1, 1)
+    return (audio * 32767).astype(np.int16), speech_end
+
+
+def run_detector(detector, audio: np.ndarray, chunk_ms: tuple[int, int], rng) -> float | None:
+    """Seconds of audio fed when END fired (None if it never did)"""
+    pos = 0
+    while pos < len(audio):
+        size = int(rng.integers(chunk_ms[0], chunk_ms[1] + 1)) * SAMPLE_RATE // 1000
+        chunk = audio[pos:pos + size]
+        pos += len(chunk)
+        if END in detector.process(chunk.tobytes()):
+            return pos / SAMPLE_RATE
+    return None
+
+
+def summarize(name: str, results: list) -> None:
+    total = len(results)
+    cuts = sum(1 for end, truth in results if end is not None and end < truth)
+    missed = sum(1 for end, _ in results if end is None)
+    latencies = sorted((end - truth) * 1000 for end, truth in results if end is not None and end >= truth)
+    line = f"{name:>16} | false cut {cuts / total * 100:5.1f}% | missed {missed / total * 100:5.1f}%"
+    if latencies:
+        line += (f" | endpoint p50 {statistics.median(latencies):4.0f}ms"
+                 f" p90 {latencies[int(len(latencies) * 0.9)]:4.0f}ms")
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-of-speech detection evaluation")
+    parser.add_argument("fixtures", nargs="*", help="WAV files with .json sidecars")
+    parser.add_argument("--synthetic", type=int, default=0, help="Generate N synthetic utterances")
+    parser.add_argument("--chunk-ms", type=int, nargs=2, default=[20, 250], metavar=("MIN", "MAX"),
+                        help="Client chunk size range")
+    parser.add_argument("--frame-ms", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    cases = {}
+    if args.fixtures:
+        cases["fixtures"] = [load_fixture(path) for path in args.fixtures]
+    count = args.synthetic or (0 if args.fixtures else 100)
+    for case in CASES if count else ():
+        cases[case] = [synthetic_utterance(rng, case) for _ in range(count)]
+
+    detectors = {
+        "energy/chunk": lambda: EnergyThresholdVAD(),
+        f"frame vad {args.frame_ms}ms": lambda: VoiceActivityDetector(frame_ms=args.frame_ms),
+    }
+    for case, fixtures in cases.items():
+        print(f"{case}: {len(fixtures)} utterances, chunks {args.chunk_ms[0]}-{args.chunk_ms[1]}ms")
+        for name, make in detectors.items():
+            chunk_rng = np.random.default_rng(args.seed + 1)  # Same chunking for every detector
+            results = [(run_detector(make(), audio, args.chunk_ms, chunk_rng), end) for audio, end in fixtures]
+            summarize(name, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+# Per-request cost of fetching the VieNeu preset voice
+#
+# Times what each TTS request used to do first (vieneu.get_preset_voice) against
+# the shared VoiceCache lookup, plus one short infer() for scale.
+#
+# Run: python bench_voice_cache.py --voice Binh --repeats 20
+#      python bench_voice_cache.py --backbone pnnbao-ump/VieNeu-TTS-0.3B-q8-gguf
+
+import argparse
+import statistics
+import time
+
+from vieneu_voices import VoiceCache
+
+
+def timed(fn, repeats: int) -> float:
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="VieNeu voice cache benchmark")
+    parser.add_argument("--voice", default="Binh")
+    parser.add_argument("--backbone", help="Backbone repo (default q4)")
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--text", default="Da em ho tro anh ngay a.")
+    args = parser.parse_args()
+
+    from vieneu import Vieneu
+
+    print("Loading VieNeu-TTS...")
+    vieneu = Vieneu(backbone_repo=args.backbone) if args.backbone else Vieneu()
+
+    cache = VoiceCache(vieneu)
+    start = time.perf_counter()
+    cache.warm()
+    warm_ms = (time.perf_counter() - start) * 1000
+
+    uncached_ms = timed(lambda: vieneu.get_preset_voice(args.voice), args.repeats)
+    cached_ms = timed(lambda: cache.get(args.voice), args.repeats)
+
+    voice = cache.get(args.voice)
+    infer_ms = timed(
+        lambda: vieneu.infer(text=args.text, voice=voice, temperature=1.0, top_k=50),
+        max(1, args.repeats // 5),
+    )
+
+    print()
+    print(f"Warm all {len(cache.names())} presets (startup, once): {warm_ms:.0f}ms")
+    print(f"get_preset_voice per request:  {uncached_ms:.2f}ms")
+    print(f"VoiceCache.get per request:    {cached_ms:.4f}ms")
+    print(f"infer() of {len(args.text)} chars:         {infer_ms:.0f}ms")
+    print(f"Saving per request: {uncached_ms - cached_ms:.2f}ms "
+          f"({(uncached_ms - cached_ms) / (uncached_ms + infer_ms) * 100:.1f}% of voice + infer)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+# Token-budgeted conversation history with a rolling summary
+# Claude gets the newest whole turns (user message + reply) that fit in a
+# token budget. Older turns are folded into a short running summary that
+# keeps the form fields already filled, so the model still knows what was
+# agreed. Summaries are written by a background worker after the turn is
+# answered, so they never add to turn latency.
+#
+# Usage:
+#   history = ConversationHistory(sessions, summarize=summarize_with_claude)
+#   messages, summary = history.context(session_id)
+#   reply = claude(system=prompt_with(summary), messages=messages + [user_message])
+#   history.append(session_id, user_text, reply)
+#
+# Configuration (environment):
+#   HISTORY_TOKEN_BUDGET - tokens of recent turns sent with each request (default 1500)
+
+from __future__ import annotations
+
+import json
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "1500"))
+
+# Instructions for the model that writes the summary
+SUMMARY_SYSTEM = """Ban tom tat cuoc tro chuyen giua tro ly ao VNeID va nguoi dung.
+Viet toi da 4 cau ngan: thu tuc dang lam, buoc hien tai, cac thong tin nguoi dung da cung cap
+va cau hoi dang cho tra loi. Chi ghi su that, khong them loi chao. Tra loi bang tieng Viet khong dau."""
+
+_ACTION_RE = re.compile(r"@@(?:ACTION|AI)@@(.+?)@@END@@", re.DOTALL)
+_FIELDS_RE = re.compile(r"\nFORM DA DIEN: (\{.*\})\s*$")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (Vietnamese with diacritics is about 3 UTF-8 bytes per token)"""
+    return len(text.encode("utf-8")) // 3 + 1
+
+
+def group_turns(history: list[dict]) -> list[list[dict]]:
+    """Split messages into turns, each starting with a user message"""
+    turns = []
+    for message in history:
+        if message.get("role") == "user" or not turns:
+            turns.append([])
+        turns[-1].append(message)
+    # A leading assistant message has no user turn (Claude requires one first)
+    if turns and turns[0][0].get("role") != "user":
+        turns.pop(0)
+    return turns
+
+
+def fit_turns(history: list[dict], budget: int = HISTORY_TOKEN_BUDGET) -> tuple[list[dict], list[dict]]:
+    """
+    Split history into (kept, dropped) at a turn boundary.
+
+    kept holds the newest whole turns within budget (at least the newest
+    turn), dropped the older messages that should be summarized.
+    """
+    turns = group_turns(history)
+    used = 0
+    first_kept = len(turns)
+    while first_kept > 0:
+        cost = sum(estimate_tokens(m.get("content") or "") for m in turns[first_kept - 1])
+        if used + cost > budget and first_kept < len(turns):
+            break
+        used += cost
+        first_kept -= 1
+
+    dropped = [m for turn in turns[:first_kept] for m in turn]
+    kept = [m for turn in turns[first_kept:] for m in turn]
+    return kept, dropped
+
+
+def extract_filled_fields(messages: list[dict]) -> dict:
+    """Form data set by fill_field actions in the assistant replies"""
+    fields = {}
+    for message in messages:
+        if message.get("role") != "assistant":
+            continue
+        for block in _ACTION_RE.findall(message.get("content") or ""):
+            try:
+                action = json.loads(block.strip())
+            except ValueError:
+                continue
+            if action.get("action") == "fill_field" and isinstance(action.get("data"), dict):
+                fields.update(action["data"])
+    return fields
+
+
+def summary_request(summary: str, messages: list[dict]) -> str:
+    """User message asking the model to fold messages into the summary"""
+    lines = [f"TOM TAT TRUOC: {split_summary(summary)[0] or '(chua co)'}", "", "DOAN HOI THOAI MOI:"]
+    for message in messages:
+        speaker = "User" if message.get("role") == "user" else "AI"
+        lines.append(f"{speaker}: {_ACTION_RE.sub('', message.get('content') or '').strip()}")
+    return "\n".join(lines)
+
+
+def split_summary(summary: str) -> tuple[str, dict]:
+    """(summary text, filled fields) of a stored summary"""
+    match = _FIELDS_RE.search(summary)
+    if not match:
+        return summary.strip(), {}
+    try:
+        fields = json.loads(match.group(1))
+    except ValueError:
+        fields = {}
+    return summary[:match.start()].strip(), fields
+
+
+def join_summary(text: str, fields: dict) -> str:
+    """Stored form: summary text, then the filled fields on their own line"""
+    if not fields:
+        return text.strip()
+    return f"{text.strip()}\nFORM DA DIEN: {json.dumps(fields, ensure_ascii=False)}"
+
+
+def merge_summary(summary: str, new_text: str, messages: list[dict]) -> str:
+    """Summary after folding messages in (fields from the actions are kept exactly)"""
+    _, fields = split_summary(summary)
+    fields.update(extract_filled_fields(messages))
+    return join_summary(new_text, fields)
+
+
+class ConversationHistory:
+    """
+    Session histories trimmed by token budget, with background summaries.
+
+    - context() returns the newest whole turns within the budget plus the
+      current summary; nothing is summarized on the request path
+    - append() records a finished turn; if older turns no longer fit, a
+      worker summarizes them and removes them from the stored history
+    - Turns that don't fit are still stored until their summary is
+      written, so a slow or failed summary never loses them (the session
+      store's message cap is the hard limit)
+
+    summarize(summary, messages) -> str must return the new summary text.
+    """
+
+    def __init__(
+        self,
+        store,
+        summarize: Callable[[str, list[dict]], str],
+        budget: int = HISTORY_TOKEN_BUDGET,
+        workers: int = 2,
+    ):
+        self._store = store
+        self._summarize = summarize
+        self._budget = budget
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="history-summary")
+        # Striped per-session locks (bounded, no cleanup needed)
+        self._locks = [threading.Lock() for _ in range(64)]
+        self._pending_lock = threading.Lock()
+        self._pending: set[str] = set()
+        self.summaries = 0
+        self.failures = 0
+
+    def context(self, session_id: str) -> tuple[list[dict], str]:
+        """(messages within the token budget, summary of older turns)"""
+        kept, _ = fit_turns(self._store.load(session_id), self._budget)
+        return kept, self._store.load_summary(session_id)
+
+    def append(self, session_id: str, user_text: str, reply: str) -> None:
+        """Record a finished turn and summarize older turns in the background"""
+        with self._lock(session_id):
+            history = self._store.load(session_id)
+            history.append({"role": "user", "content": user_text})
+            history.append({"role": "assistant", "content": reply})
+            self._store.save(session_id, history)
+
+        _, dropped = fit_turns(history, self._budget)
+        if dropped:
+            with self._pending_lock:
+                if session_id in self._pending:
+                    return
+                self._pending.add(session_id)
+            self._executor.submit(self._compact, session_id)
+
+    def delete(self, session_id: str) -> None:
+        with self._lock(session_id):
+            self._store.delete(session_id)
+
+    def stats(self) -> dict:
+        return {"budget_tokens": self._budget, "summaries": self.summaries, "failures": self.failures}
+
+    def _lock(self, session_id: str) -> threading.Lock:
+        return self._locks[hash(session_id) % len(self._locks)]
+
+    def _compact(self, session_id: str) -> None:
+        try:
+            # Turns appended while a summary was being written are handled
+            # in the next round
+            while self._compact_once(session_id):
+                pass
+        except Exception as e:
+            self.failures += 1
+            print(f"History summary error: {e}")
+        finally:
+            with self._pending_lock:
+                self._pending.discard(session_id)
+
+    def _compact_once(self, session_id: str) -> bool:
+        """Summarize the turns over budget; False when there are none (or on reset)"""
+        history = self._store.load(session_id)
+        summary = self._store.load_summary(session_id)
+        _, dropped = fit_turns(history, self._budget)
+        if not dropped:
+            return False
+
+        # Slow part (model call) runs without the session lock
+        new_summary = merge_summary(summary, self._summarize(summary, dropped), dropped)
+
+        with self._lock(session_id):
+            current = self._store.load(session_id)
+            if current[:len(dropped)] != dropped:
+                return False  # Session was reset meanwhile
+            self._store.save_summary(session_id, new_summary)
+            self._store.save(session_id, current[len(dropped):])
+        self.summaries += 1
+        print(f"History: summarized {len(dropped)} messages of session {session_id[:16]}")
+        return True
@@ -0,0 +1,182 @@
+# Bounded inference executors for local model plugins
+# One thread pool per model with its own concurrency limit and queue bound,
+# instead of every plugin sharing asyncio's default executor.
+#
+# Usage:
+#   executor = get_executor("vieneu-default", max_workers=1, max_queue=8)
+#   audio = await executor.run(vieneu.infer, text)
+#   texts = executor.call(batch_fn, items)   # blocking, from a worker thread
+#
+# Configuration (environment, overrides plugin defaults for every pool):
+#   INFERENCE_MAX_WORKERS  - threads per model pool
+#   INFERENCE_MAX_QUEUE    - calls allowed to wait per pool before rejecting
+#   INFERENCE_MAX_WAIT     - seconds a call may wait before it is shed (0 = no limit)
+
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable
+
+
+class ExecutorSaturatedError(Exception):
+    """Raised when a model pool is full or a call waited too long to start"""
+
+
+class InferenceExecutor:
+    """
+    Thread pool for one model with backpressure.
+
+    - At most max_workers calls run at once
+    - At most max_queue calls wait; further calls fail immediately with
+      ExecutorSaturatedError instead of growing latency without bound
+    - Calls that waited longer than max_wait before starting are shed
+      (not run) with ExecutorSaturatedError
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        max_workers: int = 1,
+        max_queue: int = 8,
+        max_wait: float | None = None,
+    ):
+        self.name = name
+        self._max_workers = max_workers
+        self._max_queue = max_queue
+        self._max_wait = max_wait
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"infer-{name}")
+
+        # Metrics
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self._running = 0
+        self._completed = 0
+        self._rejected = 0
+        self._shed = 0
+        self._wait_times = deque(maxlen=256)  # Recent queue wait times (seconds)
+
+    async def run(self, fn: Callable[..., Any], *args) -> Any:
+        """Run fn(*args) on this model's pool"""
+        future = self._submit(fn, args)
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            # Caller gave up (e.g. barge-in) - if the call never started, free its slot
+            if future.cancelled() or future.cancel():
+                with self._lock:
+                    self._waiting -= 1
+            raise
+
+    def call(self, fn: Callable[..., Any], *args) -> Any:
+        """Blocking run() for worker threads (e.g. batch scheduler workers)"""
+        return self._submit(fn, args).result()
+
+    def _submit(self, fn: Callable[..., Any], args: tuple) -> Future:
+        """Queue fn(*args) on the pool with the queue bound and wait accounting"""
+        with self._lock:
+            if self._waiting >= self._max_queue:
+                self._rejected += 1
+                raise ExecutorSaturatedError(
+                    f"{self.name}: {self._waiting} calls waiting (max {self._max_queue})"
+                )
+            self._waiting += 1
+
+        submitted = time.monotonic()
+
+        def call():
+            waited = time.monotonic() - submitted
+            with self._lock:
+                self._waiting -= 1
+                self._wait_times.append(waited)
+                if self._max_wait and waited > self._max_wait:
+                    self._shed += 1
+                    shed = True
+                else:
+                    self._running += 1
+                    shed = False
+
+            if shed:
+                raise ExecutorSaturatedError(f"{self.name}: shed after waiting {waited:.2f}s")
+
+            try:
+                return fn(*args)
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._completed += 1
+
+        return self._pool.submit(call)
+
+    def stats(self) -> dict:
+        with self._lock:
+            waits = sorted(self._wait_times)
+            return {
+                "name": self.name,
+                "workers": self._max_workers,
+                "queue_depth": self._waiting,
+                "running": self._running,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "shed": self._shed,
+                "wait_ms_p50": round(waits[len(waits) // 2] * 1000, 1) if waits else 0.0,
+                "wait_ms_p95": round(waits[int(len(waits) * 0.95)] * 1000, 1) if waits else 0.0,
+            }
+
+
+_executors: dict[str, InferenceExecutor] = {}
+_executors_lock = threading.Lock()
+
+
+def get_executor(
+    name: str,
+    *,
+    max_workers: int = 1,
+    max_queue: int = 8,
+    max_wait: float | None = None,
+) -> InferenceExecutor:
+    """
+    Get the process-wide pool for a model, creating it on first use.
+
+    The first caller's limits win; environment settings override them.
+    """
+    with _executors_lock:
+        executor = _executors.get(name)
+        if executor is None:
+            env_wait = float(os.getenv("INFERENCE_MAX_WAIT", "0"))
+            executor = InferenceExecutor(
+                name,
+                max_workers=int(os.getenv("INFERENCE_MAX_WORKERS", max_workers)),
+                max_queue=int(os.getenv("INFERENCE_MAX_QUEUE", max_queue)),
+                max_wait=env_wait or max_wait,
+            )
+            _executors[name] = executor
+        return executor
+
+
+def executor_stats() -> list[dict]:
+    """Metrics for every model pool"""
+    with _executors_lock:
+        executors = list(_executors.values())
+    return [executor.stats() for executor in executors]
+
+
+def log_stats_periodically(interval: float = 30.0):
+    """Print pool metrics every interval seconds from a background thread"""
+    def loop():
+        while True:
+            time.sleep(interval)
+            for stats in executor_stats():
+                print(
+                    f"Inference [{stats['name']}]: queue={stats['queue_depth']} "
+                    f"running={stats['running']} done={stats['completed']} "
+                    f"rejected={stats['rejected']} shed={stats['shed']} "
+                    f"wait p50={stats['wait_ms_p50']}ms p95={stats['wait_ms_p95']}ms"
+                )
+
+    threading.Thread(target=loop, name="inference-stats", daemon=True).start()
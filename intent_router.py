@@ -0,0 +1,129 @@
+# Fast-path intent router
+# Short fixed commands ("tiep tuc", "quay lai", "ve trang chu", ...) map to
+# one action each, so they are answered locally with a canned reply instead
+# of a Claude round-trip. The canned replies are prewarmed in the TTS phrase
+# cache, so the whole turn takes milliseconds.
+#
+# Only high-confidence matches are routed: after accent-insensitive
+# normalization the whole utterance must be one command, optionally wrapped
+# in politeness words ("em oi", "a", "nhe", ...). Anything else goes to Claude.
+#
+# Usage:
+#   match = match_intent(transcript, screen_context.get("available_actions"))
+#   if match:
+#       speak(match.reply); send_action(match.action)
+#
+# Configuration (environment):
+#   INTENT_ROUTER - "0" sends every turn to Claude
+
+from __future__ import annotations
+
+import os
+import re
+import unicodedata
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class Intent:
+    action: str
+    phrases: tuple[str, ...]  # Normalized (no accents, lowercase)
+    reply: str
+    anywhere: bool = False  # Allowed even if the screen doesn't list the action (or sends no list)
+
+
+# Commands from the system prompts' action tables
+INTENTS = (
+    Intent(
+        "next_step",
+        ("tiep tuc", "tiep", "tiep theo", "buoc tiep", "buoc tiep theo", "sang buoc tiep",
+         "ok", "oke", "okay", "duoc", "duoc roi", "dong y", "u", "uh"),
+        "Da, em chuyen sang buoc tiep theo nhe.",
+    ),
+    Intent(
+        "prev_step",
+        ("quay lai", "tro lai", "lui lai", "buoc truoc", "quay lai buoc truoc"),
+        "Da, em quay lai buoc truoc nhe.",
+    ),
+    Intent(
+        "navigate_lltp",
+        ("lam ly lich tu phap", "ly lich tu phap", "xin ly lich tu phap",
+         "mo ly lich tu phap", "lam lltp", "lltp"),
+        "Vang, em mo form Ly lich tu phap cho anh nhe!",
+        anywhere=True,
+    ),
+    Intent(
+        "navigate_home",
+        ("ve trang chu", "trang chu", "quay ve trang chu", "ve man hinh chinh", "man hinh chinh"),
+        "Da, em ve trang chu nhe.",
+        anywhere=True,
+    ),
+)
+
+# Words around a command that don't change its meaning
+PREFIXES = ("em oi", "oi", "vang", "da", "thi", "toi muon", "toi can", "minh muon",
+            "cho toi", "cho minh", "hay", "em")
+SUFFIXES = ("a", "nhe", "nha", "di", "luon", "voi", "em", "giup toi", "giup em",
+            "cho toi", "cho minh")
+
+
+@dataclass(frozen=True)
+class IntentMatch:
+    action: str
+    reply: str
+
+
+def normalize_vietnamese(text: str) -> str:
+    """Lowercase, strip accents (đ -> d) and punctuation, collapse whitespace"""
+    text = unicodedata.normalize("NFD", text.lower()).replace("đ", "d")
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", text).split())
+
+
+def _alternation(phrases) -> str:
+    # Longest first so "quay lai buoc truoc" wins over "quay lai"
+    return "|".join(re.escape(p) for p in sorted(set(phrases), key=len, reverse=True))
+
+
+class IntentRouter:
+    """All intents compiled into one anchored regex (one named group per intent)"""
+
+    def __init__(self, intents=INTENTS):
+        self._intents = {f"i{n}": intent for n, intent in enumerate(intents)}
+        commands = "|".join(
+            f"(?P<{group}>{_alternation(intent.phrases)})" for group, intent in self._intents.items()
+        )
+        self._pattern = re.compile(
+            rf"(?:(?:{_alternation(PREFIXES)}) )*(?:{commands})(?: (?:{_alternation(SUFFIXES)}))*"
+        )
+
+    def match(self, text: str, available_actions=None) -> IntentMatch | None:
+        """Routed intent for an utterance, or None if it needs the LLM"""
+        m = self._pattern.fullmatch(normalize_vietnamese(text))
+        if m is None:
+            return None
+
+        intent = self._intents[m.lastgroup]
+        # Without a screen context only screen-independent commands are safe
+        # ("ok" on the home screen is not a step command)
+        if not intent.anywhere and intent.action not in (available_actions or ()):
+            return None
+        return IntentMatch(intent.action, intent.reply)
+
+    def replies(self) -> list[str]:
+        return [intent.reply for intent in self._intents.values()]
+
+
+_router = IntentRouter()
+
+
+def match_intent(text: str, available_actions=None) -> IntentMatch | None:
+    """Match with the default intent table (None when INTENT_ROUTER=0)"""
+    if os.getenv("INTENT_ROUTER", "1") == "0" or not text:
+        return None
+    return _router.match(text, available_actions)
+
+
+def canned_replies() -> list[str]:
+    """Replies of the default intents (for TTS prewarming)"""
+    return _router.replies()
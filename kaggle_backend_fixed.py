@@ -5,6 +5,10 @@
 # CELL 1: Install dependencies
 # ==========================================
 # !pip install -q openai-whisper anthropic flask flask-cors pyngrok pydub
+# Shared modules: upload these files from the repo to /kaggle/working (the
+# notebook's working directory, so they import like installed packages):
+#   audio_decode.py, history_manager.py, intent_router.py, prompt_cache.py,
+#   session_store.py
 
 # ==========================================
 # CELL 2: Load Whisper Model
@@ -26,6 +30,16 @@ import re
 import hashlib
 import tempfile
 import os
+import threading
+import time
+from collections import OrderedDict
+
+# Shared modules from the repo (see CELL 1)
+from audio_decode import AudioDecodeError, decode_audio_bytes
+from history_manager import SUMMARY_SYSTEM, ConversationHistory, summary_request
+from intent_router import match_intent
+from prompt_cache import log_usage, system_blocks, usage_stats
+from session_store import DEFAULT_SESSION, get_session_store, request_session_id
 
 CLAUDE_API_KEY = os.environ.get("CLAUDE_API_KEY", "your-claude-api-key-here")
 client = anthropic.Anthropic(api_key=CLAUDE_API_KEY)
@@ -36,12 +50,171 @@ client = anthropic.Anthropic(api_key=CLAUDE_API_KEY)
 # Pass screen_context from frontend for flexibility
 # ==========================================
 
-response_cache = {}
-conversation_history = []
-MAX_HISTORY = 10  # Keep last 5 exchanges for better context
+MAX_HISTORY = 40  # Stored messages per session (hard cap)
+
+# Per-client sessions (session_store.py): clients send a session_id, each gets
+# its own history. SESSION_STORE=sqlite shares them between worker processes;
+# SESSION_TTL / SESSION_MAX / SESSION_DB configure the store.
+sessions = get_session_store(max_messages=MAX_HISTORY)
+
+
+def summarize_history(summary, messages):
+    """Fold older turns into the session summary (runs in the background)"""
+    response = client.messages.create(
+        model="claude-3-5-haiku-20241022",
+        max_tokens=200,
+        system=SUMMARY_SYSTEM,
+        messages=[{"role": "user", "content": summary_request(summary, messages)}],
+    )
+    log_usage(response.usage, "Summary")
+    return response.content[0].text
+
+
+# Recent whole turns within HISTORY_TOKEN_BUDGET (env, default 1500 tokens) go
+# to Claude; older turns are folded into a rolling summary (history_manager.py)
+# whose "FORM DA DIEN" line keeps the fields set by fill_field actions.
+conversations = ConversationHistory(sessions, summarize=summarize_history)
+
+
+# Response caches: identical turns skip Claude and ElevenLabs
+#   response_cache: (screen, user, utterance, recent history, summary) -> Claude reply + parsed action
+#   tts_cache:      spoken reply text -> base64 MP3
+RESPONSE_CACHE_SIZE = 1000
+RESPONSE_CACHE_TTL = 3600  # Forms/prompts change, don't keep replies forever
+TTS_CACHE_SIZE = 500
+TTS_CACHE_MAX_BYTES = 64 * 1024 * 1024
+TTS_CACHE_TTL = 24 * 3600
+CACHE_HISTORY_MESSAGES = 2  # Previous exchange is part of the reply key
+
+
+class TTLCache:
+    """Thread-safe LRU cache with TTL, entry and size limits, and hit counters"""
+
+    def __init__(self, max_entries, ttl, max_bytes=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> (value, stored_at, size)
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or time.time() - entry[1] > self.ttl:
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, size=1):
+        if self.max_bytes and size > self.max_bytes:
+            return
+        with self.lock:
+            self._remove(key)
+            self.entries[key] = (value, time.time(), size)
+            self.bytes += size
+            while self.entries and (
+                len(self.entries) > self.max_entries
+                or (self.max_bytes and self.bytes > self.max_bytes)
+            ):
+                self._remove(next(iter(self.entries)))
+
+    def _remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry[2]
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "bytes": self.bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+
+response_cache = TTLCache(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL)
+tts_cache = TTLCache(TTS_CACHE_SIZE, TTS_CACHE_TTL, max_bytes=TTS_CACHE_MAX_BYTES)
+
+
+def normalize_utterance(text):
+    """Lowercase, drop punctuation, collapse whitespace ("Xin chào." == "xin chào")"""
+    return " ".join(re.sub(r"[^\w\s]", " ", text.lower()).split())
+
+
+def fingerprint(value):
+    """Stable short hash of a JSON-able value (dict key order ignored)"""
+    data = json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()[:16]
+
+
+def response_cache_key(text, user_context, screen_context, history, summary=""):
+    """Everything the Claude reply depends on: prompt inputs, utterance, recent history and summary"""
+    return (
+        fingerprint(screen_context),
+        fingerprint(user_context),
+        normalize_utterance(text),
+        fingerprint([history[-CACHE_HISTORY_MESSAGES:], summary]),
+    )
+
+
+# Same on every turn - kept ahead of the dynamic part (see prompt_cache.py)
+SYSTEM_PROMPT_STATIC = """Bạn là trợ lý ảo VNeID, nói chuyện như một người bạn thân thiện, tự nhiên.
+
+CÁCH NÓI CHUYỆN:
+- Xưng "em", gọi user như ở phần XƯNG HÔ bên dưới
+- Nói ngắn gọn, tự nhiên như nhắn tin với bạn
+- KHÔNG đọc danh sách, KHÔNG liệt kê
+- Hỏi 1 câu thôi, đợi trả lời rồi hỏi tiếp
+- Khi user hỏi gì, trả lời xong rồi quay lại flow
+
+VÍ DỤ HỘI THOẠI TỰ NHIÊN:
+
+User: "Xin chào"
+AI: "Chào anh! Em giúp gì được anh ạ? @@AI@@{"action": "none", "data": {}}@@END@@"
+
+User: "Tôi muốn làm lý lịch tư pháp"
+AI: "Dạ em hỗ trợ anh ngay! Anh làm LLTP để xin việc hay mục đích khác ạ? @@AI@@{"action": "navigate", "navigate_to": "lltp", "data": {}, "field_asking": "muc_dich"}@@END@@"
+
+User: "Xin việc"
+AI: "Ok anh, anh cần mấy bản ạ? @@AI@@{"action": "fill_field", "data": {"muc_dich": "Xin việc làm"}, "field_asking": "so_ban"}@@END@@"
+
+User: "2"
+AI: "2 bản nhé. Em chuyển sang bước xác nhận nha! @@AI@@{"action": "fill_field", "data": {"so_ban": "2"}, "next_step": true}@@END@@"
+
+User: "Khoan, phiếu số 1 với số 2 khác nhau sao?"
+AI: "Số 1 là cho cá nhân anh tự xin, số 2 là cơ quan yêu cầu cấp cho anh. Anh cần loại nào ạ? @@AI@@{"action": "none", "data": {}, "field_asking": "loai_phieu"}@@END@@"
+
+User: "Số 1"
+AI: "Ok số 1. Tiếp tục nhé anh! @@AI@@{"action": "fill_field", "data": {"loai_phieu": "so1"}}@@END@@"
+
+User: "Bao lâu có kết quả?"
+AI: "Thường 3-5 ngày làm việc anh ạ. Mình tiếp tục điền form nhé? @@AI@@{"action": "none", "data": {}}@@END@@"
+
+User: "Ừ"
+AI: "Ok, anh kiểm tra thông tin rồi xác nhận giúp em nha! @@AI@@{"action": "next_step", "data": {}}@@END@@"
+
+ACTIONS: "none" (chat), "navigate" (chuyển màn), "fill_field" (điền data), "next_step" (bước tiếp), "prev_step" (quay lại), "submit" (gửi)
+OUTPUT: Câu tự nhiên @@AI@@{"action": "...", "data": {}, "navigate_to": "...", "next_step": true/false, "field_asking": "..."}@@END@@
+"""
+
+
+def get_system_prompt(user_context, screen_context, summary=""):
+    """System prompt blocks: cached static prefix + this turn's user/screen context"""
+    return system_blocks(SYSTEM_PROMPT_STATIC, get_dynamic_prompt(user_context, screen_context, summary))
 
-def get_system_prompt(user_context, screen_context):
-    """Generate dynamic system prompt based on screen context"""
+
+def get_dynamic_prompt(user_context, screen_context, summary=""):
+    """Part of the system prompt that changes between users, screens and turns"""
 
     # Extract user info
     user_info = ""
@@ -103,74 +276,60 @@ Actions có thể: {', '.join(available_actions) if available_actions else 'none
 
     user_name = user_context.get('hoTen', '').split()[-1] if user_context and user_context.get('hoTen') else 'anh'
 
-    return f"""Bạn là trợ lý ảo VNeID, nói chuyện như một người bạn thân thiện, tự nhiên.
+    summary_info = f"\nTÓM TẮT CÁC LƯỢT TRƯỚC:\n{summary}\n" if summary else ""
 
+    return f"""XƯNG HÔ: gọi user là "anh {user_name}" hoặc "anh"
 {user_info}
-{screen_info}
-
-CÁCH NÓI CHUYỆN:
-- Xưng "em", gọi user là "anh {user_name}" hoặc "anh"
-- Nói ngắn gọn, tự nhiên như nhắn tin với bạn
-- KHÔNG đọc danh sách, KHÔNG liệt kê
-- Hỏi 1 câu thôi, đợi trả lời rồi hỏi tiếp
-- Khi user hỏi gì, trả lời xong rồi quay lại flow
-
-VÍ DỤ HỘI THOẠI TỰ NHIÊN:
-
-User: "Xin chào"
-AI: "Chào anh {user_name}! Em giúp gì được anh ạ? @@AI@@{{"action": "none", "data": {{}}}}@@END@@"
-
-User: "Tôi muốn làm lý lịch tư pháp"
-AI: "Dạ em hỗ trợ anh ngay! Anh làm LLTP để xin việc hay mục đích khác ạ? @@AI@@{{"action": "navigate", "navigate_to": "lltp", "data": {{}}, "field_asking": "muc_dich"}}@@END@@"
-
-User: "Xin việc"
-AI: "Ok anh, anh cần mấy bản ạ? @@AI@@{{"action": "fill_field", "data": {{"muc_dich": "Xin việc làm"}}, "field_asking": "so_ban"}}@@END@@"
-
-User: "2"
-AI: "2 bản nhé. Em chuyển sang bước xác nhận nha! @@AI@@{{"action": "fill_field", "data": {{"so_ban": "2"}}, "next_step": true}}@@END@@"
-
-User: "Khoan, phiếu số 1 với số 2 khác nhau sao?"
-AI: "Số 1 là cho cá nhân anh tự xin, số 2 là cơ quan yêu cầu cấp cho anh. Anh cần loại nào ạ? @@AI@@{{"action": "none", "data": {{}}, "field_asking": "loai_phieu"}}@@END@@"
-
-User: "Số 1"
-AI: "Ok số 1. Tiếp tục nhé anh! @@AI@@{{"action": "fill_field", "data": {{"loai_phieu": "so1"}}}}@@END@@"
-
-User: "Bao lâu có kết quả?"
-AI: "Thường 3-5 ngày làm việc anh ạ. Mình tiếp tục điền form nhé? @@AI@@{{"action": "none", "data": {{}}}}@@END@@"
-
-User: "Ừ"
-AI: "Ok, anh kiểm tra thông tin rồi xác nhận giúp em nha! @@AI@@{{"action": "next_step", "data": {{}}}}@@END@@"
-
-ACTIONS: "none" (chat), "navigate" (chuyển màn), "fill_field" (điền data), "next_step" (bước tiếp), "prev_step" (quay lại), "submit" (gửi)
-OUTPUT: Câu tự nhiên @@AI@@{{"action": "...", "data": {{}}, "navigate_to": "...", "next_step": true/false, "field_asking": "..."}}@@END@@
-"""
+{screen_info}{summary_info}"""
+
+
+# Fast path (intent_router.py): fixed commands ("tiep tuc", "quay lai", ...) get
+# a canned reply without a Claude call. The router decides the action; the
+# spoken reply (with accents, for ElevenLabs) and @@AI@@ payload are this
+# backend's.
+FAST_PATH_REPLIES = {
+    "next_step": ("Dạ, em chuyển sang bước tiếp theo nhé.", {"action": "next_step", "data": {}, "next_step": True}),
+    "prev_step": ("Dạ, em quay lại bước trước nhé.", {"action": "prev_step", "data": {}}),
+    "navigate_lltp": ("Vâng, em mở form Lý lịch tư pháp cho anh nhé!",
+                      {"action": "navigate", "navigate_to": "lltp", "data": {}}),
+    "navigate_home": ("Dạ, em về trang chủ nhé.", {"action": "navigate", "navigate_to": "home", "data": {}}),
+}
+
+
+def fast_path_reply(text, screen_context=None):
+    """Canned reply in Claude's output format for a fixed command, or None"""
+    match = match_intent(text, (screen_context or {}).get("available_actions"))
+    if match is None or match.action not in FAST_PATH_REPLIES:
+        return None
+    reply, payload = FAST_PATH_REPLIES[match.action]
+    return f"{reply} @@AI@@{json.dumps(payload)}@@END@@"
 
 
-def call_claude(user_message, user_context=None, screen_context=None):
+def call_claude(user_message, user_context=None, screen_context=None, session_id=DEFAULT_SESSION):
     """Call Claude API with full context"""
-    global conversation_history
-
     try:
-        # Add user message to history
-        conversation_history.append({"role": "user", "content": user_message})
+        # This client's recent turns + summary of the older ones
+        messages, summary = conversations.context(session_id)
+        messages.append({"role": "user", "content": user_message})
 
-        # Keep history manageable
-        if len(conversation_history) > MAX_HISTORY:
-            conversation_history = conversation_history[-MAX_HISTORY:]
-
-        # Generate dynamic system prompt
-        system_prompt = get_system_prompt(user_context, screen_context)
+        result = fast_path_reply(user_message, screen_context)
+        if result:
+            print("Fast path: answered without Claude")
+        else:
+            # Generate dynamic system prompt
+            system_prompt = get_system_prompt(user_context, screen_context, summary)
 
-        response = client.messages.create(
-            model="claude-3-5-haiku-20241022",
-            max_tokens=300,
-            system=system_prompt,
-            messages=conversation_history
-        )
-        result = response.content[0].text
+            response = client.messages.create(
+                model="claude-3-5-haiku-20241022",
+                max_tokens=300,
+                system=system_prompt,
+                messages=messages
+            )
+            log_usage(response.usage)
+            result = response.content[0].text
 
-        # Add to history
-        conversation_history.append({"role": "assistant", "content": result})
+        # Add to history (older turns get summarized in the background)
+        conversations.append(session_id, user_message, result)
 
         return result
     except Exception as e:
@@ -178,11 +337,14 @@ def call_claude(user_message, user_context=None, screen_context=None):
         return None
 
 
-def reset_conversation():
-    """Reset conversation state"""
-    global conversation_history, response_cache
-    conversation_history = []
-    response_cache = {}
+def record_exchange(user_message, reply, session_id=DEFAULT_SESSION):
+    """Add a turn answered without calling Claude (cache hit) to the history"""
+    conversations.append(session_id, user_message, reply)
+
+
+def reset_conversation(session_id=DEFAULT_SESSION):
+    """Reset one client's conversation"""
+    conversations.delete(session_id)
 
 
 def extract_ai_response(text):
@@ -312,7 +474,23 @@ def convert_audio_to_wav(input_path):
         return None
 
 
-def process_audio(audio_path, user_context=None, screen_context=None):
+def transcribe_and_process(audio, user_context=None, screen_context=None, session_id=DEFAULT_SESSION):
+    """Transcribe a decoded 16kHz float32 array and run it through Claude"""
+    result = whisper_model.transcribe(audio, language="vi")
+    transcript = (result.get("text") or "").strip()
+
+    if not transcript:
+        return {
+            "success": False,
+            "error": "Không nghe rõ, bạn nói lại được không?",
+            "transcript": ""
+        }
+
+    print(f"Transcript: {transcript}")
+    return process_text(transcript, user_context, screen_context, session_id)
+
+
+def process_audio(audio_path, user_context=None, screen_context=None, session_id=DEFAULT_SESSION):
     """Process audio file with Whisper - always convert first for reliability"""
     converted_path = None
     try:
@@ -339,7 +517,7 @@ def process_audio(audio_path, user_context=None, screen_context=None):
             }
 
         print(f"Transcript: {transcript}")
-        return process_text(transcript, user_context, screen_context)
+        return process_text(transcript, user_context, screen_context, session_id)
 
     except Exception as e:
         print(f"Whisper Error: {e}")
@@ -356,7 +534,7 @@ def process_audio(audio_path, user_context=None, screen_context=None):
                 pass
 
 
-def process_text(text, user_context=None, screen_context=None):
+def process_text(text, user_context=None, screen_context=None, session_id=DEFAULT_SESSION):
     """
     DYNAMIC AI VOICE ASSISTANT
     Fully AI-driven - passes screen context to Claude for intelligent responses
@@ -365,20 +543,30 @@ def process_text(text, user_context=None, screen_context=None):
         print(f"Processing: {text}")
         print(f"Screen context: {screen_context}")
 
-        # Call Claude with full context
-        claude_resp = call_claude(text, user_context, screen_context)
-
-        if not claude_resp:
-            return {
-                "success": False,
-                "error": "Xin lỗi, bạn nói lại được không?",
-                "transcript": text
-            }
+        # Same screen, utterance, recent history and summary -> reuse the reply
+        cache_key = response_cache_key(text, user_context, screen_context,
+                                       sessions.load(session_id), sessions.load_summary(session_id))
+        cached = response_cache.get(cache_key)
+        if cached:
+            claude_resp, ai_data = cached
+            record_exchange(text, claude_resp, session_id)
+            print(f"Claude response (cached): {claude_resp}")
+        else:
+            # Call Claude with full context
+            claude_resp = call_claude(text, user_context, screen_context, session_id)
+
+            if not claude_resp:
+                return {
+                    "success": False,
+                    "error": "Xin lỗi, bạn nói lại được không?",
+                    "transcript": text
+                }
 
-        print(f"Claude response: {claude_resp}")
+            print(f"Claude response: {claude_resp}")
 
-        # Extract AI response data
-        ai_data = extract_ai_response(claude_resp)
+            # Extract AI response data
+            ai_data = extract_ai_response(claude_resp)
+            response_cache.put(cache_key, (claude_resp, ai_data))
 
         # Clean response for speech
         clean_resp = clean_response_for_speech(claude_resp)
@@ -430,15 +618,27 @@ app = Flask(__name__)
 CORS(app)
 
 
+def get_session_id(data=None):
+    """Client session id from the request body/form or X-Session-Id header (else per client)"""
+    return request_session_id((data or {}).get('session_id'), request.headers, request.remote_addr)
+
+
 @app.route('/health', methods=['GET'])
 def health():
-    return jsonify({"status": "healthy", "models": ["whisper-base", "claude-haiku"]})
+    return jsonify({
+        "status": "healthy",
+        "models": ["whisper-base", "claude-haiku"],
+        "sessions": sessions.stats(),
+        "history": conversations.stats(),
+        "claude_tokens": usage_stats.stats(),
+        "cache": {"response": response_cache.stats(), "tts": tts_cache.stats()},
+    })
 
 
 @app.route('/reset', methods=['POST'])
 def api_reset():
-    """Reset conversation history"""
-    reset_conversation()
+    """Reset the calling client's conversation history"""
+    reset_conversation(get_session_id(request.get_json(silent=True) or request.form))
     return jsonify({"success": True, "message": "Conversation reset"})
 
 
@@ -475,13 +675,24 @@ def api_process_voice():
             except:
                 pass
 
-        # Save with correct extension for Whisper to detect format
+        # Decode straight from the request stream (no disk I/O)
+        audio_bytes = audio_file.read()
+        session_id = get_session_id(request.form)
+        try:
+            audio = decode_audio_bytes(audio_bytes)
+        except AudioDecodeError as e:
+            print(f"In-memory decode failed ({e}), using temp file...")
+        else:
+            return jsonify(transcribe_and_process(audio, user_context, screen_context, session_id))
+
+        # Fallback (e.g. m4a with the index at the end can't be read from a pipe):
+        # save with correct extension for Whisper to detect format
         with tempfile.NamedTemporaryFile(suffix=ext, delete=False) as tmp:
-            audio_file.save(tmp.name)
+            tmp.write(audio_bytes)
             tmp_path = tmp.name
 
         try:
-            result = process_audio(tmp_path, user_context, screen_context)
+            result = process_audio(tmp_path, user_context, screen_context, session_id)
         finally:
             if os.path.exists(tmp_path):
                 os.unlink(tmp_path)
@@ -505,7 +716,7 @@ def api_process_text():
         user_context = data.get('user_context')
         screen_context = data.get('screen_context')
 
-        result = process_text(data['text'], user_context, screen_context)
+        result = process_text(data['text'], user_context, screen_context, get_session_id(data))
         return jsonify(result)
     except Exception as e:
         print(f"Error: {e}")
@@ -524,7 +735,12 @@ ELEVENLABS_VOICE_ID = os.environ.get("ELEVENLABS_VOICE_ID", "your-voice-id-here"
 ELEVENLABS_MODEL = "eleven_v3"
 
 def generate_tts_audio(text):
-    """Generate TTS audio using ElevenLabs API"""
+    """Generate TTS audio using ElevenLabs API (cached by spoken text)"""
+    cache_key = (ELEVENLABS_VOICE_ID, ELEVENLABS_MODEL, " ".join(text.split()))
+    cached = tts_cache.get(cache_key)
+    if cached:
+        return cached
+
     try:
         response = requests.post(
             f"https://api.elevenlabs.io/v1/text-to-speech/{ELEVENLABS_VOICE_ID}",
@@ -543,7 +759,9 @@ def generate_tts_audio(text):
             }
         )
         if response.status_code == 200:
-            return base64.b64encode(response.content).decode('utf-8')
+            audio_base64 = base64.b64encode(response.content).decode('utf-8')
+            tts_cache.put(cache_key, audio_base64, size=len(audio_base64))
+            return audio_base64
         else:
             print(f"ElevenLabs error: {response.status_code}")
             return None
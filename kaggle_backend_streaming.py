@@ -6,6 +6,10 @@
 # CELL 1: Install dependencies
 # ==========================================
 # !pip install -q openai-whisper anthropic flask flask-cors flask-socketio pyngrok webrtcvad numpy
+# Shared modules: upload these files from the repo to /kaggle/working (the
+# notebook's working directory, so they import like installed packages):
+#   history_manager.py, intent_router.py, prompt_cache.py, session_store.py,
+#   utterance_buffer.py, vad.py
 
 # ==========================================
 # CELL 2: Imports and Setup
@@ -15,17 +19,26 @@ import whisper
 import anthropic
 import json
 import re
-import tempfile
 import os
 import base64
 import numpy as np
-import wave
 import requests
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 from flask_socketio import SocketIO, emit
 
+# Shared modules from the repo (see CELL 1)
+from history_manager import SUMMARY_SYSTEM, ConversationHistory, summary_request
+from intent_router import match_intent
+from prompt_cache import log_usage, system_blocks, usage_stats
+from session_store import DEFAULT_SESSION, get_session_store, request_session_id
+from utterance_buffer import UtteranceBuffer, join_transcripts
+from vad import VoiceActivityDetector
+
 print("Loading Whisper...")
 whisper_model = whisper.load_model("base")
 print("Whisper ready!")
@@ -43,74 +56,192 @@ ELEVENLABS_VOICE_ID = os.environ.get("ELEVENLABS_VOICE_ID", "your-voice-id-here"
 ELEVENLABS_MODEL = "eleven_v3"
 
 # Conversation state
-conversation_history = []
-MAX_HISTORY = 10
+MAX_HISTORY = 40  # Stored messages per session (hard cap)
+
+# Per-client sessions (session_store.py): clients send a session_id, each gets
+# its own history. SESSION_STORE=sqlite shares them between worker processes;
+# SESSION_TTL / SESSION_MAX / SESSION_DB configure the store.
+sessions = get_session_store(max_messages=MAX_HISTORY)
+
+
+def summarize_history(summary, messages):
+    """Fold older turns into the session summary (runs in the background)"""
+    response = client.messages.create(
+        model="claude-3-5-haiku-20241022",
+        max_tokens=200,
+        system=SUMMARY_SYSTEM,
+        messages=[{"role": "user", "content": summary_request(summary, messages)}],
+    )
+    log_usage(response.usage, "Summary")
+    return response.content[0].text
+
+
+# Recent whole turns within HISTORY_TOKEN_BUDGET (env, default 1500 tokens) go
+# to Claude; older turns are folded into a rolling summary (history_manager.py)
+# whose "FORM DA DIEN" line keeps the fields set by fill_field actions.
+conversations = ConversationHistory(sessions, summarize=summarize_history)
 
 # ==========================================
 # CELL 4: Audio Buffer & VAD
 # ==========================================
 
+# Speech boundaries come from vad.py: 20ms frames against an adaptive noise
+# floor, with "start", "pause" (200ms silence), "resume" and "end" (750ms
+# silence) events.
+
+# Stream protocol: start_listening (and 'context' when it changes) carries
+# user_context / screen_context / session_id once; audio_chunk is
+# {"seq": n, "chunk": <binary PCM attachment>}. Old clients sending base64
+# text and the context on every chunk still work.
+CONTEXT_KEYS = ("user_context", "screen_context", "session_id")
+
+
+def decode_chunk(chunk):
+    """Raw int16 PCM of a binary attachment (or legacy base64 text)"""
+    if isinstance(chunk, (bytes, bytearray, memoryview)):
+        return chunk
+    return base64.b64decode(chunk or "")
+
+
+# Buffer bounds (utterance_buffer.py, AUDIO_PRE_ROLL_MS / MAX_UTTERANCE_MS /
+# UTTERANCE_OVERLAP_MS): before speech only a short pre-roll is kept; a long
+# utterance is cut every MAX_UTTERANCE_MS (Whisper's window) and the cut
+# segments are transcribed while the user keeps talking. Consecutive segments
+# overlap so a word split at the cut is heard whole.
+MAX_UTTERANCE_SEGMENTS = 4  # A client that never goes quiet gets a reply after ~2 minutes
+AUDIO_IDLE_RELEASE = 30  # Seconds without audio before a client's buffered audio is freed
+
+
 class AudioBuffer:
     """Accumulates audio chunks and detects speech boundaries"""
     def __init__(self, sample_rate=16000):
         self.sample_rate = sample_rate
-        self.buffer = bytearray()
-        self.is_speaking = False
-        self.silence_frames = 0
-        self.speech_frames = 0
-        self.min_speech_frames = 3  # Minimum frames to consider as speech
-        self.max_silence_frames = 15  # ~750ms of silence to end speech (at 50ms frames)
-        self.energy_threshold = 500  # Adjust based on testing
-
-    def add_chunk(self, chunk_base64):
-        """Add audio chunk and return True if speech ended"""
-        try:
-            chunk = base64.b64decode(chunk_base64)
-            self.buffer.extend(chunk)
-
-            # Calculate energy of this chunk
-            audio_data = np.frombuffer(chunk, dtype=np.int16)
-            energy = np.sqrt(np.mean(audio_data.astype(np.float32) ** 2))
-
-            if energy > self.energy_threshold:
-                # Speech detected
-                self.speech_frames += 1
-                self.silence_frames = 0
-                if self.speech_frames >= self.min_speech_frames:
-                    self.is_speaking = True
-            else:
-                # Silence
-                if self.is_speaking:
-                    self.silence_frames += 1
-                    if self.silence_frames >= self.max_silence_frames:
-                        # End of speech detected
-                        return True
-
+        self.audio = UtteranceBuffer(sample_rate)
+        self.vad = VoiceActivityDetector(sample_rate)
+        self.speculation = None  # Work started at a short pause (see Speculation)
+        self.segments = []  # Transcripts (futures) of the segments cut so far
+        self.context = {}  # Latest CONTEXT_KEYS sent by the client
+        self.next_seq = 0
+        self.lost_chunks = 0
+        self.last_active = time.time()
+
+    @property
+    def is_speaking(self):
+        return self.vad.is_speaking
+
+    def update_context(self, data):
+        """Keep the context keys present in a message"""
+        for key in CONTEXT_KEYS:
+            if key in data:
+                self.context[key] = data[key]
+
+    def accept_seq(self, seq):
+        """False for a duplicate/old chunk; gaps are counted"""
+        if seq is None:
+            return True  # Legacy client without sequence numbers
+        if seq < self.next_seq:
             return False
+        if seq > self.next_seq:
+            self.lost_chunks += seq - self.next_seq
+            print(f"Audio: {seq - self.next_seq} chunks lost before #{seq}")
+        self.next_seq = seq + 1
+        return True
+
+    def add_chunk(self, chunk):
+        """
+        Add audio chunk; returns (VAD events, segments cut from a too long utterance).
+        "end" in the events means speech ended.
+        """
+        self.last_active = time.time()
+        try:
+            chunk = decode_chunk(chunk)
+            events = self.vad.process(chunk)
+            cuts = self.audio.append(chunk, speaking=self.vad.is_speaking)
         except Exception as e:
             print(f"Error processing chunk: {e}")
-            return False
+            return [], []
+
+        if cuts and self.speculation is not None:
+            self.speculation.cancel()  # Covers audio that now belongs to a segment
+            self.speculation = None
+        return events, cuts
 
     def get_audio(self):
         """Get accumulated audio as bytes"""
-        return bytes(self.buffer)
+        return self.audio.peek()
+
+    def take_segments(self):
+        segments, self.segments = self.segments, []
+        return segments
 
     def reset(self):
-        """Reset buffer for next utterance"""
-        self.buffer = bytearray()
-        self.is_speaking = False
-        self.silence_frames = 0
-        self.speech_frames = 0
+        """Reset buffer for next utterance (the client's context is kept)"""
+        self.audio.release()
+        self.vad.reset()
+        if self.speculation is not None:
+            self.speculation.cancel()  # Utterance dropped before it ended
+        self.speculation = None
+        for segment in self.take_segments():
+            segment.cancel()
 
 # Per-client audio buffers
 audio_buffers = {}
+audio_buffer_counts = {"released": 0}
+
+
+def sweep_audio_buffers():
+    """Free the audio of clients that stopped sending (entries go on disconnect)"""
+    now = time.time()
+    for buffer in list(audio_buffers.values()):
+        if now - buffer.last_active > AUDIO_IDLE_RELEASE and (len(buffer.audio) or buffer.is_speaking):
+            buffer.reset()  # Half an utterance nobody finished; context stays for the next one
+            audio_buffer_counts["released"] += 1
+
+
+def audio_buffer_sweeper():
+    while True:
+        time.sleep(AUDIO_IDLE_RELEASE / 2)
+        try:
+            sweep_audio_buffers()
+        except Exception as e:
+            print(f"Audio sweep error: {e}")
+
+
+def get_audio_buffer_stats():
+    buffers = list(audio_buffers.values())
+    return {
+        "clients": len(buffers),
+        "buffered_bytes": sum(len(b.audio) for b in buffers),
+        **audio_buffer_counts,
+    }
+
+
+threading.Thread(target=audio_buffer_sweeper, daemon=True).start()
 
 # ==========================================
 # CELL 5: AI Processing Functions
 # ==========================================
 
-def get_system_prompt(user_context, screen_context):
-    """Generate dynamic system prompt"""
+# Same on every turn - kept ahead of the dynamic part (see prompt_cache.py)
+SYSTEM_PROMPT_STATIC = """Bạn là trợ lý ảo VNeID, nói chuyện tự nhiên như bạn bè.
+
+CÁCH NÓI:
+- Xưng "em", gọi user như ở phần XƯNG HÔ bên dưới
+- Ngắn gọn, tự nhiên
+- Hỏi 1 câu, đợi trả lời
+
+OUTPUT: Câu trả lời @@AI@@{"action": "...", "data": {}, "next_step": true/false}@@END@@
+ACTIONS: none, navigate_lltp, navigate_home, fill_field, next_step, prev_step, submit
+"""
+
+
+def get_system_prompt(user_context, screen_context, summary=""):
+    """System prompt blocks: cached static prefix + this turn's user/screen context"""
+    return system_blocks(SYSTEM_PROMPT_STATIC, get_dynamic_prompt(user_context, screen_context, summary))
+
+
+def get_dynamic_prompt(user_context, screen_context, summary=""):
+    """Part of the system prompt that changes between users, screens and turns"""
     user_info = ""
     if user_context:
         user_info = f"""
@@ -152,45 +283,74 @@ Actions: {', '.join(available_actions)}
 
     user_name = user_context.get('hoTen', '').split()[-1] if user_context and user_context.get('hoTen') else 'anh'
 
-    return f"""Bạn là trợ lý ảo VNeID, nói chuyện tự nhiên như bạn bè.
-{user_info}
-{screen_info}
+    summary_info = f"\nTÓM TẮT CÁC LƯỢT TRƯỚC:\n{summary}\n" if summary else ""
 
-CÁCH NÓI:
-- Xưng "em", gọi "anh {user_name}"
-- Ngắn gọn, tự nhiên
-- Hỏi 1 câu, đợi trả lời
+    return f"""XƯNG HÔ: gọi user là "anh {user_name}" hoặc "anh"
+{user_info}
+{screen_info}{summary_info}"""
+
+
+# Fast path (intent_router.py): fixed commands ("tiep tuc", "quay lai", ...) get
+# a canned reply without a Claude call. The router decides the action; the
+# spoken reply (with accents, for ElevenLabs) and @@AI@@ payload are this
+# backend's.
+FAST_PATH_REPLIES = {
+    "next_step": ("Dạ, em chuyển sang bước tiếp theo nhé.", {"action": "next_step", "data": {}, "next_step": True}),
+    "prev_step": ("Dạ, em quay lại bước trước nhé.", {"action": "prev_step", "data": {}}),
+    "navigate_lltp": ("Vâng, em mở form Lý lịch tư pháp cho anh nhé!",
+                      {"action": "navigate", "navigate_to": "lltp", "data": {}}),
+    "navigate_home": ("Dạ, em về trang chủ nhé.", {"action": "navigate", "navigate_to": "home", "data": {}}),
+}
+
+
+def fast_path_reply(text, screen_context=None):
+    """Canned reply in Claude's output format for a fixed command, or None"""
+    match = match_intent(text, (screen_context or {}).get("available_actions"))
+    if match is None or match.action not in FAST_PATH_REPLIES:
+        return None
+    reply, payload = FAST_PATH_REPLIES[match.action]
+    return f"{reply} @@AI@@{json.dumps(payload)}@@END@@"
 
-OUTPUT: Câu trả lời @@AI@@{{"action": "...", "data": {{}}, "next_step": true/false}}@@END@@
-ACTIONS: none, navigate_lltp, navigate_home, fill_field, next_step, prev_step, submit
-"""
 
+def call_claude(user_message, user_context=None, screen_context=None, session_id=DEFAULT_SESSION):
+    """Call Claude API and add the turn to the session history"""
+    result = generate_reply(user_message, user_context, screen_context, session_id)
+    if result:
+        commit_turn(session_id, user_message, result)
+    return result
 
-def call_claude(user_message, user_context=None, screen_context=None):
-    """Call Claude API"""
-    global conversation_history
 
+def generate_reply(user_message, user_context=None, screen_context=None, session_id=DEFAULT_SESSION):
+    """Claude's reply to a message, without touching the history (speculation can drop it)"""
     try:
-        conversation_history.append({"role": "user", "content": user_message})
-        if len(conversation_history) > MAX_HISTORY:
-            conversation_history = conversation_history[-MAX_HISTORY:]
+        messages, summary = conversations.context(session_id)
+        messages.append({"role": "user", "content": user_message})
+
+        result = fast_path_reply(user_message, screen_context)
+        if result:
+            print("Fast path: answered without Claude")
+            return result
 
-        system_prompt = get_system_prompt(user_context, screen_context)
+        system_prompt = get_system_prompt(user_context, screen_context, summary)
 
         response = client.messages.create(
             model="claude-3-5-haiku-20241022",
             max_tokens=200,
             system=system_prompt,
-            messages=conversation_history
+            messages=messages
         )
-        result = response.content[0].text
-        conversation_history.append({"role": "assistant", "content": result})
-        return result
+        log_usage(response.usage)
+        return response.content[0].text
     except Exception as e:
         print(f"Claude Error: {e}")
         return None
 
 
+def commit_turn(session_id, user_message, reply):
+    """Add a finished exchange to the session history (older turns get summarized)"""
+    conversations.append(session_id, user_message, reply)
+
+
 def extract_ai_response(text):
     """Extract AI response data"""
     if not text:
@@ -245,34 +405,41 @@ def generate_tts(text):
     return None
 
 
-def process_audio_buffer(audio_bytes, user_context, screen_context):
-    """Process accumulated audio"""
+def transcribe_pcm(audio_bytes):
+    """Whisper transcript of 16kHz mono int16 PCM"""
+    # Whisper takes float32 samples directly - no temp WAV file
+    audio = np.frombuffer(audio_bytes, dtype=np.int16).astype(np.float32) / 32768.0
+    result = whisper_model.transcribe(audio, language="vi")
+    return (result.get("text") or "").strip()
+
+
+def process_audio_buffer(audio_bytes, user_context, screen_context, session_id=DEFAULT_SESSION, speculation=None,
+                         cancelled=None, earlier=(), ended=None):
+    """
+    Process accumulated audio (reusing the speculation's work if it commits).
+    cancelled() is checked between stages; a cancelled turn returns None.
+    Nothing is added to the history here - the caller commits the reply once
+    it has been sent. earlier holds the transcripts of segments already cut
+    from the same utterance; ended is when the end of speech was detected.
+    """
+    cancelled = cancelled or (lambda: False)
     try:
-        # Save to temp file
-        with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as tmp:
-            # Write WAV header + data
-            with wave.open(tmp.name, 'wb') as wav:
-                wav.setnchannels(1)
-                wav.setsampwidth(2)  # 16-bit
-                wav.setframerate(16000)
-                wav.writeframes(audio_bytes)
-            tmp_path = tmp.name
-
-        # Transcribe
-        result = whisper_model.transcribe(tmp_path, language="vi")
-        transcript = (result.get("text") or "").strip()
-
-        # Cleanup
-        os.unlink(tmp_path)
-
-        if not transcript:
+        if speculation is not None and speculation.commit(ended or time.time()):
+            transcript, claude_resp = speculation.transcript, speculation.claude_resp
+        else:
+            transcript, claude_resp = transcribe_pcm(audio_bytes), None
+        if earlier:
+            transcript = join_transcripts([*earlier, transcript or ""])
+
+        if not transcript or cancelled():
             return None
 
         print(f"Transcript: {transcript}")
 
-        # Get AI response
-        claude_resp = call_claude(transcript, user_context, screen_context)
+        # Get AI response (already generated if the speculation prompted Claude)
         if not claude_resp:
+            claude_resp = generate_reply(transcript, user_context, screen_context, session_id)
+        if not claude_resp or cancelled():
             return None
 
         ai_data = extract_ai_response(claude_resp)
@@ -292,7 +459,8 @@ def process_audio_buffer(audio_bytes, user_context, screen_context):
             "audio": audio_base64,
             "data": ai_data.get("data", {}),
             "action": action,
-            "next_step": ai_data.get("next_step")
+            "next_step": ai_data.get("next_step"),
+            "reply": claude_resp,  # Raw reply for the history
         }
 
     except Exception as e:
@@ -302,6 +470,261 @@ def process_audio_buffer(audio_bytes, user_context, screen_context):
         return None
 
 
+# Speculative end of turn: after a short pause (the VAD's "pause" event), transcribe (and optionally ask
+# Claude) in the background. If the pause becomes the end of speech the result
+# is committed; if the user keeps talking it is thrown away.
+# Speculation runs on its own small pool and is skipped while every worker is
+# busy, so wasted work never queues up behind (or in front of) real turns.
+# "llm" also spends a Claude call on every pause that isn't the end of speech.
+SPECULATIVE_MODE = os.environ.get("SPECULATIVE_MODE", "stt")  # off | stt | llm
+SPECULATION_WORKERS = int(os.environ.get("SPECULATION_WORKERS", "1"))
+
+speculation_pool = ThreadPoolExecutor(max_workers=SPECULATION_WORKERS, thread_name_prefix="speculation")
+speculation_slots = threading.BoundedSemaphore(SPECULATION_WORKERS)
+speculation_stats = {"started": 0, "skipped": 0, "hits": 0, "wasted": 0, "saved_ms": 0.0}
+speculation_lock = threading.Lock()
+
+
+class Speculation:
+    """Transcript (and Claude reply) computed for a candidate end of speech"""
+
+    def __init__(self, audio_bytes, user_context, screen_context, session_id):
+        self.transcript = None
+        self.claude_resp = None
+        self.cancelled = False
+        self.started = time.time()
+        self.finished = None
+        self.done = threading.Event()
+        with speculation_lock:
+            speculation_stats["started"] += 1
+        speculation_pool.submit(self._run, audio_bytes, user_context, screen_context, session_id)
+
+    def _run(self, audio_bytes, user_context, screen_context, session_id):
+        try:
+            self.transcript = transcribe_pcm(audio_bytes)
+            # Claude only if the user hasn't resumed speaking meanwhile
+            if self.transcript and SPECULATIVE_MODE == "llm" and not self.cancelled:
+                self.claude_resp = generate_reply(self.transcript, user_context, screen_context, session_id)
+        except Exception as e:
+            print(f"Speculation error: {e}")
+        finally:
+            self.finished = time.time()
+            self.done.set()
+            speculation_slots.release()
+
+    def cancel(self):
+        """User kept talking - the work is wasted"""
+        self.cancelled = True
+        with speculation_lock:
+            speculation_stats["wasted"] += 1
+
+    def commit(self, ended, timeout=30):
+        """Wait for the result; True if it can replace processing from scratch"""
+        if not self.done.wait(timeout) or self.transcript is None:
+            self.cancel()
+            return False
+        # Work done before the end of speech (ended) was detected is latency saved
+        saved = min(ended, self.finished) - self.started
+        with speculation_lock:
+            speculation_stats["hits"] += 1
+            speculation_stats["saved_ms"] += saved * 1000
+        return True
+
+
+def start_speculation(audio_bytes, user_context, screen_context, session_id):
+    """Speculation on a free worker, or None when they are all busy"""
+    if not speculation_slots.acquire(blocking=False):
+        with speculation_lock:
+            speculation_stats["skipped"] += 1
+        return None
+    return Speculation(audio_bytes, user_context, screen_context, session_id)
+
+
+def get_speculation_stats():
+    with speculation_lock:
+        stats = dict(speculation_stats)
+    started = stats["started"]
+    return {
+        "mode": SPECULATIVE_MODE,
+        "workers": SPECULATION_WORKERS,
+        "started": started,
+        "skipped": stats["skipped"],
+        "hit_rate": round(stats["hits"] / started, 3) if started else 0.0,
+        "waste_rate": round(stats["wasted"] / started, 3) if started else 0.0,
+        "avg_saved_ms": round(stats["saved_ms"] / stats["hits"]) if stats["hits"] else 0,
+    }
+
+
+def update_speculation(buffer, events, user_context, screen_context, session_id):
+    """Start speculation at a short pause, drop it when speech resumes"""
+    if SPECULATIVE_MODE == "off" or buffer.segments:
+        return  # (Long utterances: the speculation would miss the earlier segments)
+    for event in events:
+        if event == "resume" and buffer.speculation is not None:
+            buffer.speculation.cancel()
+            buffer.speculation = None
+        elif event == "pause" and buffer.speculation is None:
+            buffer.speculation = start_speculation(buffer.get_audio(), user_context, screen_context, session_id)
+
+
+def take_speculation(buffer):
+    """Speculation for the finished utterance (committed by the worker), or None"""
+    speculation, buffer.speculation = buffer.speculation, None
+    return speculation
+
+
+# Inference workers: Whisper, Claude and TTS run off the Socket.IO handlers,
+# which only queue a turn and return. Each client has at most one turn in
+# flight; newer speech cancels the stale turn as soon as it starts (its reply
+# is never sent or added to the history) and replaces any turn still waiting.
+INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", "2"))
+
+inference_pool = ThreadPoolExecutor(max_workers=INFERENCE_WORKERS, thread_name_prefix="inference")
+
+
+# Segments of long utterances are transcribed on their own pool (a turn
+# waiting for its segments must not hold the workers they would run on)
+segment_pool = ThreadPoolExecutor(max_workers=INFERENCE_WORKERS, thread_name_prefix="segment")
+
+
+def queue_segments(buffer, cuts):
+    """Start transcribing segments cut from the buffer"""
+    for cut in cuts:
+        print(f"Long utterance: transcribing a {len(cut) // (2 * buffer.sample_rate)}s segment")
+        buffer.segments.append(segment_pool.submit(transcribe_pcm, cut))
+
+
+class Turn:
+    """One finished utterance waiting for (or in) inference"""
+
+    def __init__(self, sid, audio_bytes, user_context, screen_context, session_id, speculation=None,
+                 report_failure=True, segments=(), ended=None):
+        self.sid = sid
+        self.audio_bytes = audio_bytes
+        self.user_context = user_context
+        self.screen_context = screen_context
+        self.session_id = session_id
+        self.speculation = speculation
+        self.segments = list(segments)  # Transcripts of the earlier parts of the utterance
+        self.report_failure = report_failure  # Send an error when nothing was understood
+        self.ended = ended or time.time()  # End of speech (not when a worker picked the turn up)
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+        if self.speculation is not None:
+            self.speculation.cancel()
+            self.speculation = None
+        for segment in self.segments:
+            segment.cancel()
+
+    def segment_transcripts(self):
+        texts = []
+        for segment in self.segments:
+            try:
+                texts.append(segment.result() or "")
+            except Exception as e:  # Cancelled or failed
+                print(f"Segment error: {e}")
+        return texts
+
+
+class TurnQueue:
+    """Per-client turn slots drained by the inference pool"""
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.lock = threading.Lock()
+        self.running = {}  # sid -> Turn being processed
+        self.waiting = {}  # sid -> newest Turn not started yet
+        self.completed = 0
+        self.cancelled = 0
+
+    def submit(self, turn):
+        """Queue a turn for its client, cancelling the client's stale turns"""
+        with self.lock:
+            stale = [t for t in (self.running.get(turn.sid), self.waiting.get(turn.sid))
+                     if t is not None and not t.cancelled]
+            self.waiting[turn.sid] = turn
+            start = turn.sid not in self.running
+            if start:
+                self.running[turn.sid] = None  # Claimed until the drain loop picks a turn
+            self.cancelled += len(stale)
+        for t in stale:
+            t.cancel()
+        if start:
+            self.pool.submit(self.drain, turn.sid)
+
+    def cancel(self, sid):
+        """Drop everything queued or running for a client (disconnect, barge-in)"""
+        with self.lock:
+            stale = [t for t in (self.running.get(sid), self.waiting.pop(sid, None))
+                     if t is not None and not t.cancelled]
+            self.cancelled += len(stale)
+        for t in stale:
+            t.cancel()
+
+    def drain(self, sid):
+        """Process the client's turns one at a time until none is waiting"""
+        while True:
+            with self.lock:
+                turn = self.waiting.pop(sid, None)
+                if turn is None:
+                    del self.running[sid]
+                    return
+                self.running[sid] = turn
+            try:
+                run_turn(turn)
+            except Exception as e:
+                print(f"Turn error: {e}")
+            with self.lock:
+                self.completed += 1
+
+    def stats(self):
+        with self.lock:
+            return {
+                "workers": INFERENCE_WORKERS,
+                "in_flight": sum(1 for t in self.running.values() if t is not None),
+                "waiting": len(self.waiting),
+                "completed": self.completed,
+                "cancelled": self.cancelled,
+            }
+
+
+turn_queue = TurnQueue(inference_pool)
+
+
+def response_payload(result):
+    if not result:
+        return {'success': False, 'error': 'Không nghe rõ, bạn nói lại nhé?'}
+    return {
+        'success': True,
+        'transcript': result['transcript'],
+        'response': result['response'],
+        'audio': result['audio'],
+        'data': result['data'],
+        'action': result['action'],
+        'next_step': result['next_step']
+    }
+
+
+def run_turn(turn):
+    """Inference for one turn, pushed to its client unless cancelled meanwhile"""
+    if turn.cancelled:
+        return
+    # Owned by the turn from here (committed or discarded by process_audio_buffer)
+    speculation, turn.speculation = turn.speculation, None
+    result = process_audio_buffer(turn.audio_bytes, turn.user_context, turn.screen_context,
+                                  turn.session_id, speculation, cancelled=lambda: turn.cancelled,
+                                  earlier=turn.segment_transcripts(), ended=turn.ended)
+    if turn.cancelled:
+        print(f"Stale turn dropped for {turn.sid}")
+        return
+    if result or turn.report_failure:
+        socketio.emit('response', response_payload(result), to=turn.sid)
+    if result:
+        commit_turn(turn.session_id, result['transcript'], result['reply'])
+
+
 # ==========================================
 # CELL 6: Flask + SocketIO Server
 # ==========================================
@@ -311,15 +734,31 @@ CORS(app)
 socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading')
 
 
+def get_session_id(data=None, default=None):
+    """Client session id from the payload or X-Session-Id header, else default (or per client)"""
+    session_id = (data or {}).get('session_id') or request.headers.get('X-Session-Id')
+    if not session_id and default:
+        return default
+    return request_session_id(session_id, request.headers, request.remote_addr)
+
+
 @app.route('/health', methods=['GET'])
 def health():
-    return jsonify({"status": "healthy", "mode": "streaming"})
+    return jsonify({
+        "status": "healthy",
+        "mode": "streaming",
+        "claude_tokens": usage_stats.stats(),
+        "history": conversations.stats(),
+        "speculation": get_speculation_stats(),
+        "turns": turn_queue.stats(),
+        "audio_buffers": get_audio_buffer_stats(),
+    })
 
 
 @app.route('/reset', methods=['POST'])
 def reset():
-    global conversation_history
-    conversation_history = []
+    """Reset the calling client's conversation history"""
+    conversations.delete(get_session_id(request.get_json(silent=True) or request.form))
     return jsonify({"success": True})
 
 
@@ -332,7 +771,7 @@ def api_process_text():
         user_context = data.get('user_context')
         screen_context = data.get('screen_context')
 
-        claude_resp = call_claude(text, user_context, screen_context)
+        claude_resp = call_claude(text, user_context, screen_context, get_session_id(data))
         if not claude_resp:
             return jsonify({"success": False, "error": "AI error"})
 
@@ -371,8 +810,10 @@ def handle_connect():
 @socketio.on('disconnect')
 def handle_disconnect():
     print(f"Client disconnected: {request.sid}")
-    if request.sid in audio_buffers:
-        del audio_buffers[request.sid]
+    buffer = audio_buffers.pop(request.sid, None)
+    if buffer is not None:
+        buffer.reset()
+    turn_queue.cancel(request.sid)
 
 
 @socketio.on('start_listening')
@@ -383,9 +824,20 @@ def handle_start_listening(data):
         audio_buffers[request.sid].reset()
     else:
         audio_buffers[request.sid] = AudioBuffer()
+    buffer = audio_buffers[request.sid]
+    buffer.update_context(data or {})
+    buffer.next_seq = 0  # Each stream numbers its chunks from 0
     emit('listening_started', {'status': 'listening'})
 
 
+@socketio.on('context')
+def handle_context(data):
+    """Client's user/screen context changed mid-stream"""
+    if request.sid not in audio_buffers:
+        audio_buffers[request.sid] = AudioBuffer()
+    audio_buffers[request.sid].update_context(data or {})
+
+
 @socketio.on('audio_chunk')
 def handle_audio_chunk(data):
     """Receive audio chunk from client"""
@@ -394,38 +846,35 @@ def handle_audio_chunk(data):
         audio_buffers[sid] = AudioBuffer()
 
     buffer = audio_buffers[sid]
-    chunk = data.get('chunk', '')
-    user_context = data.get('user_context')
-    screen_context = data.get('screen_context')
+    if not buffer.accept_seq(data.get('seq')):
+        return
+    buffer.update_context(data)  # Legacy clients repeat the context on every chunk
+    user_context = buffer.context.get('user_context')
+    screen_context = buffer.context.get('screen_context')
+
+    # Socket clients default to one session per connection
+    session_id = get_session_id(buffer.context, default=sid)
 
     # Add chunk and check for end of speech
-    speech_ended = buffer.add_chunk(chunk)
+    events, cuts = buffer.add_chunk(data.get('chunk'))
+    queue_segments(buffer, cuts)
+    if len(buffer.segments) >= MAX_UTTERANCE_SEGMENTS and "end" not in events:
+        events.append("end")  # Never quiet (e.g. constant background noise) - end the turn anyway
+    update_speculation(buffer, events, user_context, screen_context, session_id)
 
-    if speech_ended and buffer.is_speaking:
+    if "start" in events:
+        turn_queue.cancel(sid)  # Barge-in: the reply to the previous utterance is stale now
+
+    if "end" in events:
+        ended = time.time()
         print(f"Speech ended for {sid}, processing...")
         emit('processing', {'status': 'processing'})
 
-        # Process the audio
-        audio_bytes = buffer.get_audio()
+        # Queue the audio (nothing new was said since the speculation started)
+        turn = Turn(sid, buffer.get_audio(), user_context, screen_context, session_id, take_speculation(buffer),
+                    segments=buffer.take_segments(), ended=ended)
         buffer.reset()
-
-        result = process_audio_buffer(audio_bytes, user_context, screen_context)
-
-        if result:
-            emit('response', {
-                'success': True,
-                'transcript': result['transcript'],
-                'response': result['response'],
-                'audio': result['audio'],
-                'data': result['data'],
-                'action': result['action'],
-                'next_step': result['next_step']
-            })
-        else:
-            emit('response', {
-                'success': False,
-                'error': 'Không nghe rõ, bạn nói lại nhé?'
-            })
+        turn_queue.submit(turn)
 
 
 @socketio.on('stop_listening')
@@ -434,27 +883,20 @@ def handle_stop_listening(data):
     sid = request.sid
     if sid in audio_buffers:
         buffer = audio_buffers[sid]
-        if len(buffer.buffer) > 0:
-            user_context = data.get('user_context')
-            screen_context = data.get('screen_context')
+        if buffer.is_speaking:
+            ended = time.time()
+            buffer.update_context(data or {})
+            user_context = buffer.context.get('user_context')
+            screen_context = buffer.context.get('screen_context')
 
             emit('processing', {'status': 'processing'})
 
-            audio_bytes = buffer.get_audio()
+            session_id = get_session_id(buffer.context, default=sid)
+            turn = Turn(sid, buffer.get_audio(), user_context, screen_context, session_id,
+                        take_speculation(buffer), report_failure=False, segments=buffer.take_segments(),
+                        ended=ended)
             buffer.reset()
-
-            result = process_audio_buffer(audio_bytes, user_context, screen_context)
-
-            if result:
-                emit('response', {
-                    'success': True,
-                    'transcript': result['transcript'],
-                    'response': result['response'],
-                    'audio': result['audio'],
-                    'data': result['data'],
-                    'action': result['action'],
-                    'next_step': result['next_step']
-                })
+            turn_queue.submit(turn)
 
 
 # ==========================================
@@ -11,16 +11,24 @@ import os
 import json
 import re
 import asyncio
+import weakref
+from dataclasses import dataclass, field
 import anthropic
+import httpx
 
 from livekit import rtc
-from livekit.agents import AutoSubscribe, JobContext, WorkerOptions, cli, llm, stt, tts, APIConnectOptions
+from livekit.agents import AutoSubscribe, JobContext, JobExecutorType, JobProcess, WorkerOptions, cli, llm, stt, tts, APIConnectOptions
 from livekit.agents.voice import AgentSession, Agent, RunContext
 from livekit.plugins import silero
 
 # Custom plugins for local inference
 from vieneu_tts_plugin import VieNeuTTS, create_vieneu_tts
 from whisper_local_plugin import create_whisper_stt, WhisperLocalSTT, FasterWhisperSTT
+from inference_executor import log_stats_periodically
+from history_manager import SUMMARY_SYSTEM, fit_turns, merge_summary, summary_request
+from intent_router import match_intent
+from prompt_cache import log_usage, system_blocks, system_text
+from tts_text import ACTION_END, ACTION_START, ActionStreamParser
 
 load_dotenv(".env.local")
 
@@ -38,40 +46,124 @@ VIENEU_QUALITY = os.getenv("VIENEU_QUALITY", "fast")  # fast, balanced, best
 WHISPER_MODEL = os.getenv("WHISPER_MODEL", "base")  # tiny, base, small, medium, large
 WHISPER_LANGUAGE = os.getenv("WHISPER_LANGUAGE", "vi")
 
-# Initialize Claude
-claude_client = anthropic.Anthropic(api_key=CLAUDE_API_KEY)
+# Claude client configuration
+CLAUDE_BASE_URL = os.getenv("CLAUDE_BASE_URL")  # Override for local fake server (benchmarks)
+CLAUDE_TIMEOUT = float(os.getenv("CLAUDE_TIMEOUT", "15"))  # Seconds per call
+CLAUDE_MAX_CONNECTIONS = int(os.getenv("CLAUDE_MAX_CONNECTIONS", "32"))
+
+# Job execution: "process" = one room per process (LiveKit default),
+# "thread" = many rooms per process sharing the loaded Whisper/VieNeu models
+AGENT_JOB_EXECUTOR = os.getenv("AGENT_JOB_EXECUTOR", "process")
+
+# Log inference pool metrics (queue depth, wait time) every N seconds, 0 = off
+INFERENCE_STATS_INTERVAL = float(os.getenv("INFERENCE_STATS_INTERVAL", "0"))
+
+# Claude gets the recent turns within HISTORY_TOKEN_BUDGET, older ones as a
+# summary (history_manager.py); this is the hard cap if summaries fail
+MAX_HISTORY_MESSAGES = 200
+
+# Pooled async Claude clients, one per event loop. Keep-alive connections are
+# shared by every room on that loop, and requests never block the loop.
+# (httpx pools cannot be shared across loops, which matters in thread mode.)
+_claude_clients = weakref.WeakKeyDictionary()
+
+
+def get_claude_client() -> anthropic.AsyncAnthropic:
+    """Get the pooled Claude client for the running event loop"""
+    loop = asyncio.get_running_loop()
+    client = _claude_clients.get(loop)
+    if client is None:
+        client = anthropic.AsyncAnthropic(
+            api_key=CLAUDE_API_KEY,
+            base_url=CLAUDE_BASE_URL or None,
+            timeout=httpx.Timeout(CLAUDE_TIMEOUT, connect=5.0),
+            max_retries=1,
+            http_client=anthropic.DefaultAsyncHttpxClient(
+                limits=httpx.Limits(
+                    max_connections=CLAUDE_MAX_CONNECTIONS,
+                    max_keepalive_connections=CLAUDE_MAX_CONNECTIONS,
+                    keepalive_expiry=60.0,
+                ),
+            ),
+        )
+        _claude_clients[loop] = client
+    return client
+
+
+@dataclass
+class SessionState:
+    """
+    Conversation state for one room.
 
-# Conversation state
-conversation_history = []
-MAX_HISTORY = 20
+    Owned by entrypoint and passed to ClaudeLLM and the data handler, so
+    several rooms can run in one worker process without sharing history
+    or publishing actions to the wrong room.
+    """
 
-# Current context (updated by frontend)
-current_user_context = {}
-current_screen_context = {}
-current_room = None
+    room: rtc.Room | None = None
+    conversation_history: list = field(default_factory=list)
+    summary: str = ""  # Turns folded out of conversation_history
+    summary_task: asyncio.Task | None = None
+    user_context: dict = field(default_factory=dict)    # Updated by frontend
+    screen_context: dict = field(default_factory=dict)  # Updated by frontend
 
 # ==========================================
 # AI Functions
 # ==========================================
 
-def get_system_prompt():
-    """Generate system prompt based on current context"""
+# Same on every turn - kept ahead of the dynamic part (see prompt_cache.py)
+SYSTEM_PROMPT_STATIC = """Ban la tro ly ao VNeID, ho tro nguoi dung lam thu tuc hanh chinh qua giong noi.
+
+CACH NOI:
+- Xung "em", goi user nhu o phan XUNG HO ben duoi
+- Noi ngan gon, tu nhien, KHONG dung emoji
+- Hoi 1 cau, doi tra loi
+
+KHI CAN THUC HIEN HANH DONG, tra loi kem JSON o cuoi:
+@@ACTION@@{"action": "ten_action", "data": {}}@@END@@
+
+CAC ACTION:
+- navigate_lltp: Mo form Ly lich tu phap
+- navigate_home: Ve trang chu
+- next_step: Chuyen buoc tiep theo
+- prev_step: Quay lai buoc truoc
+- fill_field: Dien thong tin vao form (data: muc_dich, so_ban, loai_phieu)
+- submit: Gui yeu cau
+
+VI DU:
+User: "Em muon lam ly lich tu phap"
+-> "Vang, em se mo form Ly lich tu phap cho anh nhe! @@ACTION@@{"action": "navigate_lltp"}@@END@@"
+
+User: "Tiep theo di"
+-> "Em chuyen sang buoc tiep theo nhe! @@ACTION@@{"action": "next_step"}@@END@@"
+"""
+
+
+def get_system_prompt(state: SessionState):
+    """System prompt blocks: cached static prefix + the session's current context"""
+    return system_blocks(SYSTEM_PROMPT_STATIC, get_dynamic_prompt(state))
+
+
+def get_dynamic_prompt(state: SessionState):
+    """Part of the system prompt that changes between sessions and screens"""
+    user_context = state.user_context
+    screen_context = state.screen_context
 
     user_info = ""
-    if current_user_context:
+    if user_context:
         user_info = f"""
 THONG TIN USER (da co san, KHONG hoi lai):
-- Ho ten: {current_user_context.get('hoTen', '')}
-- CCCD: {current_user_context.get('cccd', '')}
-- Ngay sinh: {current_user_context.get('ngaySinh', '')}
+- Ho ten: {user_context.get('hoTen', '')}
+- CCCD: {user_context.get('cccd', '')}
+- Ngay sinh: {user_context.get('ngaySinh', '')}
 """
 
     screen_info = ""
-    if current_screen_context:
-        screen_name = current_screen_context.get('screen_name', '')
-        step = current_screen_context.get('current_step', 0)
-        actions = current_screen_context.get('available_actions', [])
-        filled_data = current_screen_context.get('filled_data', {})
+    if screen_context:
+        screen_name = screen_context.get('screen_name', '')
+        step = screen_context.get('current_step', 0)
+        actions = screen_context.get('available_actions', [])
+        filled_data = screen_context.get('filled_data', {})
 
         screen_info = f"""
 MAN HINH HIEN TAI: {screen_name}
@@ -81,87 +173,153 @@ Du lieu da dien: {json.dumps(filled_data, ensure_ascii=False) if filled_data els
 """
 
     user_name = "anh"
-    if current_user_context.get('hoTen'):
-        user_name = f"anh {current_user_context.get('hoTen', '').split()[-1]}"
+    if user_context.get('hoTen'):
+        user_name = f"anh {user_context.get('hoTen', '').split()[-1]}"
 
-    return f"""Ban la tro ly ao VNeID, ho tro nguoi dung lam thu tuc hanh chinh qua giong noi.
+    summary_info = f"\nTOM TAT CAC LUOT TRUOC:\n{state.summary}\n" if state.summary else ""
 
+    return f"""XUNG HO: goi user la "{user_name}"
 {user_info}
-{screen_info}
+{screen_info}{summary_info}"""
 
-CACH NOI:
-- Xung "em", goi user la "{user_name}"
-- Noi ngan gon, tu nhien, KHONG dung emoji
-- Hoi 1 cau, doi tra loi
 
-KHI CAN THUC HIEN HANH DONG, tra loi kem JSON o cuoi:
-@@ACTION@@{{"action": "ten_action", "data": {{}}}}@@END@@
+async def publish_action(state: SessionState, action_data: dict):
+    """Send an action to the frontend of this session's room"""
+    if not state.room:
+        return
+    try:
+        await state.room.local_participant.publish_data(
+            json.dumps(action_data).encode(),
+            reliable=True
+        )
+        print(f"Action sent: {action_data}")
+    except Exception as e:
+        print(f"Error sending action: {e}")
 
-CAC ACTION:
-- navigate_lltp: Mo form Ly lich tu phap
-- navigate_home: Ve trang chu
-- next_step: Chuyen buoc tiep theo
-- prev_step: Quay lai buoc truoc
-- fill_field: Dien thong tin vao form (data: muc_dich, so_ban, loai_phieu)
-- submit: Gui yeu cau
 
-VI DU:
-User: "Em muon lam ly lich tu phap"
--> "Vang, em se mo form Ly lich tu phap cho anh nhe! @@ACTION@@{{"action": "navigate_lltp"}}@@END@@"
+def schedule_summary(state: SessionState):
+    """Fold turns over the token budget into the summary, in the background"""
+    _, dropped = fit_turns(state.conversation_history)
+    if dropped and (state.summary_task is None or state.summary_task.done()):
+        state.summary_task = asyncio.create_task(summarize_history(state))
 
-User: "Tiep theo di"
--> "Em chuyen sang buoc tiep theo nhe! @@ACTION@@{{"action": "next_step"}}@@END@@"
-"""
 
+async def summarize_history(state: SessionState):
+    """Summary task for one session (never on the turn's critical path)"""
+    history = state.conversation_history
+    try:
+        while True:
+            _, dropped = fit_turns(history)
+            if not dropped:
+                return
+
+            response = await get_claude_client().messages.create(
+                model="claude-3-5-haiku-20241022",
+                max_tokens=200,
+                system=SUMMARY_SYSTEM,
+                messages=[{"role": "user", "content": summary_request(state.summary, dropped)}],
+                timeout=CLAUDE_TIMEOUT,
+            )
+            log_usage(response.usage, "Summary")
 
-async def process_with_claude(user_message: str) -> tuple[str, dict]:
-    """Process message with Claude and extract response + action"""
-    global conversation_history, current_room
+            # Turns are only appended while we wait, so the prefix is unchanged
+            if history[:len(dropped)] != dropped:
+                return
+            state.summary = merge_summary(state.summary, response.content[0].text, dropped)
+            del history[:len(dropped)]
+            print(f"History: summarized {len(dropped)} messages")
 
+    except Exception as e:
+        print(f"History summary error: {e}")
+        # Hard cap while summaries fail: drop the oldest whole turns
+        if len(history) > MAX_HISTORY_MESSAGES:
+            del history[:-MAX_HISTORY_MESSAGES]
+            while history and history[0]["role"] != "user":
+                del history[0]
+
+
+async def process_with_claude(
+    state: SessionState,
+    user_message: str,
+    timeout: float = CLAUDE_TIMEOUT,
+):
+    """
+    Stream a Claude reply as speakable text deltas.
+
+    The action block is kept out of the yielded text and sent to the
+    frontend as soon as it closes, while the model may still be generating.
+
+    On barge-in the agent cancels the LLM stream; the HTTP response is closed
+    right away so the pooled connection is freed, and the part of the reply
+    already spoken is kept in history.
+    """
+    conversation_history = state.conversation_history
+
+    # Recent whole turns within the token budget; older ones are in the summary
+    messages, _ = fit_turns(conversation_history)
+    messages.append({"role": "user", "content": user_message})
     conversation_history.append({"role": "user", "content": user_message})
-    if len(conversation_history) > MAX_HISTORY:
-        conversation_history = conversation_history[-MAX_HISTORY:]
+
+    # Fixed commands ("tiep tuc", "ve trang chu", ...) skip Claude
+    match = match_intent(user_message, state.screen_context.get("available_actions"))
+    if match:
+        print(f"Intent: {match.action} (fast path)")
+        await publish_action(state, {"action": match.action})
+        conversation_history.append({
+            "role": "assistant",
+            "content": f'{match.reply} {ACTION_START}{json.dumps({"action": match.action})}{ACTION_END}',
+        })
+        schedule_summary(state)
+        yield match.reply
+        return
+
+    parser = ActionStreamParser()
+    action_sent = False
+    result = ""
 
     try:
-        response = claude_client.messages.create(
+        async with get_claude_client().messages.stream(
             model="claude-3-5-haiku-20241022",
             max_tokens=300,
-            system=get_system_prompt(),
-            messages=conversation_history
-        )
+            system=get_system_prompt(state),
+            messages=messages,
+            timeout=timeout,
+        ) as stream:
+            async for delta in stream.text_stream:
+                result += delta
+                text = parser.feed(delta)
+
+                # Send action to frontend as soon as the block is complete
+                if parser.action and not action_sent:
+                    action_sent = True
+                    await publish_action(state, parser.action)
+
+                if text:
+                    yield text
+
+            log_usage((await stream.get_final_message()).usage)
+
+        text = parser.flush()
+        if text:
+            yield text
 
-        result = response.content[0].text
         conversation_history.append({"role": "assistant", "content": result})
+        schedule_summary(state)
 
-        # Extract action if present
-        action_data = {}
-        match = re.search(r'@@ACTION@@(.+?)@@END@@', result, re.DOTALL)
-        if match:
-            try:
-                action_data = json.loads(match.group(1).strip())
-            except:
-                pass
-
-        # Clean response for speech
-        clean_text = re.sub(r'@@ACTION@@.*?@@END@@', '', result, flags=re.DOTALL)
-        clean_text = clean_text.strip()
-
-        # Send action to frontend if present
-        if action_data and current_room:
-            try:
-                await current_room.local_participant.publish_data(
-                    json.dumps(action_data).encode(),
-                    reliable=True
-                )
-                print(f"Action sent: {action_data}")
-            except Exception as e:
-                print(f"Error sending action: {e}")
+    except (asyncio.CancelledError, GeneratorExit):
+        # Interrupted by the user - stream context already closed the response
+        if result:
+            conversation_history.append({"role": "assistant", "content": result})
+        print("Claude stream cancelled (barge-in)")
+        raise
 
-        return clean_text, action_data
+    except anthropic.APITimeoutError:
+        print(f"Claude Error: timed out after {timeout}s")
+        yield "Xin loi, em gap loi. Anh thu lai nhe?"
 
     except Exception as e:
         print(f"Claude Error: {e}")
-        return "Xin loi, em gap loi. Anh thu lai nhe?", {}
+        yield "Xin loi, em gap loi. Anh thu lai nhe?"
 
 
 # ==========================================
@@ -169,10 +327,11 @@ async def process_with_claude(user_message: str) -> tuple[str, dict]:
 # ==========================================
 
 class ClaudeLLM(llm.LLM):
-    """Custom LLM wrapper for Claude API"""
+    """Custom LLM wrapper for Claude API (one per session)"""
 
-    def __init__(self):
+    def __init__(self, state: SessionState):
         super().__init__()
+        self._state = state
 
     def chat(
         self,
@@ -191,6 +350,7 @@ class ClaudeLLMStream(llm.LLMStream):
 
     def __init__(self, llm_instance: ClaudeLLM, chat_ctx: llm.ChatContext, conn_options: APIConnectOptions):
         super().__init__(llm_instance, chat_ctx=chat_ctx, tools=None, conn_options=conn_options)
+        self._state = llm_instance._state
         self._output_text = ""
 
     async def _run(self):
@@ -210,30 +370,28 @@ class ClaudeLLMStream(llm.LLMStream):
 
         print(f"User said: {user_message}")
 
-        # Process with Claude
-        response_text, action_data = await process_with_claude(user_message)
-        self._output_text = response_text
-
-        print(f"Claude response: {response_text}")
-
-        # Create request ID for this response
+        # Stream Claude's reply - each text delta becomes its own chunk so
+        # TTS can start on the first sentence while the model is generating
         request_id = f"claude-{id(self)}"
 
-        # Yield the response as a chunk
-        self._event_ch.send_nowait(
-            llm.ChatChunk(
-                request_id=request_id,
-                choices=[
-                    llm.Choice(
-                        delta=llm.ChoiceDelta(
-                            role="assistant",
-                            content=response_text,
-                        ),
-                        index=0,
-                    )
-                ]
+        async for text in process_with_claude(self._state, user_message):
+            self._output_text += text
+            self._event_ch.send_nowait(
+                llm.ChatChunk(
+                    request_id=request_id,
+                    choices=[
+                        llm.Choice(
+                            delta=llm.ChoiceDelta(
+                                role="assistant",
+                                content=text,
+                            ),
+                            index=0,
+                        )
+                    ]
+                )
             )
-        )
+
+        print(f"Claude response: {self._output_text}")
 
 
 # ==========================================
@@ -280,45 +438,69 @@ def get_stt_plugin():
     return None
 
 
+# ==========================================
+# Worker Prewarm
+# ==========================================
+
+def prewarm(proc: JobProcess):
+    """
+    Load models when the worker process starts, before any room is assigned.
+
+    Weights go into the process-wide model registry, so every job in this
+    process gets them without paying model-load time.
+    """
+    proc.userdata["vad"] = silero.VAD.load()
+
+    if INFERENCE_STATS_INTERVAL > 0:
+        log_stats_periodically(INFERENCE_STATS_INTERVAL)
+
+    for plugin in (get_tts_plugin(), get_stt_plugin()):
+        if plugin is None or not hasattr(plugin, "preload"):
+            continue
+        try:
+            plugin.preload()
+        except Exception as e:
+            print(f"Prewarm error: {e}")
+
+
 # ==========================================
 # Agent Entry Point
 # ==========================================
 
 async def entrypoint(ctx: JobContext):
     """Main agent entrypoint"""
-    global current_user_context, current_screen_context, current_room
 
     # Wait for participant
     await ctx.connect(auto_subscribe=AutoSubscribe.AUDIO_ONLY)
 
-    current_room = ctx.room
     print(f"Agent connected to room: {ctx.room.name}")
 
-    # Default context
-    current_user_context = {
-        "hoTen": "Nguyen Van A",
-        "cccd": "012345678901",
-        "ngaySinh": "01/01/1990",
-    }
-
-    current_screen_context = {
-        "screen_name": "home",
-        "current_step": 0,
-        "available_actions": ["navigate_lltp"],
-    }
+    # Session state for this room, with default context
+    state = SessionState(
+        room=ctx.room,
+        user_context={
+            "hoTen": "Nguyen Van A",
+            "cccd": "012345678901",
+            "ngaySinh": "01/01/1990",
+        },
+        screen_context={
+            "screen_name": "home",
+            "current_step": 0,
+            "available_actions": ["navigate_lltp"],
+        },
+    )
 
     # Handle context updates from frontend
     @ctx.room.on("data_received")
     def on_data(data: rtc.DataPacket):
-        global current_user_context, current_screen_context
         try:
             msg = json.loads(data.data.decode())
             if msg.get("type") == "update_context":
                 if msg.get("user_context"):
-                    current_user_context = msg["user_context"]
+                    state.user_context = msg["user_context"]
                 if msg.get("screen_context"):
-                    current_screen_context = msg["screen_context"]
-                print(f"Context updated: screen={current_screen_context.get('screen_name')}")
+                    state.screen_context = msg["screen_context"]
+                print(f"Context updated ({ctx.room.name}): screen={state.screen_context.get('screen_name')}")
         except Exception as e:
             print(f"Data parse error: {e}")
 
@@ -336,19 +518,27 @@ async def entrypoint(ctx: JobContext):
         print("Please set ELEVENLABS_API_KEY or OPENAI_API_KEY in .env.local")
         return
 
+    # Drop our references to the shared models when the room ends
+    async def release_models():
+        for plugin in (tts_plugin, stt_plugin):
+            if hasattr(plugin, "close"):
+                plugin.close()
+
+    ctx.add_shutdown_callback(release_models)
+
     # Create Claude LLM
-    claude_llm = ClaudeLLM()
+    claude_llm = ClaudeLLM(state)
 
     # Create agent session
     session = AgentSession(
         stt=stt_plugin,
         llm=claude_llm,
         tts=tts_plugin,
-        vad=silero.VAD.load(),
+        vad=ctx.proc.userdata.get("vad") or silero.VAD.load(),
     )
 
     # Create agent with instructions
-    agent = Agent(instructions=get_system_prompt())
+    agent = Agent(instructions=system_text(get_system_prompt(state)))
 
     # Start the session
     await session.start(
@@ -377,6 +567,7 @@ if __name__ == "__main__":
     print(f"Claude API: {'OK' if CLAUDE_API_KEY else 'MISSING'}")
     print(f"VieNeu-TTS: voice={VIENEU_VOICE}, quality={VIENEU_QUALITY}")
     print(f"Whisper STT: model={WHISPER_MODEL}, lang={WHISPER_LANGUAGE}")
+    print(f"Job executor: {AGENT_JOB_EXECUTOR}")
     print("=" * 50)
 
     if not CLAUDE_API_KEY:
@@ -384,12 +575,18 @@ if __name__ == "__main__":
         exit(1)
 
     print("\nStarting agent...")
-    print("VieNeu-TTS model will be downloaded on first use (~500MB)")
-    print("Whisper model will be downloaded on first use")
+    print("VieNeu-TTS model will be downloaded on first start (~500MB)")
+    print("Whisper model will be downloaded on first start")
+    print("Models are preloaded when each worker process starts")
     print()
 
     cli.run_app(
         WorkerOptions(
             entrypoint_fnc=entrypoint,
+            prewarm_fnc=prewarm,
+            job_executor_type=(
+                JobExecutorType.THREAD if AGENT_JOB_EXECUTOR == "thread"
+                else JobExecutorType.PROCESS
+            ),
         ),
     )
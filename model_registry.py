@@ -0,0 +1,168 @@
+# Process-wide model registry for local STT/TTS plugins
+# Loads each model once per host process and shares it between all jobs/rooms
+#
+# Usage:
+#   from model_registry import ModelKey, get_registry
+#
+#   key = ModelKey("base", device="cpu", compute_type="int8")
+#   model = get_registry().acquire(key, lambda: WhisperModel("base", ...))
+#   ...
+#   get_registry().release(key)
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable
+
+
+@dataclass(frozen=True)
+class ModelKey:
+    """Identifies one loaded copy of a model"""
+
+    model_id: str
+    device: str = "auto"
+    compute_type: str | None = None
+    quantization: str | None = None
+
+    def __str__(self):
+        parts = [self.model_id, self.device]
+        if self.compute_type:
+            parts.append(self.compute_type)
+        if self.quantization:
+            parts.append(self.quantization)
+        return "/".join(parts)
+
+
+class _Entry:
+    def __init__(self):
+        self.model = None
+        self.refcount = 0
+        self.load_lock = threading.Lock()
+        self.loaded = False
+        self.load_seconds = 0.0
+
+
+class ModelRegistry:
+    """
+    Reference-counted model cache with LRU eviction.
+
+    - acquire() returns the shared model, loading it on first use
+    - release() drops a reference; unused models stay resident until
+      the registry holds more than max_models, then the least recently
+      used unused model is closed
+    - preload() loads a model without holding a reference (worker prewarm)
+
+    Loading happens outside the registry lock, so a slow load of one model
+    does not block lookups of others. Concurrent acquires of the same key
+    wait for a single load.
+    """
+
+    def __init__(self, max_models: int = 4):
+        self._max_models = max_models
+        self._entries: OrderedDict[ModelKey, _Entry] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, key: ModelKey, loader: Callable[[], Any]) -> Any:
+        """Get a shared model and take a reference to it"""
+        entry = self._get_entry(key, add_ref=True)
+        try:
+            return self._ensure_loaded(key, entry, loader)
+        except Exception:
+            self.release(key)
+            raise
+
+    def preload(self, key: ModelKey, loader: Callable[[], Any]) -> None:
+        """Load a model so later acquires are instant (no reference kept)"""
+        entry = self._get_entry(key, add_ref=False)
+        self._ensure_loaded(key, entry, loader)
+        self._evict()
+
+    def release(self, key: ModelKey) -> None:
+        """Drop a reference taken by acquire()"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            entry.refcount = max(0, entry.refcount - 1)
+        self._evict()
+
+    def stats(self) -> list[dict]:
+        """Snapshot of loaded models, least recently used first"""
+        with self._lock:
+            return [
+                {
+                    "model": str(key),
+                    "loaded": entry.loaded,
+                    "refcount": entry.refcount,
+                    "load_seconds": round(entry.load_seconds, 2),
+                }
+                for key, entry in self._entries.items()
+            ]
+
+    def _get_entry(self, key: ModelKey, add_ref: bool) -> _Entry:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = _Entry()
+                self._entries[key] = entry
+            self._entries.move_to_end(key)
+            if add_ref:
+                entry.refcount += 1
+            return entry
+
+    def _ensure_loaded(self, key: ModelKey, entry: _Entry, loader: Callable[[], Any]) -> Any:
+        if entry.loaded:
+            return entry.model
+
+        with entry.load_lock:
+            if not entry.loaded:
+                print(f"ModelRegistry: Loading {key}...")
+                start = time.perf_counter()
+                entry.model = loader()
+                entry.load_seconds = time.perf_counter() - start
+                entry.loaded = True
+                print(f"ModelRegistry: Loaded {key} in {entry.load_seconds:.1f}s")
+        return entry.model
+
+    def _evict(self) -> None:
+        evicted = []
+        with self._lock:
+            excess = len(self._entries) - self._max_models
+            for key in list(self._entries.keys()):
+                if excess <= 0:
+                    break
+                entry = self._entries[key]
+                if entry.refcount == 0 and entry.loaded:
+                    del self._entries[key]
+                    evicted.append((key, entry.model))
+                    excess -= 1
+
+        # Close outside the lock - freeing GPU memory can be slow
+        for key, model in evicted:
+            print(f"ModelRegistry: Evicting {key}")
+            close = getattr(model, "close", None)
+            if callable(close):
+                try:
+                    close()
+                except Exception as e:
+                    print(f"ModelRegistry: Error closing {key}: {e}")
+
+
+_registry: ModelRegistry | None = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> ModelRegistry:
+    """Get the process-wide model registry"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ModelRegistry(
+                    max_models=int(os.getenv("MODEL_REGISTRY_SIZE", "4")),
+                )
+    return _registry
@@ -8,13 +8,18 @@ from __future__ import annotations
 import asyncio
 import os
 import re
+import threading
 from pathlib import Path
+from types import SimpleNamespace
 
 import torch
 import numpy as np
 from livekit import rtc
 from livekit.agents import tts, APIConnectOptions
 
+from inference_executor import InferenceExecutor, get_executor
+from model_registry import ModelKey, get_registry
+
 
 class NeuTTSAirViTTS(tts.TTS):
     """
@@ -34,6 +39,8 @@ class NeuTTSAirViTTS(tts.TTS):
         device: str = "auto",
         temperature: float = 1.0,
         top_k: int = 50,
+        max_concurrency: int = 1,
+        max_queue: int = 8,
     ):
         """
         Initialize NeuTTS-Air Vietnamese TTS.
@@ -44,6 +51,8 @@ class NeuTTSAirViTTS(tts.TTS):
             device: "cuda", "cpu", or "auto"
             temperature: Generation temperature
             top_k: Top-k sampling parameter
+            max_concurrency: Syntheses running at once on the shared model
+            max_queue: Syntheses allowed to wait before new ones are rejected
         """
         super().__init__(
             capabilities=tts.TTSCapabilities(streaming=False),
@@ -55,6 +64,9 @@ class NeuTTSAirViTTS(tts.TTS):
         self._ref_text = ref_text or ""
         self._temperature = temperature
         self._top_k = top_k
+        self._max_concurrency = max_concurrency
+        self._max_queue = max_queue
+        self._executor: InferenceExecutor | None = None
 
         # Auto-detect device
         if device == "auto":
@@ -70,49 +82,87 @@ class NeuTTSAirViTTS(tts.TTS):
         self._ref_codes = None
         self._ref_phones = None
         self._loaded = False
+        self._load_lock = threading.Lock()
 
-    def _ensure_loaded(self):
-        """Lazy load all models"""
-        if self._loaded:
-            return
+    def _get_model_key(self) -> ModelKey:
+        """Registry key for the model bundle on this device"""
+        dtype = "bfloat16" if self._device == "cuda" else "float32"
+        return ModelKey("dinhthuan/neutts-air-vi", self._device, dtype)
 
+    def _load_models(self) -> SimpleNamespace:
+        """Load model, codec and phonemizer (called once per host by the registry)"""
         print(f"NeuTTS-Air-Vi: Loading models on {self._device}...")
 
         from transformers import AutoTokenizer, AutoModelForCausalLM
         from neucodec import NeuCodec
         from phonemizer.backend import EspeakBackend
         from vinorm import TTSnorm
-        import librosa
 
         # Load model
         model_id = "dinhthuan/neutts-air-vi"
         print(f"NeuTTS-Air-Vi: Loading {model_id}...")
 
-        self._tokenizer = AutoTokenizer.from_pretrained(model_id)
+        tokenizer = AutoTokenizer.from_pretrained(model_id)
 
         dtype = torch.bfloat16 if self._device == "cuda" else torch.float32
-        self._model = AutoModelForCausalLM.from_pretrained(
+        model = AutoModelForCausalLM.from_pretrained(
             model_id,
             torch_dtype=dtype,
             trust_remote_code=True,
         ).to(self._device)
-        self._model.eval()
+        model.eval()
 
         # Load codec
         print("NeuTTS-Air-Vi: Loading NeuCodec...")
-        self._codec = NeuCodec.from_pretrained("neuphonic/neucodec").to(self._device)
-        self._codec.eval()
+        codec = NeuCodec.from_pretrained("neuphonic/neucodec").to(self._device)
+        codec.eval()
 
         # Initialize phonemizer
         print("NeuTTS-Air-Vi: Initializing phonemizer...")
-        self._phonemizer = EspeakBackend(
+        phonemizer = EspeakBackend(
             language='vi',
             preserve_punctuation=True,
             with_stress=True
         )
 
-        # Store TTSnorm for text normalization
-        self._ttsnorm = TTSnorm
+        models = SimpleNamespace(
+            tokenizer=tokenizer,
+            model=model,
+            codec=codec,
+            phonemizer=phonemizer,
+            ttsnorm=TTSnorm,  # For text normalization
+        )
+        models.close = lambda: _free_models(models)  # Called by the registry on eviction
+        return models
+
+    def preload(self):
+        """Load the models into the registry without holding them (worker prewarm)"""
+        get_registry().preload(self._get_model_key(), self._load_models)
+
+    def _get_executor(self) -> InferenceExecutor:
+        """Bounded thread pool shared by every instance using this model"""
+        if self._executor is None:
+            self._executor = get_executor(
+                str(self._get_model_key()),
+                max_workers=self._max_concurrency,
+                max_queue=self._max_queue,
+            )
+        return self._executor
+
+    def _ensure_loaded(self):
+        """Get the shared models from the registry and encode the reference"""
+        with self._load_lock:
+            if not self._loaded:
+                self._load_reference(get_registry().acquire(self._get_model_key(), self._load_models))
+
+    def _load_reference(self, models: SimpleNamespace):
+        import librosa
+
+        self._tokenizer = models.tokenizer
+        self._model = models.model
+        self._codec = models.codec
+        self._phonemizer = models.phonemizer
+        self._ttsnorm = models.ttsnorm
 
         # Encode reference audio if provided
         if self._ref_audio_path and os.path.exists(self._ref_audio_path):
@@ -230,19 +280,26 @@ class NeuTTSAirViTTS(tts.TTS):
         return audio_np
 
     def close(self):
-        """Clean up resources"""
-        if self._model is not None:
-            del self._model
+        """Release the shared models (the registry frees them when evicted)"""
+        if self._loaded:
             self._model = None
-        if self._codec is not None:
-            del self._codec
             self._codec = None
-        if torch.cuda.is_available():
-            torch.cuda.empty_cache()
-        self._loaded = False
+            self._tokenizer = None
+            self._phonemizer = None
+            self._loaded = False
+            get_registry().release(self._get_model_key())
         print("NeuTTS-Air-Vi: Closed")
 
 
+def _free_models(models: SimpleNamespace):
+    """Drop an evicted model bundle and return its GPU memory to the driver"""
+    models.model = None
+    models.codec = None
+    if torch.cuda.is_available():
+        torch.cuda.empty_cache()
+    print("NeuTTS-Air-Vi: Models unloaded")
+
+
 class NeuTTSAirViChunkedStream(tts.ChunkedStream):
     """Chunked stream implementation for NeuTTS-Air Vietnamese"""
 
@@ -261,10 +318,8 @@ class NeuTTSAirViChunkedStream(tts.ChunkedStream):
         request_id = f"neutts-{id(self)}"
 
         try:
-            # Run synthesis in thread pool to avoid blocking
-            loop = asyncio.get_event_loop()
-            audio_data = await loop.run_in_executor(
-                None,
+            # Run synthesis on the model's bounded pool (fails fast when saturated)
+            audio_data = await self._neutts_tts._get_executor().run(
                 self._neutts_tts._synthesize_audio,
                 self._input_text,
             )
@@ -0,0 +1,103 @@
+# Preallocated float32 audio buffer for STT streams
+# Frames are converted from int16 straight into the buffer, and the model
+# gets a float32 view of it - no per-frame arrays, no concatenate, no
+# extra normalization copy.
+
+from __future__ import annotations
+
+import numpy as np
+
+
+class PCMBuffer:
+    """
+    Growable float32 sample buffer with a zero-copy view.
+
+    Storage is one preallocated array. Old samples can be dropped with
+    discard(); the live region is moved to the front only when the free
+    space runs out, so view() always returns a contiguous slice (what Whisper
+    needs) instead of the two pieces a wrapped ring buffer would give.
+    Capacity doubles when needed, up to max_seconds; past that the oldest
+    audio is dropped.
+    """
+
+    def __init__(
+        self,
+        sample_rate: int = 16000,
+        initial_seconds: float = 10.0,
+        max_seconds: float | None = 120.0,
+    ):
+        self.sample_rate = sample_rate
+        self._data = np.empty(int(initial_seconds * sample_rate), dtype=np.float32)
+        self._max_samples = int(max_seconds * sample_rate) if max_seconds else None
+        self._start = 0
+        self._end = 0
+        self.dropped = 0  # Samples lost to the max_seconds limit
+
+    def __len__(self) -> int:
+        return self._end - self._start
+
+    @property
+    def duration(self) -> float:
+        return len(self) / self.sample_rate
+
+    @property
+    def nbytes(self) -> int:
+        """Allocated memory (not just the live region)"""
+        return self._data.nbytes
+
+    def write_int16(self, data) -> None:
+        """Append int16 PCM bytes (e.g. rtc.AudioFrame.data), normalized to [-1, 1]"""
+        samples = np.frombuffer(data, dtype=np.int16)
+        target = self._reserve(len(samples))
+        np.multiply(samples, 1.0 / 32768.0, out=target, casting="unsafe")
+
+    def write_float32(self, samples: np.ndarray) -> None:
+        """Append float32 samples"""
+        target = self._reserve(len(samples))
+        target[:] = samples
+
+    def view(self, offset: int = 0) -> np.ndarray:
+        """Float32 view of the buffered audio from offset (no copy)"""
+        return self._data[self._start + offset:self._end]
+
+    def discard(self, count: int) -> None:
+        """Drop the oldest count samples"""
+        self._start = min(self._end, self._start + count)
+        if self._start == self._end:
+            self._start = self._end = 0
+
+    def clear(self) -> None:
+        self._start = self._end = 0
+
+    def _reserve(self, count: int) -> np.ndarray:
+        """Make room for count samples at the end and return that slot"""
+        if self._end + count > len(self._data):
+            size = len(self)
+
+            # Longer than allowed: keep only the newest audio
+            if self._max_samples and size + count > self._max_samples:
+                drop = min(size, size + count - self._max_samples)
+                self._start += drop
+                self.dropped += drop
+                size -= drop
+
+            needed = size + count
+            if needed > len(self._data):
+                capacity = len(self._data)
+                while capacity < needed:
+                    capacity *= 2
+                if self._max_samples:
+                    capacity = max(needed, min(capacity, self._max_samples))
+                data = np.empty(capacity, dtype=np.float32)
+                data[:size] = self._data[self._start:self._end]
+                self._data = data
+            else:
+                # Compact: move the live region to the front
+                self._data[:size] = self._data[self._start:self._end]
+
+            self._start = 0
+            self._end = size
+
+        slot = self._data[self._end:self._end + count]
+        self._end += count
+        return slot
@@ -0,0 +1,81 @@
+# System prompt layout and token accounting for Claude calls
+# Each backend's system prompt is a static prefix (speaking style, action
+# list, examples) that is the same on every turn, plus a small dynamic
+# suffix (user and screen context), so the prompt prefix is byte-identical
+# across turns.
+#
+# Note: no cache_control marker is sent. Every static prompt here is well
+# under the minimum cacheable length (2048 tokens for the Haiku models), so
+# a marker would never create a cache entry. If a prefix grows past it, mark
+# the static block with {"cache_control": {"type": "ephemeral"}} and watch
+# cached/cache_write in the usage log.
+#
+# Usage:
+#   system = system_blocks(STATIC_PROMPT, dynamic_prompt(user_context, screen_context))
+#   response = client.messages.create(..., system=system, ...)
+#   log_usage(response.usage)
+
+from __future__ import annotations
+
+import threading
+
+
+def system_blocks(static: str, dynamic: str) -> list[dict]:
+    """System prompt as content blocks, static part first"""
+    blocks = [{"type": "text", "text": static}]
+    if dynamic.strip():
+        blocks.append({"type": "text", "text": dynamic})
+    return blocks
+
+
+def system_text(blocks: list[dict]) -> str:
+    """Plain-string form of system_blocks (for APIs that take a string)"""
+    return "\n".join(block["text"] for block in blocks)
+
+
+class UsageStats:
+    """Input/output token totals across Claude calls"""
+
+    def __init__(self):
+        self.calls = 0
+        self.cached = 0        # Prompt tokens read from the cache
+        self.cache_write = 0   # Prompt tokens written to the cache
+        self.uncached = 0      # Prompt tokens processed normally
+        self.output = 0
+        self._lock = threading.Lock()
+
+    def add(self, usage) -> tuple[int, int, int, int]:
+        cached = getattr(usage, "cache_read_input_tokens", None) or 0
+        cache_write = getattr(usage, "cache_creation_input_tokens", None) or 0
+        uncached = getattr(usage, "input_tokens", None) or 0
+        output = getattr(usage, "output_tokens", None) or 0
+        with self._lock:
+            self.calls += 1
+            self.cached += cached
+            self.cache_write += cache_write
+            self.uncached += uncached
+            self.output += output
+        return cached, cache_write, uncached, output
+
+    def stats(self) -> dict:
+        with self._lock:
+            prompt = self.cached + self.cache_write + self.uncached
+            return {
+                "calls": self.calls,
+                "cached_tokens": self.cached,
+                "cache_write_tokens": self.cache_write,
+                "uncached_tokens": self.uncached,
+                "output_tokens": self.output,
+                "cached_share": round(self.cached / prompt, 3) if prompt else 0.0,
+            }
+
+
+usage_stats = UsageStats()
+
+
+def log_usage(usage, label: str = "Claude") -> None:
+    """Print one call's cached/uncached token counts and add them to usage_stats"""
+    if usage is None:
+        return
+    cached, cache_write, uncached, output = usage_stats.add(usage)
+    print(f"{label} tokens: cached={cached} cache_write={cache_write} uncached={uncached} output={output}")
@@ -0,0 +1,328 @@
+# Per-client conversation sessions for the HTTP backends
+# Each client sends a session_id; its Claude history (and the running
+# summary of older turns, see history_manager.py) is kept separately,
+# capped at a fixed number of messages and dropped after a period of
+# inactivity.
+#
+# Backends (SESSION_STORE):
+#   memory - in-process dict (default, one backend process)
+#   sqlite - local key-value file shared by several worker processes
+#            (e.g. uvicorn --workers N on one host)
+#
+# Usage:
+#   store = get_session_store()
+#   session_id = request_session_id(body.get("session_id"), request.headers, remote_addr)
+#   history = store.load(session_id)
+#   history.append({"role": "user", "content": text})
+#   store.save(session_id, history)
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+DEFAULT_SESSION = "default"  # Calls not tied to a client (HTTP requests get request_session_id)
+
+
+def request_session_id(session_id, headers, remote_addr: str | None) -> str:
+    """
+    Session of an HTTP request: the client's session_id (body/form or
+    X-Session-Id header), else a key derived from the client's address and
+    User-Agent, so clients that send no id still get their own history.
+    """
+    session_id = session_id or headers.get("X-Session-Id")
+    if session_id:
+        return str(session_id)[:128]
+    # Behind ngrok / a reverse proxy the socket address is the proxy's
+    address = (headers.get("X-Forwarded-For") or "").split(",")[0].strip() or remote_addr or ""
+    client = f"{address}|{headers.get('User-Agent') or ''}"
+    return "client-" + hashlib.sha256(client.encode("utf-8")).hexdigest()[:16]
+
+
+def trim_history(history: list[dict], max_messages: int) -> list[dict]:
+    """Keep the newest max_messages, starting on a user turn (Claude requires it)"""
+    history = history[-max_messages:]
+    while history and history[0].get("role") != "user":
+        history = history[1:]
+    return history
+
+
+def _history_size(history: list[dict]) -> int:
+    return sum(len(message.get("content") or "") for message in history)
+
+
+class SessionStore(ABC):
+    """Interface shared by the session backends"""
+
+    @abstractmethod
+    def load(self, session_id: str) -> list[dict]:
+        """Copy of the session's history ([] for new or expired sessions)"""
+
+    @abstractmethod
+    def save(self, session_id: str, history: list[dict]) -> None:
+        ...
+
+    @abstractmethod
+    def load_summary(self, session_id: str) -> str:
+        """Summary of turns no longer in the history ("" if none)"""
+
+    @abstractmethod
+    def save_summary(self, session_id: str, summary: str) -> None:
+        ...
+
+    @abstractmethod
+    def delete(self, session_id: str) -> None:
+        ...
+
+    @abstractmethod
+    def stats(self) -> dict:
+        ...
+
+
+class MemorySessionStore(SessionStore):
+    """
+    In-process sessions with LRU eviction.
+
+    - History is trimmed to max_messages on save
+    - Sessions idle longer than ttl seconds are dropped
+    - Past max_sessions sessions or max_chars characters of history in
+      total, the least recently used sessions are dropped
+    """
+
+    def __init__(
+        self,
+        *,
+        max_messages: int = 20,
+        ttl: float = 1800.0,
+        max_sessions: int = 10000,
+        max_chars: int = 50_000_000,
+    ):
+        self._max_messages = max_messages
+        self._ttl = ttl
+        self._max_sessions = max_sessions
+        self._max_chars = max_chars
+        # session_id -> (history, last_used, chars, summary)
+        self._sessions: OrderedDict[str, tuple[list[dict], float, int, str]] = OrderedDict()
+        self._chars = 0
+        self._evicted = 0
+        self._lock = threading.Lock()
+
+    def load(self, session_id: str) -> list[dict]:
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return []
+            history, last_used, _, _ = entry
+            if time.monotonic() - last_used > self._ttl:
+                self._remove(session_id)
+                return []
+            return list(history)
+
+    def save(self, session_id: str, history: list[dict]) -> None:
+        history = trim_history(history, self._max_messages)
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            self._put(session_id, history, entry[3] if entry else "")
+
+    def load_summary(self, session_id: str) -> str:
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None or time.monotonic() - entry[1] > self._ttl:
+                return ""
+            return entry[3]
+
+    def save_summary(self, session_id: str, summary: str) -> None:
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            self._put(session_id, entry[0] if entry else [], summary)
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._remove(session_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "backend": "memory",
+                "sessions": len(self._sessions),
+                "chars": self._chars,
+                "evicted": self._evicted,
+            }
+
+    def _put(self, session_id: str, history: list[dict], summary: str) -> None:
+        size = _history_size(history) + len(summary)
+        self._remove(session_id)
+        self._sessions[session_id] = (history, time.monotonic(), size, summary)
+        self._chars += size
+        self._evict()
+
+    def _remove(self, session_id: str) -> None:
+        entry = self._sessions.pop(session_id, None)
+        if entry is not None:
+            self._chars -= entry[2]
+
+    def _evict(self) -> None:
+        now = time.monotonic()
+        # Oldest first; stop at the first live session under the caps
+        while self._sessions:
+            session_id, (_, last_used, _, _) = next(iter(self._sessions.items()))
+            over_cap = len(self._sessions) > self._max_sessions or self._chars > self._max_chars
+            if not over_cap and now - last_used <= self._ttl:
+                break
+            self._remove(session_id)
+            self._evicted += 1
+
+
+class SqliteSessionStore(SessionStore):
+    """
+    Sessions in a local SQLite file, shared by worker processes on one host.
+
+    Same trimming/TTL/caps as MemorySessionStore. WAL mode lets readers
+    and one writer work concurrently.
+    """
+
+    def __init__(
+        self,
+        path: str = "sessions.db",
+        *,
+        max_messages: int = 20,
+        ttl: float = 1800.0,
+        max_sessions: int = 10000,
+        max_chars: int = 50_000_000,
+    ):
+        self._path = path
+        self._max_messages = max_messages
+        self._ttl = ttl
+        self._max_sessions = max_sessions
+        self._max_chars = max_chars
+        self._local = threading.local()
+        self._saves = 0
+
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " id TEXT PRIMARY KEY, history TEXT NOT NULL,"
+            " last_used REAL NOT NULL, chars INTEGER NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS sessions_last_used ON sessions (last_used)")
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(sessions)")]
+        if "summary" not in columns:  # Files created before summaries existed
+            conn.execute("ALTER TABLE sessions ADD COLUMN summary TEXT NOT NULL DEFAULT ''")
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        # One connection per thread (sqlite3 connections are not thread-safe)
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self._path, timeout=5.0)
+            self._local.conn = conn
+        return conn
+
+    def load(self, session_id: str) -> list[dict]:
+        row = self._conn().execute(
+            "SELECT history, last_used FROM sessions WHERE id = ?", (session_id,)
+        ).fetchone()
+        if row is None or time.time() - row[1] > self._ttl:
+            return []
+        return json.loads(row[0])
+
+    def save(self, session_id: str, history: list[dict]) -> None:
+        history = trim_history(history, self._max_messages)
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT INTO sessions (id, history, last_used, chars) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT (id) DO UPDATE SET history = excluded.history,"
+                " last_used = excluded.last_used, chars = excluded.chars + length(summary)",
+                (session_id, json.dumps(history, ensure_ascii=False), time.time(), _history_size(history)),
+            )
+
+        # Eviction scans the table - do it every few saves, not every save
+        self._saves += 1
+        if self._saves % 50 == 0:
+            self._evict()
+
+    def load_summary(self, session_id: str) -> str:
+        row = self._conn().execute(
+            "SELECT summary, last_used FROM sessions WHERE id = ?", (session_id,)
+        ).fetchone()
+        if row is None or time.time() - row[1] > self._ttl:
+            return ""
+        return row[0]
+
+    def save_summary(self, session_id: str, summary: str) -> None:
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT INTO sessions (id, history, last_used, chars, summary) VALUES (?, '[]', ?, ?, ?)"
+                " ON CONFLICT (id) DO UPDATE SET summary = excluded.summary, last_used = excluded.last_used,"
+                " chars = sessions.chars - length(sessions.summary) + length(excluded.summary)",
+                (session_id, time.time(), len(summary), summary),
+            )
+
+    def delete(self, session_id: str) -> None:
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+    def stats(self) -> dict:
+        sessions, chars = self._conn().execute(
+            "SELECT COUNT(*), COALESCE(SUM(chars), 0) FROM sessions"
+        ).fetchone()
+        return {"backend": "sqlite", "sessions": sessions, "chars": chars}
+
+    def _evict(self) -> None:
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM sessions WHERE last_used < ?", (time.time() - self._ttl,))
+
+            # Over a cap: drop least recently used sessions
+            sessions, chars = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(chars), 0) FROM sessions"
+            ).fetchone()
+            if sessions <= self._max_sessions and chars <= self._max_chars:
+                return
+            rows = conn.execute("SELECT id, chars FROM sessions ORDER BY last_used").fetchall()
+            drop = []
+            for session_id, size in rows:
+                if sessions <= self._max_sessions and chars <= self._max_chars:
+                    break
+                drop.append((session_id,))
+                sessions -= 1
+                chars -= size
+            conn.executemany("DELETE FROM sessions WHERE id = ?", drop)
+
+
+_store: SessionStore | None = None
+_store_lock = threading.Lock()
+
+
+def get_session_store(max_messages: int = 20) -> SessionStore:
+    """
+    Get the process-wide session store.
+
+    Configured from the environment: SESSION_STORE (memory/sqlite),
+    SESSION_DB, SESSION_TTL (seconds), SESSION_MAX, SESSION_MAX_CHARS.
+    """
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                options = {
+                    "max_messages": max_messages,
+                    "ttl": float(os.getenv("SESSION_TTL", "1800")),
+                    "max_sessions": int(os.getenv("SESSION_MAX", "10000")),
+                    "max_chars": int(os.getenv("SESSION_MAX_CHARS", "50000000")),
+                }
+                if os.getenv("SESSION_STORE", "memory") == "sqlite":
+                    _store = SqliteSessionStore(os.getenv("SESSION_DB", "sessions.db"), **options)
+                else:
+                    _store = MemorySessionStore(**options)
+    return _store
@@ -12,6 +12,7 @@ let currentSound = null;
 let recording = null;
 let isStreaming = false;
 let streamInterval = null;
+let chunkSeq = 0; // Sequence number of the next audio_chunk
 
 // Callbacks
 let onTranscript = null;
@@ -120,11 +121,26 @@ export const setCallbacks = ({ onTranscriptCb, onResponseCb, onAudioCb, onStatus
 };
 
 /**
- * Set context for AI
+ * Set context for AI (sent once per stream, and again only when it changes)
  */
 export const setContext = (userContext, screenContext) => {
+  const changed = userContext !== currentUserContext || screenContext !== currentScreenContext;
   currentUserContext = userContext;
   currentScreenContext = screenContext;
+  if (changed && isStreaming && socket && isConnected) {
+    socket.emit('context', {
+      user_context: currentUserContext,
+      screen_context: currentScreenContext,
+    });
+  }
+};
+
+/**
+ * Send raw PCM as a binary attachment (no base64, no repeated context)
+ */
+const sendAudioChunk = (arrayBuffer) => {
+  socket.emit('audio_chunk', { seq: chunkSeq, chunk: arrayBuffer });
+  chunkSeq += 1;
 };
 
 /**
@@ -181,7 +197,8 @@ export const startStreaming = async () => {
       },
     };
 
-    // Tell server we're starting
+    // Tell server we're starting (context is sent here, not with every chunk)
+    chunkSeq = 0;
     socket.emit('start_listening', {
       user_context: currentUserContext,
       screen_context: currentScreenContext,
@@ -255,26 +272,10 @@ export const stopStreaming = async () => {
     if (uri && socket && isConnected) {
       // Read file and send as final chunk
       const response = await fetch(uri);
-      const blob = await response.blob();
-
-      // Convert blob to base64
-      const reader = new FileReader();
-      reader.onloadend = () => {
-        const base64 = reader.result.split(',')[1];
-        socket.emit('audio_chunk', {
-          chunk: base64,
-          user_context: currentUserContext,
-          screen_context: currentScreenContext,
-          is_final: true,
-        });
-      };
-      reader.readAsDataURL(blob);
+      sendAudioChunk(await response.arrayBuffer());
 
       // Also trigger stop_listening for immediate processing
-      socket.emit('stop_listening', {
-        user_context: currentUserContext,
-        screen_context: currentScreenContext,
-      });
+      socket.emit('stop_listening', {});
     }
 
     if (onStatusChange) onStatusChange('processing');
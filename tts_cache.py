@@ -0,0 +1,198 @@
+# Persistent TTS phrase cache
+# Synthesized int16 PCM is stored on disk under a hash of everything that
+# affects the audio (normalized text, voice, quality, temperature, sample
+# rate). Hits are returned as read-only memory maps, so fixed phrases (the
+# greeting, "Em khong nghe ro...", error fallbacks) and repeated replies are
+# never synthesized twice, even across restarts and worker processes.
+#
+# Usage:
+#   cache = get_phrase_cache()
+#   key = cache.key(text, voice="Binh", quality="fast", temperature=1.0, sample_rate=24000)
+#   pcm = cache.get(key)               # np.memmap (int16) or None
+#   if pcm is None:
+#       pcm = cache.put(key, synthesize(text))
+#
+# Configuration (environment):
+#   TTS_CACHE_DIR        - cache directory (default .tts_cache, empty disables)
+#   TTS_CACHE_MAX_MB     - size limit; least recently used files go first
+#   TTS_PREWARM_PHRASES  - file with extra phrases to synthesize at startup
+
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+import unicodedata
+from typing import Callable, Iterable
+
+import numpy as np
+
+from intent_router import canned_replies
+from tts_text import split_text_for_tts
+
+# Fixed utterances of the agent and backends, synthesized at startup
+# (the fast-path intent replies are added by load_prewarm_phrases)
+DEFAULT_PHRASES = [
+    "Xin chao anh! Em la tro ly ao VNeID. Anh can em ho tro gi a?",
+    "Em khong nghe ro, anh noi lai duoc khong?",
+    "Xin loi, em gap loi. Anh thu lai nhe?",
+]
+
+
+def normalize_text(text: str) -> str:
+    """Canonical form of a phrase for cache keys (Unicode NFC, single spaces)"""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+class PhraseCache:
+    """
+    Content-addressed int16 PCM files with LRU eviction.
+
+    - One raw .pcm file per key; writes go to a temp file and are renamed
+      into place, so concurrent processes never see partial audio
+    - File mtime is the LRU clock (touched on every hit)
+    - When the directory grows past max_bytes the least recently used
+      files are deleted
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 256 * 1024 * 1024):
+        self._dir = directory
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._size = sum(entry.stat().st_size for entry in self._entries())
+
+    @staticmethod
+    def key(
+        text: str,
+        *,
+        voice: str,
+        quality: str,
+        temperature: float,
+        sample_rate: int,
+    ) -> str:
+        parts = [normalize_text(text), voice, quality, f"{temperature:.3f}", str(sample_rate)]
+        return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> np.ndarray | None:
+        """Cached PCM as a read-only int16 memory map, or None"""
+        path = self._path(key)
+        try:
+            audio = np.memmap(path, dtype=np.int16, mode="r")
+            os.utime(path)
+        except (FileNotFoundError, ValueError):
+            # ValueError: empty file (mmap of 0 bytes)
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return audio
+
+    def put(self, key: str, audio_int16: np.ndarray) -> np.ndarray:
+        """Store PCM for key and return it"""
+        audio_int16 = np.ascontiguousarray(audio_int16, dtype=np.int16)
+        if not len(audio_int16):
+            return audio_int16
+
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(audio_int16.tobytes())
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._size += audio_int16.nbytes
+            over = self._size > self._max_bytes
+        if over:
+            self._evict()
+        return audio_int16
+
+    def prewarm(
+        self,
+        phrases: Iterable[str],
+        synthesize: Callable[[str], np.ndarray],
+        **key_args,
+    ) -> int:
+        """
+        Synthesize phrases that are not cached yet. Returns how many were added.
+
+        Phrases are split the same way the TTS streams split text, so the
+        pieces line up with the lookups made during playback.
+        """
+        added = 0
+        for phrase in phrases:
+            for segment in split_text_for_tts(phrase):
+                key = self.key(segment, **key_args)
+                if os.path.exists(self._path(key)):
+                    continue
+                self.put(key, synthesize(segment))
+                added += 1
+        return added
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size_mb": round(self._size / (1024 * 1024), 1),
+            }
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self._dir, f"{key}.pcm")
+
+    def _entries(self) -> list[os.DirEntry]:
+        return [entry for entry in os.scandir(self._dir) if entry.name.endswith(".pcm")]
+
+    def _evict(self) -> None:
+        entries = sorted(self._entries(), key=lambda entry: entry.stat().st_mtime)
+        size = sum(entry.stat().st_size for entry in entries)
+
+        # Go down to 90% so eviction doesn't run on every put
+        target = self._max_bytes * 0.9
+        for entry in entries:
+            if size <= target:
+                break
+            try:
+                file_size = entry.stat().st_size
+                os.unlink(entry.path)
+                size -= file_size
+            except FileNotFoundError:
+                pass  # Evicted by another process
+
+        with self._lock:
+            self._size = size
+
+
+def load_prewarm_phrases() -> list[str]:
+    """DEFAULT_PHRASES, the intent router's replies and lines of TTS_PREWARM_PHRASES"""
+    phrases = DEFAULT_PHRASES + canned_replies()
+    path = os.getenv("TTS_PREWARM_PHRASES")
+    if path and os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            phrases.extend(line.strip() for line in f if line.strip())
+    return phrases
+
+
+_cache: PhraseCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_phrase_cache() -> PhraseCache | None:
+    """Process-wide phrase cache (None when TTS_CACHE_DIR is set to empty)"""
+    global _cache
+    directory = os.getenv("TTS_CACHE_DIR", ".tts_cache")
+    if not directory:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = PhraseCache(
+                    directory,
+                    max_bytes=int(os.getenv("TTS_CACHE_MAX_MB", "256")) * 1024 * 1024,
+                )
+    return _cache
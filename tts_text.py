@@ -0,0 +1,178 @@
+# Text splitting for sentence-by-sentence TTS
+# Shared by the LiveKit TTS plugin and the Flask backends (no LiveKit imports)
+# Also holds the incremental parser that keeps the @@ACTION@@...@@END@@ block
+# of a streamed Claude reply out of the spoken text.
+
+from __future__ import annotations
+
+import json
+import re
+
+# Sentence ends (. ! ? ...) and clause breaks (, ; :) followed by whitespace.
+# Requiring whitespace avoids splitting numbers like "3.5" or "1,000".
+_BOUNDARY_RE = re.compile(r"[.!?\u2026,;:]+(?=\s)")
+MIN_SEGMENT_CHARS = 12
+MAX_SEGMENT_CHARS = 160
+
+
+def split_text_for_tts(
+    text: str,
+    min_chars: int = MIN_SEGMENT_CHARS,
+    max_chars: int = MAX_SEGMENT_CHARS,
+) -> list[str]:
+    """
+    Split text into pieces at Vietnamese sentence and clause boundaries.
+
+    Pieces shorter than min_chars are merged into the next one (VieNeu
+    sounds unnatural on 1-2 word inputs), pieces longer than max_chars
+    are wrapped at the last space.
+
+    Example:
+        "Vang, em se mo form cho anh nhe! Anh can may ban a?"
+        -> ["Vang, em se mo form cho anh nhe!", "Anh can may ban a?"]
+    """
+    text = " ".join(text.split())
+    if not text:
+        return []
+
+    # Cut at every boundary
+    pieces = []
+    start = 0
+    for match in _BOUNDARY_RE.finditer(text + " "):
+        pieces.append(text[start:match.end()].strip())
+        start = match.end()
+    if start < len(text):
+        pieces.append(text[start:].strip())
+
+    # Merge short pieces, wrap long ones
+    segments = []
+    current = ""
+    for piece in pieces:
+        if not piece:
+            continue
+        current = f"{current} {piece}".strip()
+        while len(current) > max_chars:
+            cut = current.rfind(" ", 0, max_chars)
+            if cut <= 0:
+                cut = max_chars
+            segments.append(current[:cut].strip())
+            current = current[cut:].strip()
+        if len(current) >= min_chars:
+            segments.append(current)
+            current = ""
+
+    if current:
+        if segments and len(segments[-1]) + len(current) < max_chars:
+            segments[-1] = f"{segments[-1]} {current}"
+        else:
+            segments.append(current)
+
+    return segments
+
+
+def pop_complete_segments(
+    text: str,
+    min_chars: int = MIN_SEGMENT_CHARS,
+    max_chars: int = MAX_SEGMENT_CHARS,
+) -> tuple[list[str], str]:
+    """
+    Take the finished pieces off the front of incrementally pushed text.
+
+    Returns (segments ready to synthesize, remaining text to keep buffering).
+    Text after the last boundary may still grow, so it stays in the buffer.
+    """
+    last_end = 0
+    for match in _BOUNDARY_RE.finditer(text):
+        if len(text[:match.end()].strip()) >= min_chars:
+            last_end = match.end()
+
+    if last_end == 0:
+        # No boundary yet - only cut when the buffer gets too long
+        if len(text) <= max_chars:
+            return [], text
+        last_end = text.rfind(" ", 0, max_chars)
+        if last_end <= 0:
+            return [], text
+
+    return split_text_for_tts(text[:last_end], min_chars, max_chars), text[last_end:]
+
+
+ACTION_START = "@@ACTION@@"
+ACTION_END = "@@END@@"
+
+
+def _partial_marker_len(text: str, marker: str) -> int:
+    """Length of the longest suffix of text that is a prefix of marker"""
+    for size in range(min(len(marker) - 1, len(text)), 0, -1):
+        if text.endswith(marker[:size]):
+            return size
+    return 0
+
+
+class ActionStreamParser:
+    """
+    Incremental parser for streamed Claude replies.
+
+    feed() returns only the speakable text. The @@ACTION@@...@@END@@ block is
+    held back (even when its markers arrive split across deltas) and parsed
+    into .action as soon as it closes.
+    """
+
+    def __init__(self):
+        self.action = {}
+        self._buffer = ""
+        self._action_text = ""
+        self._in_action = False
+        self._started = False
+
+    def feed(self, delta: str) -> str:
+        self._buffer += delta
+        speech = []
+
+        while self._buffer:
+            if self._in_action:
+                end = self._buffer.find(ACTION_END)
+                if end == -1:
+                    keep = _partial_marker_len(self._buffer, ACTION_END)
+                    self._action_text += self._buffer[:len(self._buffer) - keep]
+                    self._buffer = self._buffer[len(self._buffer) - keep:]
+                    break
+
+                self._action_text += self._buffer[:end]
+                self._buffer = self._buffer[end + len(ACTION_END):]
+                self._in_action = False
+                self._parse_action()
+            else:
+                start = self._buffer.find(ACTION_START)
+                if start == -1:
+                    keep = _partial_marker_len(self._buffer, ACTION_START)
+                    speech.append(self._buffer[:len(self._buffer) - keep])
+                    self._buffer = self._buffer[len(self._buffer) - keep:]
+                    break
+
+                speech.append(self._buffer[:start])
+                self._buffer = self._buffer[start + len(ACTION_START):]
+                self._in_action = True
+
+        return self._clean("".join(speech))
+
+    def flush(self) -> str:
+        """Return held-back text at end of stream (an unclosed action is dropped)"""
+        text = "" if self._in_action else self._buffer
+        self._buffer = ""
+        return self._clean(text)
+
+    def _parse_action(self):
+        if not self.action:
+            try:
+                self.action = json.loads(self._action_text.strip())
+            except:
+                pass
+        self._action_text = ""
+
+    def _clean(self, text: str) -> str:
+        # Drop leading whitespace of the reply
+        if not self._started:
+            text = text.lstrip()
+            self._started = bool(text)
+        return text
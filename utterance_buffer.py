@@ -0,0 +1,107 @@
+# Bounded audio buffer for one streamed utterance
+# Before speech starts only a short pre-roll is kept (so the first syllable
+# isn't clipped while the VAD confirms the onset); leading silence is
+# dropped as it arrives. During speech the buffer grows up to a maximum
+# utterance length, then a segment is cut and the last overlap_ms are kept
+# as the start of the next one, so a word split at the cut is whole in at
+# least one segment. Memory per client is bounded by max_utterance_ms plus
+# one incoming chunk, however long a client keeps sending.
+#
+# Usage:
+#   audio = UtteranceBuffer()
+#   events = vad.process(chunk)
+#   for segment in audio.append(chunk, speaking=vad.is_speaking):
+#       transcribe(segment)              # forced cut of a long utterance
+#   if END in events:
+#       pcm = audio.take()
+#
+#   join_transcripts([t1, t2]) removes the words repeated in the overlap
+#
+# Configuration (environment):
+#   AUDIO_PRE_ROLL_MS    - audio kept before speech onset (default 300)
+#   MAX_UTTERANCE_MS     - longest segment sent to the transcriber (default 30000,
+#                          Whisper's window)
+#   UTTERANCE_OVERLAP_MS - audio repeated at the start of the next segment (default 1000)
+
+from __future__ import annotations
+
+import os
+
+AUDIO_PRE_ROLL_MS = int(os.getenv("AUDIO_PRE_ROLL_MS", "300"))
+MAX_UTTERANCE_MS = int(os.getenv("MAX_UTTERANCE_MS", "30000"))
+UTTERANCE_OVERLAP_MS = int(os.getenv("UTTERANCE_OVERLAP_MS", "1000"))
+
+
+class UtteranceBuffer:
+    """
+    int16 PCM of the current utterance, compacted as it grows.
+
+    - Not speaking: trimmed to the newest pre_roll_ms after each chunk
+    - Speaking: appended until max_utterance_ms, then cut into segments
+      (overlapping by overlap_ms)
+    Trimming deletes from the front of a bytearray, which CPython does
+    without copying the rest, so compaction is cheap per chunk.
+    """
+
+    def __init__(
+        self,
+        sample_rate: int = 16000,
+        pre_roll_ms: int = AUDIO_PRE_ROLL_MS,
+        max_utterance_ms: int = MAX_UTTERANCE_MS,
+        overlap_ms: int = UTTERANCE_OVERLAP_MS,
+    ):
+        bytes_per_ms = sample_rate * 2 // 1000
+        self.pre_roll_bytes = pre_roll_ms * bytes_per_ms
+        self.max_bytes = max_utterance_ms * bytes_per_ms
+        self.overlap_bytes = overlap_ms * bytes_per_ms
+        if not 0 <= self.overlap_bytes < self.max_bytes:
+            raise ValueError("overlap_ms must be shorter than max_utterance_ms")
+        self._audio = bytearray()
+        self.segments = 0  # Forced cuts since creation
+
+    def __len__(self) -> int:
+        return len(self._audio)
+
+    def append(self, pcm, speaking: bool) -> list[bytes]:
+        """Add a chunk; returns the segments cut because the utterance got too long"""
+        self._audio.extend(pcm)
+        if not speaking:
+            excess = len(self._audio) - self.pre_roll_bytes
+            if excess > 0:
+                del self._audio[:excess]
+            return []
+
+        segments = []
+        while len(self._audio) >= self.max_bytes:
+            segments.append(bytes(self._audio[:self.max_bytes]))
+            del self._audio[:self.max_bytes - self.overlap_bytes]
+        self.segments += len(segments)
+        return segments
+
+    def peek(self) -> bytes:
+        """The buffered audio, left in place (e.g. for a speculative transcript)"""
+        return bytes(self._audio)
+
+    def take(self) -> bytes:
+        """The buffered audio; the buffer starts empty again"""
+        audio = bytes(self._audio)
+        self.release()
+        return audio
+
+    def release(self) -> None:
+        """Drop the audio and its memory"""
+        self._audio = bytearray()
+
+
+def join_transcripts(parts: list[str]) -> str:
+    """Join segment transcripts, dropping words repeated by the overlap"""
+    words: list[str] = []
+    for part in parts:
+        new = part.split()
+        # Longest run of words ending the text so far that starts the new part
+        for k in range(min(len(words), len(new), 12), 0, -1):
+            if [w.lower() for w in words[-k:]] == [w.lower() for w in new[:k]]:
+                new = new[k:]
+                break
+        words.extend(new)
+    return " ".join(words)
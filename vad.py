@@ -0,0 +1,186 @@
+# Frame-based voice activity detection for streamed PCM
+# Clients send audio chunks of any size; the detector re-frames them into
+# fixed frames (20 ms by default) so all timings are in milliseconds of
+# audio, not in "chunks". Each frame is classified from vectorized NumPy
+# features, then a small state machine turns frame decisions into speech
+# start / pause / resume / end events.
+#
+# Features (per frame, computed for all frames of a chunk at once):
+#   - log energy (dBFS)
+#   - zero-crossing rate (unvoiced sounds like "s", "x" are quiet but noisy)
+#   - SNR against an adaptive noise floor (falls fast, rises slowly; never
+#     below min_db - snr_db, and rises fast while even the quietest frame of
+#     the last second is above it - speech dips between words, noise doesn't)
+#
+# Usage:
+#   vad = VoiceActivityDetector()
+#   for event in vad.process(pcm_bytes):   # "start", "pause", "resume", "end"
+#       ...
+#   vad.reset()  # next utterance (the noise floor is kept)
+
+from __future__ import annotations
+
+from collections import deque
+
+import numpy as np
+
+START = "start"    # Speech began (start_ms of speech frames)
+PAUSE = "pause"    # pause_ms of silence inside speech (candidate end)
+RESUME = "resume"  # Speech again after a pause event
+END = "end"        # end_ms of silence - the utterance is over
+
+
+def frame_features(frames: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """(log energy in dBFS, zero-crossing rate) of int16 frames shaped (n, frame_len)"""
+    x = frames.astype(np.float32) / 32768.0
+    energy_db = 10.0 * np.log10(np.mean(x * x, axis=1) + 1e-10)
+    signs = np.signbit(x)
+    zcr = np.mean(signs[:, 1:] != signs[:, :-1], axis=1)
+    return energy_db, zcr
+
+
+class VoiceActivityDetector:
+    """
+    Streaming VAD with fixed frames, adaptive noise floor and hangover.
+
+    - A frame is speech when it is snr_db above the noise floor (and above
+      min_db), or half that with a high zero-crossing rate (fricatives)
+    - The floor is kept at or above min_db - snr_db (lower adds no
+      sensitivity, frames under min_db are never speech), so digital
+      silence or a quiet lead-in can't leave it where any noise is speech
+    - When the quietest frame of the last floor_window_ms is still clearly
+      above the floor, the background got louder (or the floor started on
+      silence): the floor rises at the noise rate even during "speech"
+    - Speech starts after start_ms of speech frames
+    - Inside speech, single loud frames (clicks) don't reset the silence
+      count: resume_ms of speech frames are needed (hangover smoothing)
+    - pause_ms of silence emits PAUSE, end_ms emits END
+    """
+
+    def __init__(
+        self,
+        sample_rate: int = 16000,
+        frame_ms: int = 20,
+        start_ms: int = 100,
+        pause_ms: int = 200,
+        end_ms: int = 750,
+        resume_ms: int = 40,
+        snr_db: float = 9.0,
+        min_db: float = -50.0,
+        unvoiced_zcr: float = 0.25,
+        floor_window_ms: int = 1000,
+    ):
+        if not 10 <= frame_ms <= 30:
+            raise ValueError("frame_ms must be between 10 and 30")
+        self.sample_rate = sample_rate
+        self.frame_ms = frame_ms
+        self.frame_len = sample_rate * frame_ms // 1000
+        self.start_frames = max(1, start_ms // frame_ms)
+        self.pause_frames = max(1, pause_ms // frame_ms)
+        self.end_frames = max(self.pause_frames, end_ms // frame_ms)
+        self.resume_frames = max(1, resume_ms // frame_ms)
+        self.snr_db = snr_db
+        self.min_db = min_db
+        self.unvoiced_zcr = unvoiced_zcr
+        self.floor_db = min_db - snr_db  # Lowest useful noise floor
+        # Minimum over the window, kept as the minima of 4 sub-blocks
+        self._block_frames = max(1, floor_window_ms // frame_ms // 4)
+        self._block_mins: deque[float] = deque(maxlen=4)
+        self._block_min = float("inf")
+        self._block_count = 0
+
+        self.noise_db: float | None = None
+        self._pending = np.zeros(0, dtype=np.int16)
+        self.reset()
+
+    def reset(self) -> None:
+        """Start a new utterance (keeps the noise floor)"""
+        self.is_speaking = False
+        self.paused = False
+        self.speech_frames = 0
+        self.silence_frames = 0
+        self._resume_run = 0
+        self.frames = 0  # Frames since reset
+
+    @property
+    def silence_ms(self) -> int:
+        return self.silence_frames * self.frame_ms
+
+    def process(self, pcm) -> list[str]:
+        """Feed int16 PCM (bytes or array); returns the events it triggered, in order"""
+        samples = np.frombuffer(pcm, dtype=np.int16) if isinstance(pcm, (bytes, bytearray, memoryview)) else pcm
+        if len(self._pending):
+            samples = np.concatenate([self._pending, samples])
+        n = len(samples) // self.frame_len
+        self._pending = samples[n * self.frame_len:].copy()
+        if n == 0:
+            return []
+
+        energy_db, zcr = frame_features(samples[:n * self.frame_len].reshape(n, self.frame_len))
+        events = []
+        for frame_db, frame_zcr in zip(energy_db.tolist(), zcr.tolist()):
+            event = self._step(frame_db, frame_zcr)
+            if event:
+                events.append(event)
+        return events
+
+    def _classify(self, frame_db: float, frame_zcr: float) -> bool:
+        if self.noise_db is None:
+            self.noise_db = max(frame_db, self.floor_db)  # First frame seeds the floor
+        snr = frame_db - self.noise_db
+        if frame_db < self.min_db:
+            speech = False
+        else:
+            speech = snr > self.snr_db or (snr > self.snr_db / 2 and frame_zcr > self.unvoiced_zcr)
+
+        self._block_min = min(self._block_min, frame_db)
+        self._block_count += 1
+        if self._block_count == self._block_frames:
+            self._block_mins.append(self._block_min)
+            self._block_min = float("inf")
+            self._block_count = 0
+        # No quiet frame for a whole window: it's the background, not speech
+        louder = len(self._block_mins) == self._block_mins.maxlen and min(self._block_mins) > self.noise_db + 3.0
+
+        # Noise floor: follow drops at once, rises slowly (barely during speech)
+        if frame_db < self.noise_db:
+            self.noise_db = max(frame_db, self.floor_db)
+        else:
+            self.noise_db += (frame_db - self.noise_db) * (0.002 if speech and not louder else 0.05)
+        return speech
+
+    def _step(self, frame_db: float, frame_zcr: float) -> str | None:
+        self.frames += 1
+        speech = self._classify(frame_db, frame_zcr)
+
+        if not self.is_speaking:
+            self.speech_frames = self.speech_frames + 1 if speech else 0
+            if self.speech_frames >= self.start_frames:
+                self.is_speaking = True
+                self.silence_frames = 0
+                return START
+            return None
+
+        if speech:
+            self._resume_run += 1
+            if self._resume_run < self.resume_frames:
+                # Might be a click - keep counting it as silence for now
+                self.silence_frames += 1
+                return self._silence_event()
+            self.silence_frames = 0
+            if self.paused:
+                self.paused = False
+                return RESUME
+            return None
+
+        self._resume_run = 0
+        self.silence_frames += 1
+        return self._silence_event()
+
+    def _silence_event(self) -> str | None:
+        if self.silence_frames == self.end_frames:
+            return END
+        if self.silence_frames == self.pause_frames:
+            self.paused = True
+            return PAUSE
+        return None
@@ -5,6 +5,7 @@
 from __future__ import annotations
 
 import asyncio
+import threading
 from dataclasses import dataclass
 from typing import AsyncIterator
 
@@ -12,6 +13,44 @@ from livekit import rtc
 from livekit.agents import tts, APIConnectOptions
 import numpy as np
 
+from inference_executor import InferenceExecutor, get_executor
+from model_registry import ModelKey, get_registry
+from tts_cache import PhraseCache, get_phrase_cache, load_prewarm_phrases
+from tts_text import pop_complete_segments, split_text_for_tts
+from vieneu_voices import get_voice_cache
+
+
+# Output frame size sent to LiveKit (fixed-size frames keep playback smooth)
+FRAME_DURATION_MS = 20
+
+
+def audio_to_int16(audio_data: np.ndarray) -> np.ndarray:
+    """Convert VieNeu output (float32 in [-1, 1]) to int16 PCM"""
+    if audio_data.dtype == np.float32 or audio_data.dtype == np.float64:
+        return (np.clip(audio_data, -1.0, 1.0) * 32767).astype(np.int16)
+    return audio_data.astype(np.int16)
+
+
+def iter_audio_frames(
+    audio_int16: np.ndarray,
+    sample_rate: int,
+    frame_duration_ms: int = FRAME_DURATION_MS,
+):
+    """Yield fixed-size rtc.AudioFrame objects, padding the tail with silence"""
+    samples_per_frame = sample_rate * frame_duration_ms // 1000
+
+    # Slices are views (also of cached memory maps); only the last frame is padded
+    for start in range(0, len(audio_int16), samples_per_frame):
+        chunk = audio_int16[start:start + samples_per_frame]
+        if len(chunk) < samples_per_frame:
+            chunk = np.pad(chunk, (0, samples_per_frame - len(chunk)))
+        yield rtc.AudioFrame(
+            data=chunk.tobytes(),
+            sample_rate=sample_rate,
+            num_channels=1,
+            samples_per_channel=samples_per_frame,
+        )
+
 
 class VieNeuTTS(tts.TTS):
     """
@@ -28,6 +67,10 @@ class VieNeuTTS(tts.TTS):
         temperature: float = 1.0,
         top_k: int = 50,
         backbone_repo: str | None = None,
+        streaming: bool = True,
+        max_concurrency: int = 1,
+        max_queue: int = 8,
+        phrase_cache: bool = True,
     ):
         """
         Initialize VieNeu-TTS.
@@ -37,38 +80,100 @@ class VieNeuTTS(tts.TTS):
             temperature: Generation temperature (0.1 = stable, 1.0+ = expressive)
             top_k: Top-k sampling parameter
             backbone_repo: Optional model repo (defaults to q4 quantized for speed)
+            streaming: Synthesize sentence by sentence so playback starts
+                after the first clause instead of after the whole reply
+            max_concurrency: Syntheses running at once on the shared model
+            max_queue: Syntheses allowed to wait before new ones are rejected
+            phrase_cache: Reuse audio of previously synthesized pieces from
+                the on-disk cache (see tts_cache)
         """
         super().__init__(
-            capabilities=tts.TTSCapabilities(streaming=False),
+            capabilities=tts.TTSCapabilities(streaming=streaming),
             sample_rate=24000,
             num_channels=1,
         )
 
+        self._streaming = streaming
         self._voice_name = voice
         self._temperature = temperature
         self._top_k = top_k
         self._backbone_repo = backbone_repo
+        self._max_concurrency = max_concurrency
+        self._max_queue = max_queue
+        self._executor: InferenceExecutor | None = None
+        self._phrase_cache: PhraseCache | None = get_phrase_cache() if phrase_cache else None
 
-        # Lazy load the model
+        # Lazy load the model (shared through the model registry)
         self._vieneu = None
         self._current_voice = None
         self._lock = asyncio.Lock()
+        self._load_lock = threading.Lock()
+
+    def _get_model_key(self) -> ModelKey:
+        """Registry key for this backbone"""
+        if self._backbone_repo is None:
+            return ModelKey("vieneu-default", quantization="q4")
+        if "q8" in self._backbone_repo:
+            return ModelKey(self._backbone_repo, quantization="q8")
+        return ModelKey(self._backbone_repo)
+
+    def _load_model(self):
+        """Load the VieNeu model (called once per host by the registry)"""
+        from vieneu import Vieneu
+
+        print(f"VieNeu-TTS: Loading model...")
+        if self._backbone_repo:
+            vieneu = Vieneu(backbone_repo=self._backbone_repo)
+        else:
+            vieneu = Vieneu()  # Default q4 quantized
+
+        print(f"VieNeu-TTS: Available voices: {vieneu.list_preset_voices()}")
+
+        # Encode every preset once so sessions can switch voices for free
+        get_voice_cache(vieneu).warm()
+        return vieneu
+
+    def preload(self):
+        """Load the model into the registry without holding it (worker prewarm)"""
+        get_registry().preload(self._get_model_key(), self._load_model)
+
+        # Synthesize fixed phrases that are not on disk yet
+        if self._phrase_cache is not None:
+            added = self._phrase_cache.prewarm(
+                load_prewarm_phrases(), self._synthesize_int16, **self._cache_key_args()
+            )
+            if added:
+                print(f"VieNeu-TTS: Cached {added} phrase pieces")
+            self.close()  # Drop the reference taken while synthesizing
+
+    def _cache_key_args(self) -> dict:
+        """Everything besides the text that changes the synthesized audio"""
+        return {
+            "voice": self._voice_name,
+            "quality": f"{self._get_model_key()}/k{self._top_k}",
+            "temperature": self._temperature,
+            "sample_rate": self.sample_rate,
+        }
+
+    def _get_executor(self) -> InferenceExecutor:
+        """Bounded thread pool shared by every instance using this model"""
+        if self._executor is None:
+            self._executor = get_executor(
+                str(self._get_model_key()),
+                max_workers=self._max_concurrency,
+                max_queue=self._max_queue,
+            )
+        return self._executor
 
     def _ensure_loaded(self):
-        """Lazy load the VieNeu model"""
-        if self._vieneu is None:
-            from vieneu import Vieneu
+        """Get the shared VieNeu model from the registry"""
+        with self._load_lock:
+            if self._vieneu is None:
+                self._vieneu = get_registry().acquire(self._get_model_key(), self._load_model)
 
-            print(f"VieNeu-TTS: Loading model...")
-            if self._backbone_repo:
-                self._vieneu = Vieneu(backbone_repo=self._backbone_repo)
-            else:
-                self._vieneu = Vieneu()  # Default q4 quantized
-
-            # Get preset voice
-            self._current_voice = self._vieneu.get_preset_voice(self._voice_name)
-            print(f"VieNeu-TTS: Model loaded, using voice '{self._voice_name}'")
-            print(f"VieNeu-TTS: Available voices: {self._vieneu.list_preset_voices()}")
+                # Get preset voice (encoded once per model, see vieneu_voices)
+                self._current_voice = get_voice_cache(self._vieneu).get(self._voice_name)
+                print(f"VieNeu-TTS: Model ready, using voice '{self._voice_name}'")
 
     def synthesize(
         self,
@@ -82,6 +187,16 @@ class VieNeuTTS(tts.TTS):
             conn_options=conn_options,
         )
 
+    def stream(
+        self,
+        *,
+        conn_options: APIConnectOptions = APIConnectOptions(),
+    ) -> "VieNeuSynthesizeStream":
+        return VieNeuSynthesizeStream(
+            tts=self,
+            conn_options=conn_options,
+        )
+
     def _synthesize_audio(self, text: str) -> np.ndarray:
         """Synthesize audio from text"""
         self._ensure_loaded()
@@ -95,18 +210,25 @@ class VieNeuTTS(tts.TTS):
 
         return audio
 
+    def _synthesize_int16(self, text: str) -> np.ndarray:
+        return audio_to_int16(self._synthesize_audio(text))
+
+    def _synthesize_and_cache(self, text: str, key: str) -> np.ndarray:
+        """Synthesize and store in the phrase cache (runs on the model's pool)"""
+        return self._phrase_cache.put(key, self._synthesize_int16(text))
+
     def set_voice(self, voice_name: str):
-        """Change the voice"""
+        """Change this session's voice (cached presets, no re-encoding)"""
         self._voice_name = voice_name
         if self._vieneu is not None:
-            self._current_voice = self._vieneu.get_preset_voice(voice_name)
+            self._current_voice = get_voice_cache(self._vieneu).get(voice_name)
             print(f"VieNeu-TTS: Switched to voice '{voice_name}'")
 
     def close(self):
-        """Clean up resources"""
+        """Release the shared model (the registry closes it when evicted)"""
         if self._vieneu is not None:
-            self._vieneu.close()
             self._vieneu = None
+            get_registry().release(self._get_model_key())
             print("VieNeu-TTS: Closed")
 
 
@@ -128,36 +250,16 @@ class VieNeuChunkedStream(tts.ChunkedStream):
         request_id = f"vieneu-{id(self)}"
 
         try:
-            # Run synthesis in thread pool to avoid blocking
-            loop = asyncio.get_event_loop()
-            audio_data = await loop.run_in_executor(
-                None,
-                self._vieneu_tts._synthesize_audio,
-                self._input_text,
-            )
-
-            # Convert to int16 for LiveKit
-            # VieNeu outputs float32 in range [-1, 1]
-            if audio_data.dtype == np.float32 or audio_data.dtype == np.float64:
-                audio_int16 = (audio_data * 32767).astype(np.int16)
+            if self._vieneu_tts._streaming:
+                segments = split_text_for_tts(self._input_text)
             else:
-                audio_int16 = audio_data.astype(np.int16)
-
-            # Create audio frame using rtc.AudioFrame
-            audio_frame = rtc.AudioFrame(
-                data=audio_int16.tobytes(),
-                sample_rate=24000,
-                num_channels=1,
-                samples_per_channel=len(audio_int16),
-            )
+                segments = [self._input_text]
 
-            # Create synthesized audio event
-            synthesized = tts.SynthesizedAudio(
-                request_id=request_id,
-                frame=audio_frame,
-            )
-
-            self._event_ch.send_nowait(synthesized)
+            # Synthesize piece by piece so the first clause plays right away
+            for text in segments:
+                await _send_synthesized(
+                    self._vieneu_tts, self._event_ch, text, request_id
+                )
 
         except Exception as e:
             print(f"VieNeu-TTS Error: {e}")
@@ -166,12 +268,106 @@ class VieNeuChunkedStream(tts.ChunkedStream):
             raise
 
 
+class VieNeuSynthesizeStream(tts.SynthesizeStream):
+    """
+    Streaming implementation for VieNeu-TTS.
+
+    Text pushed by the LLM is buffered until a sentence or clause boundary,
+    then each piece is synthesized in order and sent as 20ms frames.
+    """
+
+    def __init__(
+        self,
+        *,
+        tts: VieNeuTTS,
+        conn_options: APIConnectOptions,
+    ):
+        super().__init__(tts=tts, conn_options=conn_options)
+        self._vieneu_tts = tts
+
+    async def _run(self) -> None:
+        request_id = f"vieneu-{id(self)}"
+        segment_index = 0
+        pending = ""
+
+        try:
+            async for data in self._input_ch:
+                segment_id = f"{request_id}-{segment_index}"
+
+                if isinstance(data, self._FlushSentinel):
+                    # End of input segment - synthesize whatever is left
+                    for text in split_text_for_tts(pending):
+                        await _send_synthesized(
+                            self._vieneu_tts, self._event_ch, text, request_id, segment_id
+                        )
+                    pending = ""
+                    segment_index += 1
+                    continue
+
+                pending += data
+                segments, pending = pop_complete_segments(pending)
+                for text in segments:
+                    await _send_synthesized(
+                        self._vieneu_tts, self._event_ch, text, request_id, segment_id
+                    )
+
+            # Input closed without a final flush
+            for text in split_text_for_tts(pending):
+                await _send_synthesized(
+                    self._vieneu_tts, self._event_ch, text, request_id,
+                    f"{request_id}-{segment_index}",
+                )
+
+        except Exception as e:
+            print(f"VieNeu-TTS Stream Error: {e}")
+            import traceback
+            traceback.print_exc()
+            raise
+
+
+async def _send_synthesized(
+    vieneu_tts: VieNeuTTS,
+    event_ch,
+    text: str,
+    request_id: str,
+    segment_id: str = "",
+) -> None:
+    """Synthesize one piece of text and send it as fixed-size frames"""
+    if not text.strip():
+        return
+
+    cache = vieneu_tts._phrase_cache
+    if cache is not None:
+        # Hits skip the model queue and play straight from the memory map
+        key = cache.key(text, **vieneu_tts._cache_key_args())
+        audio_int16 = cache.get(key)
+        if audio_int16 is None:
+            audio_int16 = await vieneu_tts._get_executor().run(
+                vieneu_tts._synthesize_and_cache, text, key
+            )
+    else:
+        # Run synthesis on the model's bounded pool (fails fast when saturated)
+        audio_int16 = await vieneu_tts._get_executor().run(
+            vieneu_tts._synthesize_int16, text
+        )
+
+    for audio_frame in iter_audio_frames(audio_int16, vieneu_tts.sample_rate):
+        event_ch.send_nowait(
+            tts.SynthesizedAudio(
+                request_id=request_id,
+                segment_id=segment_id,
+                frame=audio_frame,
+            )
+        )
+
+
 # Helper function to create TTS instance
 def create_vieneu_tts(
     voice: str = "Binh",
     temperature: float = 1.0,
     top_k: int = 50,
     quality: str = "fast",  # "fast", "balanced", "best"
+    streaming: bool = True,
 ) -> VieNeuTTS:
     """
     Create a VieNeu-TTS instance with preset quality configurations.
@@ -184,6 +380,7 @@ def create_vieneu_tts(
             - "fast": q4 quantized (default, CPU optimized)
             - "balanced": q8 quantized (better quality)
             - "best": Full 0.5B PyTorch model
+        streaming: Sentence-level streaming synthesis
 
     Returns:
         VieNeuTTS instance
@@ -199,4 +396,5 @@ def create_vieneu_tts(
         temperature=temperature,
         top_k=top_k,
         backbone_repo=backbone_map.get(quality),
+        streaming=streaming,
     )
@@ -0,0 +1,90 @@
+# Preset voice cache for VieNeu-TTS
+# get_preset_voice() loads and encodes the reference for a voice; the result
+# only depends on the model and the voice name, so it is computed once per
+# loaded model and shared by every request/session using that model. The
+# cache only holds a weak reference to its model, so when the model registry
+# unloads a model, the model and its encoded voices are freed together.
+#
+# Usage:
+#   voices = get_voice_cache(vieneu)
+#   voices.warm()                       # encode every preset at startup
+#   audio = vieneu.infer(text=text, voice=voices.get("Binh"))
+
+from __future__ import annotations
+
+import threading
+import time
+import weakref
+from typing import Any
+
+
+class VoiceCache:
+    """Encoded preset voices for one VieNeu model (weakly referenced)"""
+
+    def __init__(self, vieneu):
+        # A strong reference would keep the WeakKeyDictionary key alive forever
+        self._vieneu = weakref.ref(vieneu)
+        self._voices: dict[str, Any] = {}
+        self._names: list[str] | None = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.encode_seconds = 0.0
+
+    def names(self) -> list[str]:
+        """Preset voice names offered by the model"""
+        if self._names is None:
+            self._names = list(self._model().list_preset_voices())
+        return self._names
+
+    def warm(self) -> None:
+        """Encode every preset voice (call once after loading the model)"""
+        start = time.perf_counter()
+        for name in self.names():
+            self.get(name)
+        print(f"VieNeu-TTS: Cached {len(self._voices)} preset voices in {time.perf_counter() - start:.1f}s")
+
+    def get(self, name: str) -> Any:
+        """Encoded reference for a preset voice"""
+        voice = self._voices.get(name)
+        if voice is not None:
+            self.hits += 1
+            return voice
+
+        with self._lock:
+            voice = self._voices.get(name)
+            if voice is None:
+                self.misses += 1
+                start = time.perf_counter()
+                voice = self._model().get_preset_voice(name)
+                self.encode_seconds += time.perf_counter() - start
+                self._voices[name] = voice
+            return voice
+
+    def _model(self):
+        vieneu = self._vieneu()
+        if vieneu is None:
+            raise RuntimeError("VieNeu model was unloaded")
+        return vieneu
+
+    def stats(self) -> dict:
+        return {
+            "voices": len(self._voices),
+            "hits": self.hits,
+            "misses": self.misses,
+            "encode_seconds": round(self.encode_seconds, 2),
+        }
+
+
+_caches: "weakref.WeakKeyDictionary[Any, VoiceCache]" = weakref.WeakKeyDictionary()
+_caches_lock = threading.Lock()
+
+
+def get_voice_cache(vieneu) -> VoiceCache:
+    """Voice cache for a loaded model (dropped with the model)"""
+    with _caches_lock:
+        cache = _caches.get(vieneu)
+        if cache is None:
+            cache = VoiceCache(vieneu)
+            _caches[vieneu] = cache
+        return cache
@@ -0,0 +1,336 @@
+# Staged STT -> LLM -> TTS pipeline for the HTTP backends
+# Each stage has its own worker threads and a bounded queue, so a request
+# in TTS no longer blocks the next request's STT, and TTS starts on the
+# first sentence while the LLM is still generating the rest.
+#
+# Usage:
+#   pipeline = VoicePipeline(stt_fn, llm_fn, tts_fn, parse_fn)
+#   job = pipeline.submit(audio=audio_array, session_id=..., user_context=..., screen_context=...)
+#   job.wait_reply(timeout=30)        # transcript, response text, action
+#   for pcm in job.iter_audio(): ...  # int16 PCM bytes, sentence by sentence
+#
+#   # From asyncio code (no thread blocked per waiting request):
+#   await job.wait_reply_async(timeout=30)
+#   async for pcm in job.aiter_audio(): ...
+#
+# Stage functions (all blocking, run on the stage's threads):
+#   stt_fn(audio) -> transcript
+#   llm_fn(text, user_context, screen_context, session_id) -> iterator of text deltas
+#   tts_fn(sentence, voice) -> int16 numpy array (voice=None: default voice)
+#   parse_fn(full_reply) -> (speech_text, action, data, next_step)
+
+from __future__ import annotations
+
+import asyncio
+import queue
+import threading
+import time
+import uuid
+from typing import Any, AsyncIterator, Callable, Iterator
+
+from tts_text import ActionStreamParser, pop_complete_segments, split_text_for_tts
+
+# Queued after a job's last sentence
+_END = object()
+
+
+class PipelineFullError(Exception):
+    """Raised when the first stage's queue is full (shed load instead of queueing)"""
+
+
+class PipelineJob:
+    """One request moving through the pipeline"""
+
+    def __init__(
+        self,
+        audio=None,
+        text=None,
+        user_context=None,
+        screen_context=None,
+        session_id=None,
+        voice=None,
+    ):
+        self.id = uuid.uuid4().hex
+        self.session_id = session_id
+        self.voice = voice
+        self.audio_input = audio
+        self.transcript = text or ""
+        self.user_context = user_context
+        self.screen_context = screen_context
+
+        # Filled by the LLM stage
+        self.response_text = ""
+        self.action = None
+        self.data = {}
+        self.next_step = False
+        self.error = None
+
+        # Stage timings in ms (queue waits and work)
+        self.timings: dict[str, float] = {}
+        self._submitted = time.perf_counter()
+        self._queued = self._submitted  # When the job entered its current queue
+
+        self.reply_ready = threading.Event()
+        self.audio = queue.Queue()  # int16 PCM bytes per sentence, None at the end
+
+        # TTS results may finish out of order with several TTS workers
+        self._audio_lock = threading.Lock()
+        self._next_seq = 0
+        self._pending_audio: dict[int, Any] = {}
+        self._sentences = 0
+
+        # asyncio waiters: (loop, future) woken on every reply/audio update
+        self._waiters: list[tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+
+    def wait_reply(self, timeout: float | None = None) -> bool:
+        return self.reply_ready.wait(timeout)
+
+    def iter_audio(self, timeout: float | None = None) -> Iterator[bytes]:
+        """Yield PCM chunks in sentence order until the reply is fully synthesized"""
+        while True:
+            chunk = self.audio.get(timeout=timeout)
+            if chunk is None:
+                return
+            yield chunk
+
+    def collect_audio(self, timeout: float | None = None) -> bytes:
+        return b"".join(self.iter_audio(timeout))
+
+    async def wait_reply_async(self, timeout: float | None = None) -> bool:
+        """Async wait_reply for asyncio servers"""
+        try:
+            await asyncio.wait_for(self._wait_until(self.reply_ready.is_set), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def aiter_audio(self, timeout: float | None = None) -> AsyncIterator[bytes]:
+        """Async iter_audio for asyncio servers (raises asyncio.TimeoutError on a stall)"""
+        while True:
+            future = self._add_waiter()
+            try:
+                chunk = self.audio.get_nowait()
+            except queue.Empty:
+                await asyncio.wait_for(future, timeout)
+                continue
+            if chunk is None:
+                return
+            yield chunk
+
+    async def collect_audio_async(self, timeout: float | None = None) -> bytes:
+        return b"".join([chunk async for chunk in self.aiter_audio(timeout)])
+
+    async def _wait_until(self, predicate: Callable[[], bool]) -> None:
+        while True:
+            # Register before checking so an update in between is not missed
+            future = self._add_waiter()
+            if predicate():
+                return
+            await future
+
+    def _add_waiter(self) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._audio_lock:
+            self._waiters.append((loop, future))
+        return future
+
+    def _notify(self) -> None:
+        with self._audio_lock:
+            waiters, self._waiters = self._waiters, []
+        for loop, future in waiters:
+            try:
+                loop.call_soon_threadsafe(_wake, future)
+            except RuntimeError:
+                pass  # Waiting loop already closed
+
+    def _set_reply(self) -> None:
+        self.reply_ready.set()
+        self._notify()
+
+    def _mark(self, name: str, since: float) -> float:
+        now = time.perf_counter()
+        self.timings[name] = round((now - since) * 1000, 1)
+        return now
+
+    def _deliver(self, seq: int, pcm) -> None:
+        with self._audio_lock:
+            self._pending_audio[seq] = pcm
+            while self._next_seq in self._pending_audio:
+                chunk = self._pending_audio.pop(self._next_seq)
+                if chunk is _END:
+                    self._mark("total", self._submitted)
+                    self.audio.put(None)
+                    print(f"Pipeline {self.id[:8]}: " + " ".join(
+                        f"{name}={ms:.0f}ms" for name, ms in self.timings.items()
+                    ))
+                elif chunk:
+                    self.audio.put(chunk)
+                    self.timings.setdefault(
+                        "first_audio", round((time.perf_counter() - self._submitted) * 1000, 1)
+                    )
+                self._next_seq += 1
+        self._notify()
+
+
+def _wake(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class _Stage:
+    """Worker threads reading one bounded queue"""
+
+    def __init__(self, name: str, handler: Callable[[Any], None], workers: int, max_queue: int):
+        self.name = name
+        self.queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._handler = handler
+        self._threads = [
+            threading.Thread(target=self._run, name=f"{name}-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            try:
+                self._handler(item)
+            except Exception as e:
+                print(f"Pipeline {self.name} Error: {e}")
+                import traceback
+                traceback.print_exc()
+
+
+class VoicePipeline:
+    """
+    STT, LLM and TTS stages connected by queues.
+
+    - STT turns audio into a transcript (skipped for text requests)
+    - LLM streams the reply; each finished sentence goes to TTS right away
+    - TTS synthesizes sentences; audio is delivered to the job in order
+    Only the STT/LLM entry queue rejects work (PipelineFullError); inner
+    queues block, which slows upstream stages instead of dropping jobs.
+    """
+
+    def __init__(
+        self,
+        stt_fn: Callable[[Any], str],
+        llm_fn: Callable[[str, Any, Any, Any], Iterator[str]],
+        tts_fn: Callable[[str, Any], Any],
+        parse_fn: Callable[[str], tuple],
+        *,
+        stt_workers: int = 1,
+        llm_workers: int = 8,
+        tts_workers: int = 1,
+        max_queue: int = 32,
+        no_speech_reply: str = "Em khong nghe ro, anh noi lai duoc khong?",
+    ):
+        self._stt_fn = stt_fn
+        self._llm_fn = llm_fn
+        self._tts_fn = tts_fn
+        self._parse_fn = parse_fn
+        self._no_speech_reply = no_speech_reply
+
+        self._tts = _Stage("tts", self._run_tts, tts_workers, max_queue * 4)
+        self._llm = _Stage("llm", self._run_llm, llm_workers, max_queue)
+        self._stt = _Stage("stt", self._run_stt, stt_workers, max_queue)
+
+    def submit(
+        self,
+        *,
+        audio=None,
+        text=None,
+        user_context=None,
+        screen_context=None,
+        session_id=None,
+        voice=None,
+    ) -> PipelineJob:
+        """Queue a voice (audio) or text request"""
+        job = PipelineJob(audio, text, user_context, screen_context, session_id, voice)
+        stage = self._stt if audio is not None else self._llm
+        try:
+            stage.queue.put_nowait(job)
+        except queue.Full:
+            raise PipelineFullError(f"{stage.name}: queue full ({stage.queue.maxsize} waiting)")
+        return job
+
+    def stats(self) -> dict:
+        return {
+            "stt_queue": self._stt.queue.qsize(),
+            "llm_queue": self._llm.queue.qsize(),
+            "tts_queue": self._tts.queue.qsize(),
+        }
+
+    # ---- stages ----
+
+    def _run_stt(self, job: PipelineJob):
+        start = job._mark("stt_wait", job._queued)
+        try:
+            job.transcript = (self._stt_fn(job.audio_input) or "").strip()
+        except Exception as e:
+            print(f"Pipeline STT Error: {e}")
+            job.transcript = ""
+        job.audio_input = None
+        job._queued = job._mark("stt", start)
+
+        if not job.transcript:
+            job.response_text = self._no_speech_reply
+            job._set_reply()
+            self._queue_sentence(job, job.response_text)
+            self._queue_sentence(job, _END)
+            return
+
+        self._llm.queue.put(job)
+
+    def _run_llm(self, job: PipelineJob):
+        start = job._mark("llm_wait", job._queued)
+        reply = ""
+        parser = ActionStreamParser()  # Holds back the @@ACTION@@...@@END@@ block
+        pending = ""
+
+        try:
+            for delta in self._llm_fn(job.transcript, job.user_context, job.screen_context, job.session_id):
+                if not reply:
+                    job._mark("llm_first_token", start)
+                reply += delta
+                pending += parser.feed(delta)
+
+                segments, pending = pop_complete_segments(pending)
+                for sentence in segments:
+                    self._queue_sentence(job, sentence)
+        except Exception as e:
+            print(f"Pipeline LLM Error: {e}")
+            job.error = str(e)
+
+        pending += parser.flush()
+        for sentence in split_text_for_tts(pending):
+            self._queue_sentence(job, sentence)
+
+        job.response_text, job.action, job.data, job.next_step = self._parse_fn(reply)
+        job._mark("llm", start)
+        job._set_reply()
+
+        # End marker after the last sentence
+        self._queue_sentence(job, _END)
+
+    def _queue_sentence(self, job: PipelineJob, sentence):
+        self._tts.queue.put((job, job._sentences, sentence))
+        job._sentences += 1
+
+    def _run_tts(self, item):
+        job, seq, sentence = item
+        if sentence is _END:
+            job._deliver(seq, _END)
+            return
+
+        start = time.perf_counter()
+        try:
+            pcm = self._tts_fn(sentence, job.voice)
+            chunk = pcm.tobytes() if pcm is not None else None
+        except Exception as e:
+            print(f"Pipeline TTS Error: {e}")
+            chunk = None
+        job.timings["tts"] = round(job.timings.get("tts", 0.0) + (time.perf_counter() - start) * 1000, 1)
+        job._deliver(seq, chunk)
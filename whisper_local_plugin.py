@@ -5,6 +5,9 @@
 from __future__ import annotations
 
 import asyncio
+import bisect
+import functools
+import threading
 from dataclasses import dataclass
 from typing import AsyncIterator
 import io
@@ -12,9 +15,147 @@ import wave
 import tempfile
 import os
 
+from livekit import rtc
 from livekit.agents import stt, APIConnectOptions
 import numpy as np
 
+from batch_scheduler import BatchScheduler, get_scheduler
+from inference_executor import ExecutorSaturatedError, InferenceExecutor, get_executor
+from model_registry import ModelKey, get_registry
+from pcm_buffer import PCMBuffer
+
+
+def _prepare_audio(audio_data: np.ndarray, sample_rate: int) -> np.ndarray:
+    """Resample to 16kHz and normalize to float32 in range [-1, 1]"""
+    # Resample if needed (Whisper expects 16kHz)
+    if sample_rate != 16000:
+        from scipy import signal
+        num_samples = int(len(audio_data) * 16000 / sample_rate)
+        audio_data = signal.resample(audio_data, num_samples)
+
+    if audio_data.dtype == np.int16:
+        return audio_data.astype(np.float32) / 32768.0
+    if audio_data.dtype == np.int32:
+        return audio_data.astype(np.float32) / 2147483648.0
+    return audio_data.astype(np.float32, copy=False)  # float32 views pass through
+
+
+async def _collect_audio(buffer) -> PCMBuffer:
+    """
+    Write an utterance's frames straight into a float32 16kHz buffer.
+
+    Frames at other rates go through LiveKit's streaming resampler as they
+    arrive (polyphase, no FFT over the whole clip), so the model gets a
+    view of the buffer without further copies.
+    """
+    audio = PCMBuffer(sample_rate=16000)
+    resampler = None
+
+    async for frame in buffer:
+        if frame.sample_rate == 16000:
+            audio.write_int16(frame.data)
+            continue
+
+        if resampler is None:
+            resampler = rtc.AudioResampler(frame.sample_rate, 16000, num_channels=1)
+        for resampled in resampler.push(frame):
+            audio.write_int16(resampled.data)
+
+    if resampler is not None:
+        for resampled in resampler.flush():
+            audio.write_int16(resampled.data)
+
+    return audio
+
+
+def _group_by_language(items: list) -> dict[str, list[int]]:
+    """Indexes of (audio, sample_rate, language) items, grouped by language"""
+    groups = {}
+    for index, (_, _, language) in enumerate(items):
+        groups.setdefault(language, []).append(index)
+    return groups
+
+
+def _transformers_batch(key: ModelKey, loader, items: list) -> list[str]:
+    """Batch function for the transformers pipeline (runs on a scheduler worker)"""
+    registry = get_registry()
+    pipe = registry.acquire(key, loader)
+    try:
+        texts = [""] * len(items)
+        for language, indexes in _group_by_language(items).items():
+            inputs = [
+                {"array": _prepare_audio(items[i][0], items[i][1]), "sampling_rate": 16000}
+                for i in indexes
+            ]
+            outputs = pipe(
+                inputs,
+                batch_size=len(inputs),
+                generate_kwargs={"language": language, "task": "transcribe"},
+            )
+            for i, output in zip(indexes, outputs):
+                texts[i] = output.get("text", "").strip()
+        return texts
+    finally:
+        registry.release(key)
+
+
+def _faster_whisper_batch(key: ModelKey, loader, items: list) -> list[str]:
+    """
+    Batch function for faster-whisper (runs on a scheduler worker).
+
+    Utterances up to 30s go through BatchedInferencePipeline as one clip
+    each, so they are decoded together in batch_size-wide model calls;
+    longer ones use the regular transcribe.
+    """
+    from faster_whisper import BatchedInferencePipeline
+
+    registry = get_registry()
+    model = registry.acquire(key, loader)
+    try:
+        texts = [""] * len(items)
+        pipeline = BatchedInferencePipeline(model)
+        max_samples = model.feature_extractor.n_samples
+
+        for language, indexes in _group_by_language(items).items():
+            audios = {i: _prepare_audio(items[i][0], items[i][1]) for i in indexes}
+            batch = [i for i in indexes if len(audios[i]) <= max_samples]
+
+            for i in indexes:
+                if i not in batch:
+                    segments, info = model.transcribe(
+                        audios[i], language=language, beam_size=5, vad_filter=True,
+                    )
+                    texts[i] = " ".join(segment.text for segment in segments).strip()
+
+            if not batch:
+                continue
+
+            # Utterances laid end to end, one clip each (clips are never merged)
+            starts, clips, offset = [], [], 0
+            for i in batch:
+                starts.append(offset / 16000)
+                clips.append({"start": offset / 16000, "end": (offset + len(audios[i])) / 16000})
+                offset += len(audios[i])
+
+            segments, info = pipeline.transcribe(
+                np.concatenate([audios[i] for i in batch]),
+                language=language,
+                beam_size=5,
+                clip_timestamps=clips,
+                batch_size=len(batch),
+                without_timestamps=True,
+            )
+            parts = {i: [] for i in batch}
+            for segment in segments:
+                clip = max(bisect.bisect_right(starts, segment.start + 0.001) - 1, 0)
+                parts[batch[clip]].append(segment.text)
+            for i in batch:
+                texts[i] = " ".join(parts[i]).strip()
+
+        return texts
+    finally:
+        registry.release(key)
+
 
 class WhisperLocalSTT(stt.STT):
     """
@@ -30,6 +171,13 @@ class WhisperLocalSTT(stt.STT):
         model_size: str = "base",  # tiny, base, small, medium, large
         language: str = "vi",
         device: str = "auto",  # auto, cpu, cuda
+        batching: bool = True,
+        max_batch_size: int = 8,
+        batch_wait_ms: float = 10.0,
+        batch_workers: int = 1,
+        deadline: float = 10.0,
+        max_concurrency: int = 1,
+        max_queue: int = 8,
     ):
         """
         Initialize Local Whisper STT.
@@ -38,6 +186,13 @@ class WhisperLocalSTT(stt.STT):
             model_size: Whisper model size (tiny, base, small, medium, large)
             language: Language code (e.g., "vi" for Vietnamese)
             device: Device to run on (auto, cpu, cuda)
+            batching: Batch utterances from concurrent sessions (see batch_scheduler)
+            max_batch_size: Most utterances per model call
+            batch_wait_ms: How long to gather utterances before running a batch
+            batch_workers: Worker threads running batches for this model
+            deadline: Seconds an utterance may wait before it is dropped
+            max_concurrency: Unbatched model calls running at once (thread pool size)
+            max_queue: Unbatched calls allowed to wait before new ones are rejected
         """
         super().__init__(
             capabilities=stt.STTCapabilities(streaming=False, interim_results=False)
@@ -46,37 +201,78 @@ class WhisperLocalSTT(stt.STT):
         self._model_size = model_size
         self._language = language
         self._device = device
+        self._batching = batching
+        self._batch_options = dict(
+            max_batch_size=max_batch_size,
+            max_wait_ms=batch_wait_ms,
+            num_workers=batch_workers,
+        )
+        self._deadline = deadline
+        self._scheduler: BatchScheduler | None = None
+        self._max_concurrency = max_concurrency
+        self._max_queue = max_queue
+        self._executor: InferenceExecutor | None = None
 
-        # Lazy load the model
+        # Lazy load the model (shared through the model registry)
         self._pipe = None
+        self._model_key = None
         self._lock = asyncio.Lock()
+        self._load_lock = threading.Lock()
 
-    def _ensure_loaded(self):
-        """Lazy load the Whisper model"""
-        if self._pipe is None:
-            import torch
-            from transformers import pipeline
-
-            # Determine device
-            if self._device == "auto":
-                device = "cuda" if torch.cuda.is_available() else "cpu"
-            else:
-                device = self._device
-
-            model_id = f"openai/whisper-{self._model_size}"
-            print(f"WhisperLocal: Loading model {model_id} on {device}...")
-
-            # Use float16 on GPU for faster inference
-            torch_dtype = torch.float16 if device == "cuda" else torch.float32
-
-            self._pipe = pipeline(
-                "automatic-speech-recognition",
-                model=model_id,
-                device=device,
-                torch_dtype=torch_dtype,
+    def _get_model_key(self) -> ModelKey:
+        """Registry key for this model configuration"""
+        import torch
+
+        # Determine device
+        if self._device == "auto":
+            device = "cuda" if torch.cuda.is_available() else "cpu"
+        else:
+            device = self._device
+
+        # Use float16 on GPU for faster inference
+        compute_type = "float16" if device == "cuda" else "float32"
+
+        return ModelKey(f"openai/whisper-{self._model_size}", device, compute_type)
+
+    def _load_model(self, key: ModelKey):
+        """Load the transformers pipeline (called once per host by the registry)"""
+        import torch
+        from transformers import pipeline
+
+        print(f"WhisperLocal: Loading model {key.model_id} on {key.device}...")
+
+        pipe = pipeline(
+            "automatic-speech-recognition",
+            model=key.model_id,
+            device=key.device,
+            torch_dtype=getattr(torch, key.compute_type),
+        )
+
+        print(f"WhisperLocal: Model loaded successfully")
+        return pipe
+
+    def preload(self):
+        """Load the model into the registry without holding it (worker prewarm)"""
+        key = self._get_model_key()
+        get_registry().preload(key, lambda: self._load_model(key))
+
+    def _get_executor(self) -> InferenceExecutor:
+        """Bounded thread pool shared by every instance using this model"""
+        if self._executor is None:
+            self._executor = get_executor(
+                str(self._get_model_key()),
+                max_workers=self._max_concurrency,
+                max_queue=self._max_queue,
             )
+        return self._executor
 
-            print(f"WhisperLocal: Model loaded successfully")
+    def _ensure_loaded(self):
+        """Get the shared Whisper model from the registry"""
+        with self._load_lock:
+            if self._pipe is None:
+                key = self._get_model_key()
+                self._pipe = get_registry().acquire(key, lambda: self._load_model(key))
+                self._model_key = key
 
     def recognize(
         self,
@@ -92,36 +288,48 @@ class WhisperLocalSTT(stt.STT):
             conn_options=conn_options,
         )
 
+    async def _transcribe_async(self, audio_data: np.ndarray, sample_rate: int, language: str) -> str:
+        """Transcribe through the shared batch scheduler (or the model's pool)"""
+        if not self._batching:
+            return await self._get_executor().run(self._transcribe, audio_data, sample_rate, language)
+
+        # Hold a model reference for this session
+        if self._pipe is None:
+            await self._get_executor().run(self._ensure_loaded)
+
+        if self._scheduler is None:
+            # Batches run on the model's pool, so they count against its concurrency limit
+            key = self._get_model_key()
+            self._scheduler = get_scheduler(
+                key,
+                functools.partial(
+                    self._get_executor().call,
+                    functools.partial(_transformers_batch, key, functools.partial(self._load_model, key)),
+                ),
+                **self._batch_options,
+            )
+
+        return await self._scheduler.submit((audio_data, sample_rate, language), timeout=self._deadline)
+
     def _transcribe(self, audio_data: np.ndarray, sample_rate: int, language: str) -> str:
         """Transcribe audio data to text"""
         self._ensure_loaded()
 
-        # Resample if needed (Whisper expects 16kHz)
-        if sample_rate != 16000:
-            from scipy import signal
-            num_samples = int(len(audio_data) * 16000 / sample_rate)
-            audio_data = signal.resample(audio_data, num_samples)
-            sample_rate = 16000
-
-        # Normalize to float32 in range [-1, 1]
-        if audio_data.dtype == np.int16:
-            audio_data = audio_data.astype(np.float32) / 32768.0
-        elif audio_data.dtype == np.int32:
-            audio_data = audio_data.astype(np.float32) / 2147483648.0
+        audio_data = _prepare_audio(audio_data, sample_rate)
 
         # Run inference
         result = self._pipe(
-            {"array": audio_data, "sampling_rate": sample_rate},
+            {"array": audio_data, "sampling_rate": 16000},
             generate_kwargs={"language": language, "task": "transcribe"},
         )
 
         return result.get("text", "").strip()
 
     def close(self):
-        """Clean up resources"""
+        """Release the shared model"""
         if self._pipe is not None:
-            del self._pipe
             self._pipe = None
+            get_registry().release(self._model_key)
             print("WhisperLocal: Closed")
 
 
@@ -144,32 +352,16 @@ class WhisperRecognizeStream(stt.RecognizeStream):
     async def _run(self) -> None:
         """Process audio and yield transcription"""
         try:
-            # Collect all audio frames
-            frames = []
-            sample_rate = 16000  # Default
-
-            async for frame in self._buffer:
-                # Convert frame to numpy array
-                audio_bytes = frame.data
-                sample_rate = frame.sample_rate
+            # Collect all audio frames (16kHz float32, one buffer)
+            audio = await _collect_audio(self._buffer)
 
-                # Convert bytes to numpy array (assuming int16)
-                audio_np = np.frombuffer(audio_bytes, dtype=np.int16)
-                frames.append(audio_np)
-
-            if not frames:
+            if not len(audio):
                 return
 
-            # Concatenate all frames
-            audio_data = np.concatenate(frames)
-
-            # Run transcription in thread pool
-            loop = asyncio.get_event_loop()
-            text = await loop.run_in_executor(
-                None,
-                self._whisper_stt._transcribe,
-                audio_data,
-                sample_rate,
+            # Run transcription (batched with other sessions)
+            text = await self._whisper_stt._transcribe_async(
+                audio.view(),
+                16000,
                 self._language,
             )
 
@@ -210,44 +402,117 @@ class FasterWhisperSTT(stt.STT):
         language: str = "vi",
         device: str = "auto",
         compute_type: str = "auto",  # auto, int8, float16, float32
+        streaming: bool = True,
+        interim_interval: float = 0.5,
+        endpoint_silence: float = 0.6,
+        batching: bool = True,
+        max_batch_size: int = 8,
+        batch_wait_ms: float = 10.0,
+        batch_workers: int = 1,
+        deadline: float = 10.0,
+        max_concurrency: int = 1,
+        max_queue: int = 8,
     ):
+        """
+        Initialize faster-whisper STT.
+
+        Args:
+            model_size: Whisper model size (tiny, base, small, medium, large)
+            language: Language code (e.g., "vi" for Vietnamese)
+            device: Device to run on (auto, cpu, cuda)
+            compute_type: CTranslate2 compute type (auto, int8, float16, float32)
+            streaming: Decode while the user speaks and emit interim results
+            interim_interval: Seconds of new audio between interim decodes
+            endpoint_silence: Seconds of silence that end an utterance
+            batching: Batch utterances from concurrent sessions (see batch_scheduler)
+            max_batch_size: Most utterances per model call
+            batch_wait_ms: How long to gather utterances before running a batch
+            batch_workers: Worker threads running batches for this model
+            deadline: Seconds an utterance may wait before it is dropped
+            max_concurrency: Unbatched model calls running at once (thread pool size)
+            max_queue: Unbatched calls allowed to wait before new ones are rejected
+        """
         super().__init__(
-            capabilities=stt.STTCapabilities(streaming=False, interim_results=False)
+            capabilities=stt.STTCapabilities(streaming=streaming, interim_results=streaming)
         )
 
+        self._streaming = streaming
+        self._interim_interval = interim_interval
+        self._endpoint_silence = endpoint_silence
+        self._batching = batching
+        self._batch_options = dict(
+            max_batch_size=max_batch_size,
+            max_wait_ms=batch_wait_ms,
+            num_workers=batch_workers,
+        )
+        self._deadline = deadline
+        self._scheduler: BatchScheduler | None = None
+        self._max_concurrency = max_concurrency
+        self._max_queue = max_queue
+        self._executor: InferenceExecutor | None = None
         self._model_size = model_size
         self._language = language
         self._device = device
         self._compute_type = compute_type
         self._model = None
+        self._model_key = None
         self._lock = asyncio.Lock()
+        self._load_lock = threading.Lock()
 
-    def _ensure_loaded(self):
-        """Lazy load the faster-whisper model"""
-        if self._model is None:
-            from faster_whisper import WhisperModel
-            import torch
-
-            # Determine device and compute type
-            if self._device == "auto":
-                device = "cuda" if torch.cuda.is_available() else "cpu"
-            else:
-                device = self._device
-
-            if self._compute_type == "auto":
-                compute_type = "float16" if device == "cuda" else "int8"
-            else:
-                compute_type = self._compute_type
-
-            print(f"FasterWhisper: Loading {self._model_size} on {device} ({compute_type})...")
-
-            self._model = WhisperModel(
-                self._model_size,
-                device=device,
-                compute_type=compute_type,
+    def _get_model_key(self) -> ModelKey:
+        """Registry key for this model configuration"""
+        import torch
+
+        # Determine device and compute type
+        if self._device == "auto":
+            device = "cuda" if torch.cuda.is_available() else "cpu"
+        else:
+            device = self._device
+
+        if self._compute_type == "auto":
+            compute_type = "float16" if device == "cuda" else "int8"
+        else:
+            compute_type = self._compute_type
+
+        return ModelKey(f"faster-whisper-{self._model_size}", device, compute_type)
+
+    def _load_model(self, key: ModelKey):
+        """Load the CTranslate2 model (called once per host by the registry)"""
+        from faster_whisper import WhisperModel
+
+        print(f"FasterWhisper: Loading {self._model_size} on {key.device} ({key.compute_type})...")
+
+        model = WhisperModel(
+            self._model_size,
+            device=key.device,
+            compute_type=key.compute_type,
+        )
+
+        print(f"FasterWhisper: Model loaded successfully")
+        return model
+
+    def preload(self):
+        """Load the model into the registry without holding it (worker prewarm)"""
+        key = self._get_model_key()
+        get_registry().preload(key, lambda: self._load_model(key))
+
+    def _get_executor(self) -> InferenceExecutor:
+        """Bounded thread pool shared by every instance using this model"""
+        if self._executor is None:
+            self._executor = get_executor(
+                str(self._get_model_key()),
+                max_workers=self._max_concurrency,
+                max_queue=self._max_queue,
             )
+        return self._executor
 
-            print(f"FasterWhisper: Model loaded successfully")
+    def _ensure_loaded(self):
+        """Get the shared faster-whisper model from the registry"""
+        with self._load_lock:
+            if self._model is None:
+                key = self._get_model_key()
+                self._model = get_registry().acquire(key, lambda: self._load_model(key))
+                self._model_key = key
 
     def recognize(
         self,
@@ -263,22 +528,80 @@ class FasterWhisperSTT(stt.STT):
             conn_options=conn_options,
         )
 
+    def stream(
+        self,
+        *,
+        language: str | None = None,
+        conn_options: APIConnectOptions = APIConnectOptions(),
+    ) -> "FasterWhisperSpeechStream":
+        return FasterWhisperSpeechStream(
+            stt=self,
+            language=language or self._language,
+            conn_options=conn_options,
+            interim_interval=self._interim_interval,
+            endpoint_silence=self._endpoint_silence,
+        )
+
+    def _decode_words(
+        self,
+        audio_data: np.ndarray,
+        language: str,
+        prompt: str = "",
+        beam_size: int = 1,
+    ) -> list[tuple[str, float, float]]:
+        """
+        Decode 16kHz float32 audio into (word, start, end) tuples.
+
+        Used by the streaming path: greedy decoding for interim passes,
+        the committed text as prompt so the window keeps its context.
+        """
+        self._ensure_loaded()
+
+        segments, info = self._model.transcribe(
+            audio_data,
+            language=language,
+            beam_size=beam_size,
+            word_timestamps=True,
+            initial_prompt=prompt or None,
+            condition_on_previous_text=False,
+            vad_filter=False,
+        )
+
+        return [
+            (word.word.strip(), word.start, word.end)
+            for segment in segments
+            for word in (segment.words or [])
+            if word.word.strip()
+        ]
+
+    async def _transcribe_async(self, audio_data: np.ndarray, sample_rate: int, language: str) -> str:
+        """Transcribe through the shared batch scheduler (or the model's pool)"""
+        if not self._batching:
+            return await self._get_executor().run(self._transcribe, audio_data, sample_rate, language)
+
+        # Hold a model reference for this session
+        if self._model is None:
+            await self._get_executor().run(self._ensure_loaded)
+
+        if self._scheduler is None:
+            # Batches run on the model's pool, so they count against its concurrency limit
+            key = self._get_model_key()
+            self._scheduler = get_scheduler(
+                key,
+                functools.partial(
+                    self._get_executor().call,
+                    functools.partial(_faster_whisper_batch, key, functools.partial(self._load_model, key)),
+                ),
+                **self._batch_options,
+            )
+
+        return await self._scheduler.submit((audio_data, sample_rate, language), timeout=self._deadline)
+
     def _transcribe(self, audio_data: np.ndarray, sample_rate: int, language: str) -> str:
         """Transcribe audio using faster-whisper"""
         self._ensure_loaded()
 
-        # Resample if needed
-        if sample_rate != 16000:
-            from scipy import signal
-            num_samples = int(len(audio_data) * 16000 / sample_rate)
-            audio_data = signal.resample(audio_data, num_samples)
-
-        # Normalize to float32
-        if audio_data.dtype != np.float32:
-            if audio_data.dtype == np.int16:
-                audio_data = audio_data.astype(np.float32) / 32768.0
-            else:
-                audio_data = audio_data.astype(np.float32)
+        audio_data = _prepare_audio(audio_data, sample_rate)
 
         # Transcribe
         segments, info = self._model.transcribe(
@@ -293,9 +616,10 @@ class FasterWhisperSTT(stt.STT):
         return text.strip()
 
     def close(self):
+        """Release the shared model"""
         if self._model is not None:
-            del self._model
             self._model = None
+            get_registry().release(self._model_key)
 
 
 class FasterWhisperRecognizeStream(stt.RecognizeStream):
@@ -316,25 +640,14 @@ class FasterWhisperRecognizeStream(stt.RecognizeStream):
 
     async def _run(self) -> None:
         try:
-            frames = []
-            sample_rate = 16000
+            audio = await _collect_audio(self._buffer)
 
-            async for frame in self._buffer:
-                audio_np = np.frombuffer(frame.data, dtype=np.int16)
-                sample_rate = frame.sample_rate
-                frames.append(audio_np)
-
-            if not frames:
+            if not len(audio):
                 return
 
-            audio_data = np.concatenate(frames)
-
-            loop = asyncio.get_event_loop()
-            text = await loop.run_in_executor(
-                None,
-                self._whisper_stt._transcribe,
-                audio_data,
-                sample_rate,
+            text = await self._whisper_stt._transcribe_async(
+                audio.view(),
+                16000,
                 self._language,
             )
 
@@ -358,11 +671,251 @@ class FasterWhisperRecognizeStream(stt.RecognizeStream):
             raise
 
 
+def _local_agreement(previous: list, current: list) -> int:
+    """Number of leading words two decoding passes agree on"""
+    agreed = 0
+    for (prev_word, _, _), (word, _, _) in zip(previous, current):
+        if prev_word.lower().strip(".,!?") != word.lower().strip(".,!?"):
+            break
+        agreed += 1
+    return agreed
+
+
+class FasterWhisperSpeechStream(stt.SpeechStream):
+    """
+    Streaming recognition for faster-whisper.
+
+    The not-yet-committed audio window is re-decoded every interim_interval
+    seconds and sent as INTERIM_TRANSCRIPT. Words that two consecutive passes
+    agree on (local agreement) are committed and their audio is dropped from
+    the window, so the pass at end of speech only decodes the last second or
+    so before FINAL_TRANSCRIPT is sent.
+    """
+
+    SAMPLE_RATE = 16000
+    ENERGY_THRESHOLD = 300      # int16 RMS above this counts as speech
+    PRE_ROLL_SECONDS = 0.3      # Audio kept before speech onset
+    MAX_WINDOW_SECONDS = 15.0   # Force-commit when the window grows past this
+
+    def __init__(
+        self,
+        *,
+        stt: FasterWhisperSTT,
+        language: str,
+        conn_options: APIConnectOptions,
+        interim_interval: float = 0.5,
+        endpoint_silence: float = 0.6,
+    ):
+        super().__init__(stt=stt, conn_options=conn_options, sample_rate=self.SAMPLE_RATE)
+        self._whisper_stt = stt
+        self._language = language
+        self._interim_samples = int(interim_interval * self.SAMPLE_RATE)
+        self._endpoint_samples = int(endpoint_silence * self.SAMPLE_RATE)
+        self._decode_task: asyncio.Task | None = None
+        self._resampler: rtc.AudioResampler | None = None  # One per stream (keeps filter state)
+        self._utterance = 0
+        self._reset()
+
+    def _reset(self):
+        """Start a new utterance"""
+        self._utterance += 1
+        self._chunks = []           # float32 chunks of the current utterance
+        self._chunks_start = 0      # Absolute sample index of self._chunks[0]
+        self._total = 0             # Samples received in this utterance
+        self._window_start = 0      # First sample not covered by committed words
+        self._committed = []        # Committed words
+        self._hypothesis = []       # Last pass (word, start, end) after the committed words
+        self._speaking = False
+        self._silence = 0
+        self._new_samples = 0
+
+    async def _run(self) -> None:
+        try:
+            async for data in self._input_ch:
+                if isinstance(data, self._FlushSentinel):
+                    self._flush_resampler()
+                    await self._finalize()
+                    continue
+
+                self._push_frame(data)
+
+                if not self._speaking:
+                    continue
+
+                if self._silence >= self._endpoint_samples:
+                    await self._finalize()
+                elif self._new_samples >= self._interim_samples and (
+                    self._decode_task is None or self._decode_task.done()
+                ):
+                    self._new_samples = 0
+                    self._decode_task = asyncio.create_task(self._interim_pass())
+
+            self._flush_resampler()
+            await self._finalize()
+
+        except Exception as e:
+            print(f"FasterWhisper Stream Error: {e}")
+            import traceback
+            traceback.print_exc()
+            raise
+
+        finally:
+            if self._decode_task is not None and not self._decode_task.done():
+                self._decode_task.cancel()
+
+    def _push_frame(self, frame: rtc.AudioFrame):
+        if frame.sample_rate == self.SAMPLE_RATE:
+            self._push_samples(np.frombuffer(frame.data, dtype=np.int16))
+            return
+
+        # Streaming resampler: filter state carries across 10-20ms frames
+        # (resampling each frame on its own clicks at every frame edge)
+        if self._resampler is None:
+            self._resampler = rtc.AudioResampler(frame.sample_rate, self.SAMPLE_RATE, num_channels=1)
+        for resampled in self._resampler.push(frame):
+            self._push_samples(np.frombuffer(resampled.data, dtype=np.int16))
+
+    def _flush_resampler(self):
+        """Push the resampler's buffered tail (end of input or flush)"""
+        if self._resampler is None:
+            return
+        for resampled in self._resampler.flush():
+            self._push_samples(np.frombuffer(resampled.data, dtype=np.int16))
+        self._resampler = None
+
+    def _push_samples(self, samples: np.ndarray):
+        energy = np.sqrt(np.mean(np.square(samples, dtype=np.float32))) if len(samples) else 0.0
+        audio = samples.astype(np.float32) / 32768.0
+
+        if energy > self.ENERGY_THRESHOLD:
+            self._silence = 0
+            if not self._speaking:
+                self._speaking = True
+                self._event_ch.send_nowait(
+                    stt.SpeechEvent(type=stt.SpeechEventType.START_OF_SPEECH)
+                )
+        elif self._speaking:
+            self._silence += len(audio)
+
+        self._chunks.append(audio)
+        self._total += len(audio)
+        if self._speaking:
+            self._new_samples += len(audio)
+        else:
+            # Before speech: only keep a short pre-roll
+            self._trim_before(self._total - int(self.PRE_ROLL_SECONDS * self.SAMPLE_RATE))
+            self._window_start = self._chunks_start
+
+    def _trim_before(self, position: int):
+        """Drop whole chunks that end before position"""
+        while self._chunks and self._chunks_start + len(self._chunks[0]) <= position:
+            self._chunks_start += len(self._chunks.pop(0))
+
+    def _window_audio(self) -> np.ndarray:
+        """Audio from the first uncommitted sample to now"""
+        if not self._chunks:
+            return np.zeros(0, dtype=np.float32)
+        audio = np.concatenate(self._chunks)
+        return audio[max(0, self._window_start - self._chunks_start):]
+
+    async def _interim_pass(self):
+        utterance = self._utterance
+        window_start = self._window_start
+        audio = self._window_audio()
+        prompt = " ".join(self._committed)
+
+        try:
+            words = await self._whisper_stt._get_executor().run(
+                self._whisper_stt._decode_words,
+                audio,
+                self._language,
+                prompt,
+            )
+        except Exception as e:
+            print(f"FasterWhisper interim decode error: {e}")
+            return
+
+        # Utterance finalized while decoding
+        if utterance != self._utterance:
+            return
+
+        agreed = _local_agreement(self._hypothesis, words)
+        if len(audio) > self.MAX_WINDOW_SECONDS * self.SAMPLE_RATE:
+            agreed = max(agreed, len(words) - 2)
+
+        if agreed > 0:
+            self._committed.extend(word for word, _, _ in words[:agreed])
+            self._window_start = window_start + int(words[agreed - 1][2] * self.SAMPLE_RATE)
+            self._trim_before(self._window_start)
+        self._hypothesis = words[agreed:]
+
+        text = " ".join(self._committed + [word for word, _, _ in self._hypothesis])
+        if text:
+            self._event_ch.send_nowait(
+                stt.SpeechEvent(
+                    type=stt.SpeechEventType.INTERIM_TRANSCRIPT,
+                    alternatives=[
+                        stt.SpeechData(
+                            text=text,
+                            language=self._language,
+                            confidence=0.5,
+                        )
+                    ],
+                )
+            )
+
+    async def _finalize(self):
+        """End of speech: decode the short uncommitted tail and emit the final"""
+        if not self._speaking:
+            self._reset()
+            return
+
+        if self._decode_task is not None and not self._decode_task.done():
+            await asyncio.wait([self._decode_task])
+
+        words = []
+        audio = self._window_audio()
+        if len(audio) >= 0.1 * self.SAMPLE_RATE:
+            try:
+                words = await self._whisper_stt._get_executor().run(
+                    self._whisper_stt._decode_words,
+                    audio,
+                    self._language,
+                    " ".join(self._committed),
+                    5,
+                )
+            except ExecutorSaturatedError as e:
+                # Model busy: finish with what the interim passes already decoded
+                print(f"FasterWhisper final decode skipped: {e}")
+                words = self._hypothesis
+
+        text = " ".join(self._committed + [word for word, _, _ in words])
+        if text:
+            self._event_ch.send_nowait(
+                stt.SpeechEvent(
+                    type=stt.SpeechEventType.FINAL_TRANSCRIPT,
+                    alternatives=[
+                        stt.SpeechData(
+                            text=text,
+                            language=self._language,
+                            confidence=0.9,
+                        )
+                    ],
+                )
+            )
+
+        self._event_ch.send_nowait(
+            stt.SpeechEvent(type=stt.SpeechEventType.END_OF_SPEECH)
+        )
+        self._reset()
+
+
 # Helper function
 def create_whisper_stt(
     model_size: str = "base",
     language: str = "vi",
     use_faster_whisper: bool = True,
+    streaming: bool = True,
 ) -> stt.STT:
     """
     Create a local Whisper STT instance.
@@ -371,6 +924,7 @@ def create_whisper_stt(
         model_size: Model size (tiny, base, small, medium, large)
         language: Language code (vi for Vietnamese)
         use_faster_whisper: Use faster-whisper (recommended) or transformers
+        streaming: Streaming recognition with interim results (faster-whisper only)
 
     Returns:
         STT instance
@@ -380,6 +934,7 @@ def create_whisper_stt(
             return FasterWhisperSTT(
                 model_size=model_size,
                 language=language,
+                streaming=streaming,
             )
         except ImportError:
             print("faster-whisper not installed, falling back to transformers")